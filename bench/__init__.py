@@ -0,0 +1,6 @@
+"""
+Performance benchmarks.
+
+Run standalone from the project root, e.g.:
+    uv run python -m bench.converter_bench
+"""
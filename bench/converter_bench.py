@@ -0,0 +1,205 @@
+"""
+Benchmark of EmailConverter.html_to_markdown on a synthetic newsletter corpus.
+
+Measures throughput (MB/s, messages/s), peak memory (tracemalloc) and the cost of each
+conversion phase, and stores the results as JSON so that commits can be compared.
+
+Usage:
+    uv run python -m bench.converter_bench [--count 30] [--repeat 3] [--parser lxml] [--prune]
+                                           [--output PATH] [--compare BASELINE.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+from bench.corpus import CorpusMessage, generate_corpus
+from src.config import PruneRules
+from src.converter import EmailConverter, DEFAULT_PARSER
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+def prune_rules(message: CorpusMessage) -> PruneRules:
+    """Pruning rules of a corpus message: cut at its footer marker, drop the preheader and tracking pixel."""
+    cut_at_text = (message.footer_starts_with,) if message.footer_starts_with else ()
+    return PruneRules(cut_at_text=cut_at_text, drop_hidden=True, drop_tracking_pixels=True)
+
+PHASES = ["parse", "cleanup", "markdownify", "footer_scan", "regex_cleanup"]
+
+def convert_with_phases(message: CorpusMessage, parser: str, prune: Optional[PruneRules] = None) -> dict[str, float]:
+    """
+    Convert a message phase by phase (same order as html_to_markdown) and time each phase.
+    :return: Seconds spent per phase.
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    soup = EmailConverter.parse_html(message.html, parser)
+    timings["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    EmailConverter.prepare_tree(soup, prune)
+    timings["cleanup"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    markdown_text = EmailConverter.tree_to_markdown(soup)
+    timings["markdownify"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    footer_start = EmailConverter.find_footer(markdown_text, message.footer_starts_with)
+    if footer_start >= 0:
+        markdown_text = markdown_text[:footer_start]
+    timings["footer_scan"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    markdown_text = EmailConverter.cleanup_text(markdown_text)
+    timings["regex_cleanup"] = time.perf_counter() - start
+
+    return timings
+
+def run_benchmark(
+    corpus: list[CorpusMessage],
+    repeat: int = 3,
+    parser: str = DEFAULT_PARSER,
+    prune: bool = False
+) -> dict[str, Any]:
+    """
+    Run all measurements on the corpus.
+
+    :param corpus: Messages to convert.
+    :param repeat: Number of timed passes over the corpus (the fastest pass is reported).
+    :param parser: BeautifulSoup parser backend.
+    :param prune: Apply pruning rules (see prune_rules) before conversion.
+    :return: Benchmark results.
+    """
+    total_bytes = sum(message.size for message in corpus)
+    date = datetime(2026, 2, 28, 10, 0, 0)
+
+    # End-to-end throughput (best of N to reduce noise)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in corpus:
+            EmailConverter.html_to_markdown(
+                message.html,
+                subject=message.name,
+                date=date,
+                footer_starts_with=message.footer_starts_with,
+                parser=parser,
+                prune=prune_rules(message) if prune else None
+            )
+        best = min(best, time.perf_counter() - start)
+
+    # Phase breakdown (single pass)
+    phases = {phase: 0.0 for phase in PHASES}
+    for message in corpus:
+        for phase, seconds in convert_with_phases(message, parser, prune_rules(message) if prune else None).items():
+            phases[phase] += seconds
+    phase_total = sum(phases.values())
+
+    # Peak memory of a single conversion (tracemalloc slows execution, so measured separately)
+    peak = 0
+    for message in corpus:
+        tracemalloc.start()
+        EmailConverter.html_to_markdown(
+            message.html,
+            footer_starts_with=message.footer_starts_with,
+            parser=parser,
+            prune=prune_rules(message) if prune else None
+        )
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parser": parser,
+            "prune": prune,
+            "repeat": repeat,
+        },
+        "corpus": {
+            "messages": len(corpus),
+            "total_bytes": total_bytes,
+            "average_bytes": total_bytes // len(corpus),
+        },
+        "throughput": {
+            "seconds": best,
+            "mb_per_s": total_bytes / 1_000_000 / best,
+            "messages_per_s": len(corpus) / best,
+        },
+        "phases": {
+            phase: {"seconds": seconds, "share": seconds / phase_total if phase_total else 0.0}
+            for phase, seconds in phases.items()
+        },
+        "peak_memory_bytes": peak,
+    }
+
+def compare(current: dict[str, Any], baseline: dict[str, Any]) -> list[str]:
+    """Describe the change of key metrics against a baseline result."""
+    lines = [f"Compared with {baseline['meta'].get('commit') or 'baseline'}:"]
+    for section, key in [("throughput", "mb_per_s"), ("throughput", "messages_per_s")]:
+        old, new = baseline[section][key], current[section][key]
+        lines.append(f"  {key}: {old:.2f} -> {new:.2f} ({(new / old - 1) * 100:+.1f}%)")
+    for phase in PHASES:
+        old = baseline["phases"].get(phase, {}).get("seconds")
+        new = current["phases"][phase]["seconds"]
+        if old:
+            lines.append(f"  {phase}: {old * 1000:.1f} ms -> {new * 1000:.1f} ms ({(new / old - 1) * 100:+.1f}%)")
+    old, new = baseline["peak_memory_bytes"], current["peak_memory_bytes"]
+    lines.append(f"  peak_memory: {old / 1e6:.1f} MB -> {new / 1e6:.1f} MB ({(new / old - 1) * 100:+.1f}%)")
+    return lines
+
+def _git_commit() -> Optional[str]:
+    """Short hash of the current commit, if available."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark EmailConverter.html_to_markdown.")
+    parser.add_argument("--count", type=int, default=30, help="Number of corpus messages.")
+    parser.add_argument("--min-size", type=int, default=100_000, help="Minimum HTML size in bytes.")
+    parser.add_argument("--max-size", type=int, default=300_000, help="Maximum HTML size in bytes.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed passes.")
+    parser.add_argument("--parser", default=DEFAULT_PARSER, help="BeautifulSoup parser backend.")
+    parser.add_argument("--prune", action="store_true", help="Prune the footer, preheader and tracking pixel before conversion.")
+    parser.add_argument("--output", help="Result JSON path. Defaults to bench/results/converter-<commit>.json.")
+    parser.add_argument("--compare", help="Baseline result JSON to compare against.")
+    args = parser.parse_args(argv)
+
+    corpus = generate_corpus(args.count, args.min_size, args.max_size)
+    results = run_benchmark(corpus, repeat=args.repeat, parser=args.parser, prune=args.prune)
+
+    output = args.output or str(RESULTS_DIR / f"converter-{results['meta']['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    throughput = results["throughput"]
+    print(f"{results['corpus']['messages']} messages, {results['corpus']['total_bytes'] / 1e6:.1f} MB")
+    print(f"Throughput: {throughput['mb_per_s']:.2f} MB/s, {throughput['messages_per_s']:.2f} messages/s")
+    for phase, values in results["phases"].items():
+        print(f"  {phase:<14} {values['seconds'] * 1000:8.1f} ms  {values['share'] * 100:5.1f}%")
+    print(f"Peak memory: {results['peak_memory_bytes'] / 1e6:.1f} MB")
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print("\n".join(compare(results, json.load(f))))
+
+if __name__ == "__main__":
+    sys.exit(main())
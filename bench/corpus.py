@@ -0,0 +1,110 @@
+import random
+from dataclasses import dataclass
+from typing import Optional
+
+# Sentences used to build Japanese newsletter-like text
+SENTENCES = [
+    "今日のフレーズは日常会話でとてもよく使われる表現です。",
+    "ネイティブスピーカーがどのような場面で使うのかを例文と一緒に見ていきましょう。",
+    "I'm all ears. は「ぜひ聞かせて」という意味のカジュアルな表現です。",
+    "ソフトウェアエンジニアリングの世界では、抽象化の選び方が設計の質を大きく左右します。",
+    "先週の質問コーナーには、たくさんのご質問をいただきありがとうございました。",
+    "Let me sleep on it. は即答を避けたいときに便利なフレーズです。",
+    "今週は、米国のテック業界の最新動向について解説します。",
+    "このメルマガは毎週火曜日に配信しています。",
+]
+
+# Newsletter styles modeled on configs/newsletters.yaml
+STYLES = [
+    {"name": "HAPA英会話", "footer": "【HAPA英会話からのお知らせ】", "sections": 6},
+    {"name": "ニックのひとこと英会話", "footer": None, "sections": 3},
+    {"name": "週刊Life is beautiful", "footer": "◇　◇　◇", "sections": 20},
+]
+
+@dataclass
+class CorpusMessage:
+    """A synthetic newsletter email."""
+    name: str
+    html: str
+    footer_starts_with: Optional[str]
+
+    @property
+    def size(self) -> int:
+        """Size of the HTML body in bytes (UTF-8)."""
+        return len(self.html.encode("utf-8"))
+
+def _paragraph(rng: random.Random) -> str:
+    """Build a paragraph with inline formatting, links and line breaks."""
+    parts = []
+    for _ in range(rng.randint(2, 5)):
+        sentence = rng.choice(SENTENCES)
+        if rng.random() < 0.3:
+            sentence = f"<b>{sentence}</b>"
+        if rng.random() < 0.2:
+            sentence = f'<a href="https://example.com/articles/{rng.randint(1, 9999)}?utm_source=mail&amp;utm_medium=email">{sentence}</a>'
+        parts.append(sentence)
+    return "<br>\n".join(parts)
+
+def _section(rng: random.Random, index: int) -> str:
+    """Build a section as nested layout tables, like typical HTML newsletters."""
+    rows = "".join(
+        f'<tr><td style="padding:4px;font-size:14px;color:#333333;"><div>{_paragraph(rng)}</div></td></tr>'
+        for _ in range(rng.randint(2, 6))
+    )
+    items = "".join(f"<li>{rng.choice(SENTENCES)}</li>" for _ in range(rng.randint(2, 5)))
+    return (
+        f'<tr><td><table width="100%" cellpadding="0" cellspacing="0" border="0"><tbody>'
+        f'<tr><td><h2 style="font-size:18px;">{index}. {rng.choice(SENTENCES)[:20]}</h2></td></tr>'
+        f'{rows}'
+        f'<tr><td><table width="100%"><tr><td width="50%"><p>{_paragraph(rng)}</p></td>'
+        f'<td width="50%"><ul>{items}</ul></td></tr></table></td></tr>'
+        f'</tbody></table></td></tr>'
+    )
+
+def _footer(rng: random.Random, marker: Optional[str]) -> str:
+    """Build a footer with unsubscribe links and a tracking pixel."""
+    marker_html = f"<p>{marker}</p>" if marker else ""
+    return (
+        f'<tr><td>{marker_html}'
+        + "".join(f"<p>{rng.choice(SENTENCES)}</p>" for _ in range(10))
+        + '<p><a href="https://example.com/unsubscribe">配信停止</a> | <a href="https://example.com/settings">配信設定</a></p>'
+        + '<img src="https://example.com/open.gif" width="1" height="1" alt="">'
+        + '</td></tr>'
+    )
+
+def generate_message(rng: random.Random, style: dict, target_size: int) -> CorpusMessage:
+    """Generate one newsletter of roughly target_size bytes."""
+    sections = []
+    size = 0
+    index = 1
+    while size < target_size or index <= style["sections"]:
+        section = _section(rng, index)
+        sections.append(section)
+        size += len(section.encode("utf-8"))
+        index += 1
+
+    html = (
+        '<!DOCTYPE html><html lang="ja"><head><meta charset="utf-8">'
+        '<style type="text/css">body{margin:0;} .preheader{display:none !important;}</style></head><body>'
+        f'<span class="preheader" style="display:none;">{style["name"]} 今週のハイライト</span>'
+        '<center><table width="600" cellpadding="0" cellspacing="0" border="0"><tbody>'
+        + "".join(sections)
+        + _footer(rng, style["footer"])
+        + '</tbody></table></center><script>window.tracking = true;</script></body></html>'
+    )
+    return CorpusMessage(name=style["name"], html=html, footer_starts_with=style["footer"])
+
+def generate_corpus(count: int = 30, min_size: int = 100_000, max_size: int = 300_000, seed: int = 0) -> list[CorpusMessage]:
+    """
+    Generate a deterministic corpus of large Japanese newsletters.
+
+    :param count: Number of messages.
+    :param min_size: Minimum HTML size in bytes.
+    :param max_size: Maximum HTML size in bytes.
+    :param seed: Random seed, so that every run measures the same input.
+    """
+    rng = random.Random(seed)
+    return [
+        generate_message(rng, STYLES[i % len(STYLES)], rng.randint(min_size, max_size))
+        for i in range(count)
+    ]
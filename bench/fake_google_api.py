@@ -0,0 +1,396 @@
+"""
+Local stand-in for the Gmail, Drive and Discord webhook endpoints used by the application.
+
+Point the clients at it with:
+    GOOGLE_API_ROOT_URL=<server.url>         (Gmail/Drive REST, batch and upload endpoints)
+    GOOGLE_TOKEN_URI=<server.url>token       (OAuth token refresh)
+    DISCORD_WEBHOOK_URL=<server.url>discord/webhook
+
+Latency, quota errors and mailbox size are configurable, and every call is counted
+so that benchmarks can report API calls per message.
+"""
+import re
+import json
+import time
+import base64
+import random
+import threading
+import email.parser
+import email.policy
+from collections import Counter
+from email.message import EmailMessage
+from dataclasses import dataclass, field
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlparse
+
+from bench.corpus import STYLES, generate_message
+
+# (status, headers, body)
+Response = tuple[int, dict[str, str], bytes]
+
+@dataclass
+class FakeFile:
+    """A file stored in the fake Drive."""
+    id: str
+    name: str
+    parents: list[str]
+    app_properties: dict[str, str] = field(default_factory=dict)
+    size: int = 0
+
+class FakeGoogleAPI:
+    """In-memory state and request routing of the fake APIs."""
+
+    def __init__(
+        self,
+        labels: list[str],
+        messages_per_label: int = 50,
+        html_size: int = 50_000,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0
+    ) -> None:
+        """
+        :param labels: Label names as used in queries (e.g., 'hapa英会話' for 'label:hapa英会話').
+        :param messages_per_label: Mailbox size per label.
+        :param html_size: Approximate HTML body size of each message in bytes.
+        :param latency: Seconds added to every HTTP round trip.
+        :param error_rate: Probability of answering a call with 429 (rate limit exceeded).
+        :param seed: Random seed for deterministic content and errors.
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls: Counter = Counter()
+        self.bytes_sent = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._history_id = 1000
+
+        # Mailbox: a few distinct HTML bodies are shared to keep start-up fast
+        rng = random.Random(seed)
+        bodies = [generate_message(rng, style, html_size).html for style in STYLES]
+        now = datetime(2026, 3, 1, 7, 0, tzinfo=timezone(timedelta(hours=9)))
+        self.labels = {f"Label_{i}": name for i, name in enumerate(labels)}
+        self.messages: dict[str, dict[str, Any]] = {}
+        self.label_messages: dict[str, list[str]] = {}
+        for label_index, label_id in enumerate(self.labels):
+            ids = []
+            for i in range(messages_per_label):
+                message_id = f"{label_index:04x}{i:012x}"
+                self.messages[message_id] = {
+                    'labelIds': [label_id],
+                    'subject': f"{self.labels[label_id]} No.{messages_per_label - i}",
+                    'date': format_datetime(now - timedelta(days=i)),
+                    'html': bodies[(label_index + i) % len(bodies)],
+                }
+                ids.append(message_id)
+            # Newest first, like messages.list
+            self.label_messages[label_id] = ids
+
+        self.files: dict[str, FakeFile] = {}
+        self._uploads: dict[str, dict[str, Any]] = {}
+        self.webhook_messages: list[str] = []
+
+    # --- Routing ---
+
+    def handle(self, method: str, raw_path: str, headers: dict[str, str], body: bytes, base_url: str) -> Response:
+        """Route a single (top-level or batched) request."""
+        url = urlparse(raw_path)
+        path = url.path
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if path == "/token":
+            return self._json(200, {'access_token': 'fake-token', 'expires_in': 3600, 'token_type': 'Bearer'})
+        if path == "/discord/webhook":
+            self._count("discord.webhook")
+            self.webhook_messages.append(json.loads(body)['content'])
+            return 204, {}, b""
+        if path in ("/batch", "/batch/gmail/v1", "/batch/drive/v3"):
+            self._count("batch")
+            return self._batch(headers, body, base_url)
+
+        if self._should_fail():
+            return self._json(429, {'error': {'code': 429, 'message': 'Rate Limit Exceeded', 'status': 'RESOURCE_EXHAUSTED'}},
+                              {'Retry-After': '1'})
+
+        routes = [
+            ("GET", r"/gmail/v1/users/me/messages", self._messages_list),
+            ("GET", r"/gmail/v1/users/me/messages/(?P<id>[^/]+)", self._messages_get),
+            ("GET", r"/gmail/v1/users/me/profile", self._profile),
+            ("GET", r"/gmail/v1/users/me/labels", self._labels_list),
+            ("GET", r"/gmail/v1/users/me/history", self._history_list),
+            ("GET", r"/drive/v3/files", self._files_list),
+            ("POST", r"/drive/v3/files", self._files_create_metadata),
+            ("POST", r"/upload/drive/v3/files", self._files_upload),
+            ("PUT", r"/upload/drive/v3/files", self._files_upload_session),
+        ]
+        for route_method, pattern, handler in routes:
+            match = re.fullmatch(pattern, path)
+            if match and method == route_method:
+                return handler(query=query, headers=headers, body=body, base_url=base_url, **match.groupdict())
+        return self._json(404, {'error': {'code': 404, 'message': f'Not Found: {method} {path}'}})
+
+    # --- Gmail ---
+
+    def _messages_list(self, query: dict[str, str], **_: Any) -> Response:
+        self._count("gmail.messages.list")
+        ids = self._search(query.get('q', ''))
+        offset = int(query.get('pageToken', 0))
+        size = min(int(query.get('maxResults', 100)), 500)
+        page = ids[offset:offset + size]
+        result: dict[str, Any] = {'messages': [{'id': i, 'threadId': i} for i in page], 'resultSizeEstimate': len(ids)}
+        if offset + size < len(ids):
+            result['nextPageToken'] = str(offset + size)
+        return self._json(200, result)
+
+    def _messages_get(self, id: str, query: dict[str, str], **_: Any) -> Response:
+        self._count("gmail.messages.get")
+        message = self.messages.get(id)
+        if message is None:
+            return self._json(404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}})
+
+        headers = [{'name': 'Subject', 'value': message['subject']}, {'name': 'Date', 'value': message['date']}]
+        resource: dict[str, Any] = {'id': id, 'threadId': id, 'labelIds': message['labelIds'], 'historyId': str(self._history_id)}
+        if query.get('format') == 'metadata':
+            resource['payload'] = {'mimeType': 'text/html', 'headers': headers}
+        elif query.get('format') == 'raw':
+            source = EmailMessage()
+            source['Subject'] = message['subject']
+            source['Date'] = message['date']
+            source.set_content(message['html'], subtype='html')
+            resource['raw'] = base64.urlsafe_b64encode(source.as_bytes()).decode('ascii')
+        else:
+            data = base64.urlsafe_b64encode(message['html'].encode('utf-8')).decode('ascii')
+            resource['payload'] = {'mimeType': 'text/html', 'headers': headers, 'body': {'size': len(message['html']), 'data': data}}
+        return self._json(200, resource)
+
+    def _profile(self, **_: Any) -> Response:
+        self._count("gmail.users.getProfile")
+        return self._json(200, {'emailAddress': 'me@example.com', 'historyId': str(self._history_id)})
+
+    def _labels_list(self, **_: Any) -> Response:
+        self._count("gmail.labels.list")
+        return self._json(200, {'labels': [{'id': i, 'name': name, 'type': 'user'} for i, name in self.labels.items()]})
+
+    def _history_list(self, **_: Any) -> Response:
+        self._count("gmail.history.list")
+        return self._json(200, {'historyId': str(self._history_id)})
+
+    def _search(self, q: str) -> list[str]:
+        """Evaluate 'label:xxx' terms (OR-ed when grouped in braces) and 'after:<epoch seconds>'; other terms are ignored."""
+        names = re.findall(r'label:(\S+?)(?=[\s}]|$)', q)
+        label_ids = [i for i, name in self.labels.items() if name in names]
+        ids = [message_id for label_id in label_ids for message_id in self.label_messages[label_id]]
+        after = re.search(r'after:(\d+)', q)
+        if after:
+            ids = [i for i in ids if parsedate_to_datetime(self.messages[i]['date']).timestamp() > int(after.group(1))]
+        # Newest first across labels (message IDs encode the age within a label)
+        return sorted(ids, key=lambda message_id: (int(message_id[4:], 16), message_id))
+
+    # --- Drive ---
+
+    def _files_list(self, query: dict[str, str], **_: Any) -> Response:
+        self._count("drive.files.list")
+        q = query.get('q', '')
+        parent = re.search(r"'([^']*)' in parents", q)
+        name = re.search(r"name = '((?:[^'\\]|\\.)*)'", q)
+        files = [
+            f for f in self.files.values()
+            if (not parent or parent.group(1) in f.parents)
+            and (not name or f.name == name.group(1).replace("\\'", "'"))
+        ]
+        offset = int(query.get('pageToken', 0))
+        size = int(query.get('pageSize', 100))
+        page = files[offset:offset + size]
+        result: dict[str, Any] = {'files': [self._file_resource(f) for f in page]}
+        if offset + size < len(files):
+            result['nextPageToken'] = str(offset + size)
+        return self._json(200, result)
+
+    def _files_create_metadata(self, body: bytes, **_: Any) -> Response:
+        self._count("drive.files.create")
+        return self._json(200, self._file_resource(self._create_file(json.loads(body or b"{}"), 0)))
+
+    def _files_upload(self, query: dict[str, str], headers: dict[str, str], body: bytes, base_url: str, **_: Any) -> Response:
+        upload_type = query.get('uploadType')
+        if upload_type == 'resumable':
+            # Session initiation: metadata only, the content follows in PUT requests
+            self._count("drive.files.create")
+            upload_id = f"upload{len(self._uploads) + 1}"
+            self._uploads[upload_id] = {'metadata': json.loads(body or b"{}"), 'data': b""}
+            location = f"{base_url}upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}"
+            return 200, {'Location': location, 'Content-Length': '0'}, b""
+
+        self._count("drive.files.create")
+        if upload_type == 'multipart':
+            metadata, data = self._parse_related(headers.get('content-type', ''), body)
+        else:
+            metadata, data = {}, body
+        return self._json(200, self._file_resource(self._create_file(metadata, len(data))))
+
+    def _files_upload_session(self, query: dict[str, str], headers: dict[str, str], body: bytes, **_: Any) -> Response:
+        self._count("drive.upload.chunk")
+        upload = self._uploads.get(query.get('upload_id', ''))
+        if upload is None:
+            return self._json(404, {'error': {'code': 404, 'message': 'Upload session not found'}})
+
+        upload['data'] += body
+        content_range = headers.get('content-range', '')
+        total = content_range.rsplit('/', 1)[-1] if '/' in content_range else str(len(upload['data']))
+        if total != '*' and len(upload['data']) < int(total):
+            return 308, {'Range': f"bytes=0-{len(upload['data']) - 1}", 'Content-Length': '0'}, b""
+
+        return self._json(200, self._file_resource(self._create_file(upload['metadata'], len(upload['data']))))
+
+    def _create_file(self, metadata: dict[str, Any], size: int) -> FakeFile:
+        with self._lock:
+            file = FakeFile(
+                id=f"file{len(self.files) + 1}",
+                name=metadata.get('name', 'untitled'),
+                parents=metadata.get('parents', []),
+                app_properties=metadata.get('appProperties', {}),
+                size=size
+            )
+            self.files[file.id] = file
+        return file
+
+    @staticmethod
+    def _file_resource(file: FakeFile) -> dict[str, Any]:
+        return {'id': file.id, 'name': file.name, 'parents': file.parents, 'appProperties': file.app_properties,
+                'md5Checksum': f"{file.size:032x}"}
+
+    # --- Batch ---
+
+    def _batch(self, headers: dict[str, str], body: bytes, base_url: str) -> Response:
+        """Execute each part of a multipart/mixed batch request and answer in the same format."""
+        parts = self._parse_multipart(headers.get('content-type', ''), body)
+        boundary = f"batch_{self._random.getrandbits(64):016x}"
+        chunks = []
+        for part in parts:
+            request_line, _, rest = part.get_payload(decode=True).partition(b"\n")
+            method, path, _ = request_line.decode().strip().split(" ", 2)
+            raw_headers, _, sub_body = rest.replace(b"\r\n", b"\n").partition(b"\n\n")
+            sub_headers = {}
+            for line in raw_headers.decode().splitlines():
+                if ":" in line:
+                    key, value = line.split(":", 1)
+                    sub_headers[key.strip().lower()] = value.strip()
+
+            status, response_headers, response_body = self.handle(method, path, sub_headers, sub_body, base_url)
+            content_id = part.get('Content-ID', '').strip('<>')
+            response_headers.setdefault('Content-Type', 'application/json; charset=UTF-8')
+            chunks.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+                + "".join(f"{key}: {value}\r\n" for key, value in response_headers.items())
+                + "\r\n"
+            )
+            chunks.append(response_body.decode('utf-8') + "\r\n")
+        chunks.append(f"--{boundary}--\r\n")
+        return 200, {'Content-Type': f"multipart/mixed; boundary={boundary}"}, "".join(chunks).encode('utf-8')
+
+    @staticmethod
+    def _parse_multipart(content_type: str, body: bytes) -> list[Any]:
+        message = email.parser.BytesParser(policy=email.policy.compat32).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        return message.get_payload()
+
+    def _parse_related(self, content_type: str, body: bytes) -> tuple[dict[str, Any], bytes]:
+        """Split a multipart/related upload into metadata and media."""
+        parts = self._parse_multipart(content_type, body)
+        metadata = json.loads(parts[0].get_payload(decode=True))
+        return metadata, parts[1].get_payload(decode=True)
+
+    # --- Helpers ---
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.calls[name] += 1
+
+    def _should_fail(self) -> bool:
+        if self.error_rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def _json(self, status: int, data: Any, headers: Optional[dict[str, str]] = None) -> Response:
+        return status, {'Content-Type': 'application/json; charset=UTF-8', **(headers or {})}, json.dumps(data).encode('utf-8')
+
+class FakeGoogleAPIServer:
+    """Runs FakeGoogleAPI on a local HTTP server in a background thread."""
+
+    def __init__(self, api: FakeGoogleAPI, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.api = api
+        handler = self._make_handler()
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """Base URL of the server (with a trailing slash)."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def environ(self) -> dict[str, str]:
+        """Environment variables that point the application at this server."""
+        return {
+            'GOOGLE_API_ROOT_URL': self.url,
+            'GOOGLE_TOKEN_URI': f"{self.url}token",
+            'DISCORD_WEBHOOK_URL': f"{self.url}discord/webhook",
+            'GCP_CLIENT_ID': 'fake-client-id',
+            'GCP_CLIENT_SECRET': 'fake-client-secret',
+            'GCP_REFRESH_TOKEN': 'fake-refresh-token',
+        }
+
+    def start(self) -> "FakeGoogleAPIServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeGoogleAPIServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def _make_handler(self) -> type:
+        api = self.api
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, like the real endpoints (httplib2 reuses connections)
+            protocol_version = "HTTP/1.1"
+
+            def _dispatch(self) -> None:
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b""
+                if api.latency:
+                    time.sleep(api.latency)
+                with api._lock:
+                    api.calls["http.requests"] += 1
+                headers = {key.lower(): value for key, value in self.headers.items()}
+                status, response_headers, response_body = api.handle(self.command, self.path, headers, body, server.url)
+
+                self.send_response(status)
+                for key, value in response_headers.items():
+                    if key.lower() != 'content-length':
+                        self.send_header(key, value)
+                self.send_header('Content-Length', str(len(response_body)))
+                self.end_headers()
+                self.wfile.write(response_body)
+                with api._lock:
+                    api.bytes_sent += len(response_body)
+
+            do_GET = do_POST = do_PUT = _dispatch
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return Handler
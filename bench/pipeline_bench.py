@@ -0,0 +1,170 @@
+"""
+End-to-end benchmark of src.main.main against a local fake Google API server.
+
+Gmail, Drive and the Discord webhook are served by bench.fake_google_api, so the whole
+pipeline (search -> fetch -> exists-check -> convert -> upload -> notify) runs offline.
+Reports messages/s and API calls per message, and stores the results as JSON.
+
+Usage:
+    uv run python -m bench.pipeline_bench [--newsletters 3] [--messages 20] [--latency 0.05]
+                                          [--error-rate 0.0]
+                                          [--output PATH]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+from unittest import mock
+
+import yaml
+
+from bench.corpus import STYLES
+from bench.converter_bench import _git_commit
+from bench.fake_google_api import FakeGoogleAPI, FakeGoogleAPIServer
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+def build_config(newsletters: int) -> dict[str, Any]:
+    """Build a newsletters.yaml equivalent with one label and one Drive folder per newsletter."""
+    return {
+        'newsletters': [
+            {
+                'name': f"{STYLES[i % len(STYLES)]['name']} {i}",
+                'query': f"label:bench-{i}",
+                'folder_id': f"folder-{i}",
+                'schedule': "daily",
+                'footer_starts_with': STYLES[i % len(STYLES)]['footer'],
+            }
+            for i in range(newsletters)
+        ]
+    }
+
+def run_benchmark(
+    newsletters: int = 3,
+    messages: int = 20,
+    html_size: int = 50_000,
+    latency: float = 0.05,
+    error_rate: float = 0.0,
+    extra_env: Optional[dict[str, str]] = None
+) -> dict[str, Any]:
+    """
+    Run one pipeline execution against the fake server.
+
+    :param newsletters: Number of configured newsletters.
+    :param messages: Messages processed per newsletter (MAX_MESSAGES_PER_NEWSLETTER).
+    :param html_size: Approximate HTML body size of each message in bytes.
+    :param latency: Seconds added to every HTTP round trip.
+    :param error_rate: Probability of a 429 response per API call.
+    :param extra_env: Additional environment variables (e.g., MAX_WORKERS).
+    :return: Benchmark results.
+    """
+    config = build_config(newsletters)
+    api = FakeGoogleAPI(
+        labels=[n['query'].removeprefix("label:") for n in config['newsletters']],
+        messages_per_label=messages,
+        html_size=html_size,
+        latency=latency,
+        error_rate=error_rate
+    )
+
+    with FakeGoogleAPIServer(api) as server, tempfile.TemporaryDirectory() as tmpdir:
+        config_path = os.path.join(tmpdir, "newsletters.yaml")
+        with open(config_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(config, f, allow_unicode=True)
+
+        env = {
+            **server.environ(),
+            'CONFIG_PATH': config_path,
+            # Fresh run state, so that the scheduler treats every newsletter as due
+            'STATE_PATH': os.path.join(tmpdir, "state.json"),
+            'MAX_MESSAGES_PER_NEWSLETTER': str(messages),
+            **(extra_env or {}),
+        }
+        with mock.patch.dict(os.environ, env):
+            from src.main import main as run
+
+            # Quota errors can fail the run; the partial result is still worth recording
+            start = time.perf_counter()
+            try:
+                status = run()
+            except Exception as e:
+                status = f"Error: {e}"
+            seconds = time.perf_counter() - start
+
+    processed = newsletters * messages
+    calls = dict(sorted(api.calls.items()))
+    # Logical API calls (a batch counts each of its parts); upload chunks and batch envelopes are transport
+    api_calls = sum(count for name, count in calls.items() if name.startswith(("gmail.", "drive.files.")))
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latency": latency,
+            "error_rate": error_rate,
+            "env": extra_env or {},
+        },
+        "workload": {
+            "newsletters": newsletters,
+            "messages": processed,
+            "html_size": html_size,
+            "uploaded_files": len(api.files),
+        },
+        "status": status,
+        "throughput": {
+            "seconds": seconds,
+            "messages_per_s": processed / seconds,
+        },
+        "api_calls": {
+            "total": api_calls,
+            "http_requests": calls.get("http.requests", 0),
+            "per_message": api_calls / processed if processed else 0.0,
+            "by_method": calls,
+        },
+        "bytes_sent": api.bytes_sent,
+    }
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark src.main.main against a local fake Google API server.")
+    parser.add_argument("--newsletters", type=int, default=3, help="Number of newsletters.")
+    parser.add_argument("--messages", type=int, default=20, help="Messages per newsletter.")
+    parser.add_argument("--html-size", type=int, default=50_000, help="HTML body size in bytes.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds added to every HTTP round trip.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a 429 response per call.")
+    parser.add_argument("--output", help="Result JSON path. Defaults to bench/results/pipeline-<commit>.json.")
+    args = parser.parse_args(argv)
+
+    # Per-message INFO logs would dominate the output
+    logging.disable(logging.INFO)
+
+    results = run_benchmark(
+        newsletters=args.newsletters,
+        messages=args.messages,
+        html_size=args.html_size,
+        latency=args.latency,
+        error_rate=args.error_rate
+    )
+
+    output = args.output or str(RESULTS_DIR / f"pipeline-{results['meta']['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+
+    workload = results["workload"]
+    print(f"{workload['messages']} messages, {workload['uploaded_files']} uploaded: {results['status']}")
+    print(f"Throughput: {results['throughput']['messages_per_s']:.2f} messages/s ({results['throughput']['seconds']:.2f} s)")
+    print(f"API calls: {results['api_calls']['total']} ({results['api_calls']['per_message']:.2f} per message)")
+    for name, count in results["api_calls"]["by_method"].items():
+        print(f"  {name:<24} {count:6d}")
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+Startup benchmark of the Cloud Functions entry point based on `python -X importtime`.
+
+A fresh interpreter imports the root main module and (with --run) performs a no-op invocation
+against the local fake Google API server (an empty mailbox). The import cost of every module
+loaded up to that point is reported, split into interpreter startup, the entry point import
+and the invocation.
+
+Usage:
+    uv run python -m bench.startup_bench [--module main] [--run] [--top 20] [--repeat 3]
+                                         [--output PATH]
+"""
+import os
+import sys
+import json
+import argparse
+import platform
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+import yaml
+
+from bench.converter_bench import _git_commit
+from bench.fake_google_api import FakeGoogleAPI, FakeGoogleAPIServer
+
+RESULTS_DIR = Path(__file__).parent / "results"
+REPO_ROOT = Path(__file__).parent.parent
+
+# Phases of the importtime output, separated by markers printed by the child process
+PHASES = ["interpreter", "entry_point", "invocation"]
+MARKER = "startup-bench: "
+
+# Modules that a run without new mail should not need
+HEAVY_MODULES = ["bs4", "markdownify", "lxml", "requests", "google.cloud.storage"]
+
+CHILD_SCRIPT = """
+import sys, json, time, importlib
+print({marker!r} + "entry_point", file=sys.stderr, flush=True)
+start = time.perf_counter()
+module = importlib.import_module({module!r})
+import_seconds = time.perf_counter() - start
+run_seconds = None
+if {run!r}:
+    print({marker!r} + "invocation", file=sys.stderr, flush=True)
+    start = time.perf_counter()
+    module.main()
+    run_seconds = time.perf_counter() - start
+print(json.dumps({{
+    'import_seconds': import_seconds,
+    'run_seconds': run_seconds,
+    'loaded': [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+def parse_importtime(stderr: str) -> dict[str, list[dict[str, Any]]]:
+    """
+    Parse `-X importtime` output.
+
+    :return: Modules imported in each phase (see PHASES).
+             Each item has name, self_us, cumulative_us and depth.
+    """
+    phases: dict[str, list[dict[str, Any]]] = {phase: [] for phase in PHASES}
+    current = phases[PHASES[0]]
+    for line in stderr.splitlines():
+        if line.startswith(MARKER):
+            current = phases[line[len(MARKER):].strip()]
+            continue
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        current.append({
+            "name": name.strip(),
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+            # Nesting is shown by two spaces per level
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+        })
+    return phases
+
+def summarize(modules: list[dict[str, Any]], top: int) -> dict[str, Any]:
+    """Total import time, the slowest modules and the cost per top-level package."""
+    packages: dict[str, int] = {}
+    for module in modules:
+        package = module["name"].split(".")[0]
+        packages[package] = packages.get(package, 0) + module["self_us"]
+    return {
+        "modules": len(modules),
+        "total_ms": sum(m["cumulative_us"] for m in modules if m["depth"] == 0) / 1000,
+        "slowest": [
+            {"name": m["name"], "cumulative_ms": m["cumulative_us"] / 1000, "self_ms": m["self_us"] / 1000}
+            for m in sorted(modules, key=lambda m: m["cumulative_us"], reverse=True)[:top]
+        ],
+        "packages": {
+            name: us / 1000 for name, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        },
+    }
+
+def measure(module: str, run: bool, env: dict[str, str]) -> dict[str, Any]:
+    """Import the module (and optionally invoke main()) in a fresh interpreter."""
+    script = CHILD_SCRIPT.format(module=module, run=run, marker=MARKER, heavy=HEAVY_MODULES)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Startup measurement failed:\n{completed.stderr[-2000:]}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {**result, "phases": parse_importtime(completed.stderr)}
+
+def run_benchmark(module: str = "main", run: bool = False, top: int = 20, repeat: int = 3) -> dict[str, Any]:
+    """
+    Measure the startup cost of the entry point.
+
+    :param module: Module to import (the Cloud Functions entry point by default).
+    :param run: Also invoke module.main() against the fake server with an empty mailbox.
+    :param top: Number of modules / packages listed.
+    :param repeat: Number of fresh interpreters (the fastest is reported).
+    :return: Benchmark results.
+    """
+    api = FakeGoogleAPI(labels=["bench-0"], messages_per_label=0)
+    with FakeGoogleAPIServer(api) as server, tempfile.TemporaryDirectory() as tmpdir:
+        config_path = os.path.join(tmpdir, "newsletters.yaml")
+        with open(config_path, "w", encoding="utf-8") as f:
+            yaml.safe_dump({'newsletters': [
+                {'name': "bench", 'query': "label:bench-0", 'folder_id': "folder-0", 'schedule': "daily"}
+            ]}, f)
+        env = {**os.environ, **server.environ(), 'CONFIG_PATH': config_path, 'PYTHONDONTWRITEBYTECODE': '1'}
+
+        # Each sample starts from a fresh run state, so that the scheduler treats the newsletter as due
+        samples = [
+            measure(module, run, {**env, 'STATE_PATH': os.path.join(tmpdir, f"state-{i}.json")})
+            for i in range(repeat)
+        ]
+
+    best = min(samples, key=lambda sample: sample["import_seconds"] + (sample["run_seconds"] or 0))
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "module": module,
+            "repeat": repeat,
+        },
+        "import_ms": best["import_seconds"] * 1000,
+        "run_ms": best["run_seconds"] * 1000 if best["run_seconds"] is not None else None,
+        "heavy_modules_loaded": best["loaded"],
+        "phases": {phase: summarize(modules, top) for phase, modules in best["phases"].items()},
+    }
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Measure the import cost of the Cloud Functions entry point.")
+    parser.add_argument("--module", default="main", help="Module to import.")
+    parser.add_argument("--run", action="store_true", help="Also run a no-op invocation against the fake server.")
+    parser.add_argument("--top", type=int, default=20, help="Number of modules listed.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of fresh interpreters.")
+    parser.add_argument("--output", help="Result JSON path. Defaults to bench/results/startup-<commit>.json.")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(module=args.module, run=args.run, top=args.top, repeat=args.repeat)
+
+    output = args.output or str(RESULTS_DIR / f"startup-{results['meta']['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"import {args.module}: {results['import_ms']:.1f} ms")
+    for phase, summary in results["phases"].items():
+        if not summary["modules"]:
+            continue
+        print(f"\n{phase}: {summary['modules']} modules, {summary['total_ms']:.1f} ms of imports")
+        for item in summary["slowest"]:
+            print(f"  {item['name']:<48} {item['cumulative_ms']:8.1f} ms (self {item['self_ms']:.1f} ms)")
+    if results["run_ms"] is not None:
+        print(f"\nNo-op invocation: {results['run_ms']:.1f} ms")
+        print(f"Heavy modules loaded: {', '.join(results['heavy_modules_loaded']) or 'none'}")
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    sys.exit(main())
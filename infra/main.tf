@@ -49,6 +49,58 @@ data "archive_file" "source" {
     content  = file("../src/notifier.py")
     filename = "src/notifier.py"
   }
+  source {
+    content  = file("../src/state.py")
+    filename = "src/state.py"
+  }
+  source {
+    content  = file("../src/storage.py")
+    filename = "src/storage.py"
+  }
+  source {
+    content  = file("../src/dedup_index.py")
+    filename = "src/dedup_index.py"
+  }
+  source {
+    content  = file("../src/pipeline.py")
+    filename = "src/pipeline.py"
+  }
+  source {
+    content  = file("../src/google_services.py")
+    filename = "src/google_services.py"
+  }
+  source {
+    content  = file("../src/backfill.py")
+    filename = "src/backfill.py"
+  }
+  source {
+    content  = file("../src/rate_limit.py")
+    filename = "src/rate_limit.py"
+  }
+  source {
+    content  = file("../src/metrics.py")
+    filename = "src/metrics.py"
+  }
+  source {
+    content  = file("../src/profiling.py")
+    filename = "src/profiling.py"
+  }
+  source {
+    content  = file("../src/conversion_cache.py")
+    filename = "src/conversion_cache.py"
+  }
+  source {
+    content  = file("../src/scheduler.py")
+    filename = "src/scheduler.py"
+  }
+  source {
+    content  = file("../src/query_planner.py")
+    filename = "src/query_planner.py"
+  }
+  source {
+    content  = file("../src/event.py")
+    filename = "src/event.py"
+  }
   source {
     content = templatefile("../configs/newsletters.yaml", {
       hapa_folder_id              = var.hapa_folder_id
@@ -1,7 +1,19 @@
 """
 Bridge file for Cloud Functions.
 Google Cloud Functions (2nd gen) expects the entry point to be at the root of the source package.
-This file imports and exposes the main execution logic from the src directory.
+This file exposes the main execution logic from the src directory.
+
+The pipelines are imported on first invocation rather than on import, so loading this module
+stays cheap and only the selected entry point (and what it actually uses) is loaded.
 """
+from typing import Any
+
+def main(event: Any = None, context: Any = None) -> str:
+    """Run the threaded pipeline (see src.main.main)."""
+    from src.main import main as run
+    return run(event, context)
 
-from src.main import main
+def backfill(event: Any = None, context: Any = None) -> str:
+    """Archive existing messages, resuming from the last checkpoint (see src.backfill.main)."""
+    from src.backfill import main as run
+    return run(event, context)
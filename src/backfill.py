@@ -0,0 +1,274 @@
+import os
+import time
+import logging
+import argparse
+import tempfile
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+from src.config import AppConfig, NewsletterConfig
+from src.gmail_client import GmailClient
+from src.drive_client import DriveClient
+from src.notifier import DiscordNotifier
+from src.state import StateStore
+from src.dedup_index import DedupIndex
+from src.main import DEFAULT_MAX_WORKERS, process_messages
+from src.metrics import metrics
+from src.event import event_payload
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKFILL_STATE_PATH = os.path.join(tempfile.gettempdir(), "auto-gmail-uploader", "backfill.json")
+# Messages processed between two checkpoints
+DEFAULT_CHUNK_SIZE = 20
+# Seconds after which no new chunk is started (kept below the 60s Cloud Functions timeout)
+DEFAULT_TIME_BUDGET = 45
+# Fetch attempts of a message before the backfill gives up on it
+# (e.g., a message deleted after enumeration fails with 404 on every attempt)
+MAX_FETCH_ATTEMPTS = 3
+
+class Backfill:
+    """
+    Archives every existing message of a newsletter, oldest to newest, across multiple invocations.
+
+    Progress is checkpointed per newsletter after each step:
+      1. Enumeration: message ID pages are listed (newest first) and the next page token is stored,
+         so that listing a long label resumes where it stopped.
+      2. Processing: IDs are processed from the oldest in chunks, storing the last processed ID
+         and the IDs that failed to be fetched (retried later, up to MAX_FETCH_ATTEMPTS times each).
+    A chunk interrupted by a timeout is simply redone; files that already exist in Drive are skipped.
+    """
+
+    def __init__(
+        self,
+        gmail_client: GmailClient,
+        drive_client: DriveClient,
+        state: StateStore,
+        dedup_index: Optional[DedupIndex] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        time_budget: float = DEFAULT_TIME_BUDGET,
+        max_workers: int = DEFAULT_MAX_WORKERS
+    ) -> None:
+        self.gmail_client = gmail_client
+        self.drive_client = drive_client
+        self.state = state
+        self.dedup_index = dedup_index
+        self.chunk_size = chunk_size
+        self.time_budget = time_budget
+        self.max_workers = max_workers
+
+    def run(self, newsletters: list[NewsletterConfig]) -> tuple[list[str], list[str], bool]:
+        """
+        Continue the backfill of the newsletters until done or out of time.
+
+        :return: Tuple of (uploaded filenames, IDs of messages that still failed to be fetched,
+                 True if every newsletter is completely archived).
+        """
+        deadline = time.monotonic() + self.time_budget
+        uploaded: list[str] = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="message") as message_pool:
+            for newsletter in newsletters:
+                progress = self._progress(newsletter)
+                # Messages that failed to be fetched are retried with the next chunk,
+                # and once per invocation after the end of the label is reached
+                retry_pending = bool(progress['failed'])
+                while time.monotonic() < deadline:
+                    if not progress['enumerated']:
+                        self._enumerate_page(newsletter, progress)
+                    elif not progress['done'] or retry_pending:
+                        retry_pending = False
+                        uploaded.extend(self._process_chunk(newsletter, progress, message_pool))
+                    else:
+                        break
+                    self._checkpoint(newsletter, progress)
+
+        failed = [msg_id for n in newsletters for msg_id in self._progress(n)['failed']]
+        completed = all(self._progress(n)['done'] for n in newsletters) and not failed
+        return uploaded, failed, completed
+
+    def remaining(self, newsletter: NewsletterConfig) -> Optional[int]:
+        """Number of messages left to process (None while the label is still being enumerated)."""
+        progress = self._progress(newsletter)
+        if not progress['enumerated']:
+            return None
+        return len(progress['message_ids']) - self._next_index(progress)
+
+    def _progress(self, newsletter: NewsletterConfig) -> dict[str, Any]:
+        """Stored progress of a newsletter (reset when its query changes)."""
+        progress = self.state.get(newsletter.name)
+        if progress is None or progress.get('query') != newsletter.query:
+            progress = {
+                'query': newsletter.query,
+                'page_token': None,
+                'enumerated': False,
+                # Enumerated IDs, oldest first
+                'message_ids': [],
+                'last_message_id': None,
+                'failed': [],
+                # Failed fetches by message ID, for the IDs in 'failed'
+                'attempts': {},
+                'done': False,
+            }
+            self.state.set(newsletter.name, progress)
+        return progress
+
+    def _checkpoint(self, newsletter: NewsletterConfig, progress: dict[str, Any]) -> None:
+        """Persist the progress so that the next invocation resumes from here."""
+        self.state.set(newsletter.name, progress)
+        self.state.save()
+
+    def _enumerate_page(self, newsletter: NewsletterConfig, progress: dict[str, Any]) -> None:
+        """List one page of message IDs (newest first) and prepend it to the oldest-first list."""
+        message_ids, next_token = self.gmail_client.list_messages_page(newsletter.query, progress['page_token'])
+        # Pages go back in time, so each page is older than everything listed so far
+        known = set(progress['message_ids'])
+        progress['message_ids'] = [msg_id for msg_id in reversed(message_ids) if msg_id not in known] + progress['message_ids']
+        progress['page_token'] = next_token
+        if not next_token:
+            progress['enumerated'] = True
+            logger.info(f"Backfill: {newsletter.name} has {len(progress['message_ids'])} messages.")
+
+    def _next_index(self, progress: dict[str, Any]) -> int:
+        """Position of the first unprocessed message ID."""
+        if progress['last_message_id'] is None:
+            return 0
+        return progress['message_ids'].index(progress['last_message_id']) + 1
+
+    def _process_chunk(
+        self,
+        newsletter: NewsletterConfig,
+        progress: dict[str, Any],
+        message_pool: ThreadPoolExecutor
+    ) -> list[str]:
+        """
+        Process the next chunk of messages (oldest first) along with previously failed ones.
+        :return: Uploaded filenames.
+        """
+        start = self._next_index(progress)
+        chunk = progress['message_ids'][start:start + self.chunk_size]
+        retry = progress['failed']
+
+        message_ids = retry + chunk
+        if self.dedup_index:
+            message_ids = [msg_id for msg_id in message_ids if not self.dedup_index.contains_message(msg_id)]
+
+        uploaded, failed = process_messages(
+            newsletter, message_ids, self.gmail_client, self.drive_client, self.dedup_index, message_pool, None
+        )
+        logger.info(f"Backfill: {newsletter.name} uploaded {len(uploaded)} of {len(retry) + len(chunk)} messages.")
+
+        progress['failed'] = self._retryable(failed, progress)
+        if chunk:
+            progress['last_message_id'] = chunk[-1]
+        progress['done'] = start + len(chunk) >= len(progress['message_ids'])
+        return uploaded
+
+    @staticmethod
+    def _retryable(failed: list[str], progress: dict[str, Any]) -> list[str]:
+        """
+        Count a failed fetch for each message and keep those that may be retried.
+        Messages that failed MAX_FETCH_ATTEMPTS times are dropped, so that the backfill can complete.
+        """
+        previous = progress.get('attempts', {})
+        attempts = {}
+        for message_id in failed:
+            count = previous.get(message_id, 0) + 1
+            if count >= MAX_FETCH_ATTEMPTS:
+                logger.error(f"Backfill: giving up on message {message_id} after {count} failed fetches.")
+            else:
+                attempts[message_id] = count
+        progress['attempts'] = attempts
+        return list(attempts)
+
+def _requested_newsletters(event: Any) -> Optional[list[str]]:
+    """Newsletter names given in the trigger payload ({"newsletter": "..."}), if any."""
+    payload = event_payload(event)
+    if payload.get('newsletter'):
+        return [payload['newsletter']]
+    return None
+
+def main(event: Any = None, context: Any = None, newsletter_names: Optional[list[str]] = None) -> str:
+    """
+    Entry point of the backfill. Each invocation continues where the previous one stopped.
+    Compatible with Cloud Functions and local execution.
+
+    :param event: Cloud Functions trigger event. {"newsletter": "<name>"} restricts the backfill to one newsletter.
+    :param context: Cloud Functions execution context (unused)
+    :param newsletter_names: Names of the newsletters to backfill (all if None).
+    :return: "Completed" when everything is archived, otherwise "Incomplete" (invoke again to continue)
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+    metrics.reset()
+
+    notifier = None
+    dedup_index = None
+    uploaded: list[str] = []
+
+    try:
+        config = AppConfig()
+        names = newsletter_names or _requested_newsletters(event)
+        newsletters = [n for n in config.newsletters if names is None or n.name in names]
+        if names and not newsletters:
+            raise ValueError(f"Unknown newsletter: {', '.join(names)}")
+
+        if os.environ.get("DEDUP_INDEX_PATH"):
+            dedup_index = DedupIndex()
+        # Same existence check as src.main (see DRIVE_LISTING_CACHE)
+        cache_listings = dedup_index is None and os.environ.get("DRIVE_LISTING_CACHE", "true").lower() != "false"
+
+        gmail_client = GmailClient()
+        drive_client = DriveClient(cache_listings=cache_listings)
+        notifier = DiscordNotifier()
+
+        backfill = Backfill(
+            gmail_client,
+            drive_client,
+            StateStore(os.environ.get("BACKFILL_STATE_PATH", DEFAULT_BACKFILL_STATE_PATH)),
+            dedup_index,
+            chunk_size=int(os.environ.get("BACKFILL_CHUNK_SIZE", str(DEFAULT_CHUNK_SIZE))),
+            time_budget=float(os.environ.get("BACKFILL_TIME_BUDGET", str(DEFAULT_TIME_BUDGET))),
+            max_workers=int(os.environ.get("MAX_WORKERS", str(DEFAULT_MAX_WORKERS)))
+        )
+        uploaded, failed, completed = backfill.run(newsletters)
+
+        remaining = {n.name: backfill.remaining(n) for n in newsletters}
+        with metrics.stage('notify'):
+            notifier.send_backfill_status(len(uploaded), remaining, completed)
+
+        if failed:
+            raise RuntimeError(f"Failed to fetch {len(failed)} messages: {', '.join(failed)}")
+
+        return "Completed" if completed else "Incomplete"
+
+    except Exception as e:
+        error_msg = str(e)
+        detail = traceback.format_exc()
+        logger.error(f"Error during backfill: {error_msg}\n{detail}")
+
+        if notifier:
+            try:
+                notifier.send_error(error_msg, detail)
+            except Exception as notify_err:
+                logger.error(f"Failed to send error notification to Discord: {notify_err}")
+
+        raise e
+
+    finally:
+        if dedup_index:
+            dedup_index.save()
+
+        metrics.finish_run(len(uploaded))
+
+if __name__ == "__main__":
+    # Usage: python -m src.backfill [--newsletter NAME] [--until-complete]
+    parser = argparse.ArgumentParser(description="Archive all existing messages of the configured newsletters.")
+    parser.add_argument("--newsletter", action="append", help="Newsletter name (repeatable). Defaults to all.")
+    parser.add_argument("--until-complete", action="store_true", help="Keep invoking until the backfill is complete.")
+    args = parser.parse_args()
+
+    status = main(newsletter_names=args.newsletter)
+    while args.until_complete and status != "Completed":
+        status = main(newsletter_names=args.newsletter)
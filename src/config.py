@@ -1,15 +1,46 @@
 import os
+import re
+import threading
 import yaml
+from dataclasses import dataclass
+from datetime import timedelta
 from pathlib import Path
-from typing import TypedDict, Optional
+from typing import Any, Optional
 
-class NewsletterConfig(TypedDict):
-    """Type definition for individual newsletter configurations."""
+# Run interval of each schedule (see src.scheduler)
+SCHEDULE_INTERVALS = {
+    'daily': timedelta(days=1),
+    'weekly': timedelta(weeks=1),
+}
+DEFAULT_SCHEDULE = 'daily'
+
+# Pattern of environment variable references left unexpanded (e.g., ${hapa_folder_id} when unset)
+UNRESOLVED_VARIABLE_PATTERN = re.compile(r'\$\{?\w+\}?')
+
+@dataclass(frozen=True, slots=True)
+class PruneRules:
+    """Markup removed from the parsed HTML before conversion (see EmailConverter.prepare_tree)."""
+    selectors: tuple[str, ...] = ()
+    cut_at_text: tuple[str, ...] = ()
+    drop_hidden: bool = False
+    drop_tracking_pixels: bool = False
+
+@dataclass(frozen=True, slots=True)
+class NewsletterConfig:
+    """Validated settings of an individual newsletter."""
     name: str
     query: str
     folder_id: str
-    schedule: str
-    footer_starts_with: Optional[str]
+    schedule: str = DEFAULT_SCHEDULE
+    footer_starts_with: tuple[str, ...] = ()
+    footer_pattern: Optional[str] = None
+    parser: Optional[str] = None
+    prune: Optional[PruneRules] = None
+
+# Compiled configurations per path: ((mtime_ns, size) of the parsed file, newsletters).
+# Warm instances reuse them until the file changes.
+_compiled: dict[str, tuple[tuple[int, int], tuple[NewsletterConfig, ...]]] = {}
+_compiled_lock = threading.Lock()
 
 class AppConfig:
     """Handles loading and managing application-wide settings from YAML."""
@@ -17,31 +48,126 @@ class AppConfig:
     def __init__(self, config_path: Optional[str] = None) -> None:
         """
         Load the configuration file.
-        :param config_path: Path to the YAML file. Defaults to configs/newsletters.yaml.
+        :param config_path: Path to the YAML file. Defaults to CONFIG_PATH environment variable or configs/newsletters.yaml.
         """
+        if config_path is None:
+            config_path = os.environ.get("CONFIG_PATH")
+
         if config_path is None:
             # Locate configs/newsletters.yaml relative to the src directory
             config_path = str(Path(__file__).parent.parent / "configs" / "newsletters.yaml")
-        
+
         self.config_path = config_path
-        self._newsletters: list[NewsletterConfig] = []
+        self._newsletters: tuple[NewsletterConfig, ...] = ()
         self._load_config()
 
     def _load_config(self) -> None:
-        """Parse the YAML file and store newsletter settings."""
-        if not os.path.exists(self.config_path):
-            raise FileNotFoundError(f"Config file not found: {self.config_path}")
-        
-        with open(self.config_path, "r", encoding="utf-8") as f:
-            data = yaml.safe_load(f)
-            self._newsletters = data.get("newsletters", [])
-            
-            # Expand environment variables in folder_id (e.g., ${hapa_folder_id})
-            for newsletter in self._newsletters:
-                if 'folder_id' in newsletter:
-                    newsletter['folder_id'] = os.path.expandvars(newsletter['folder_id'])
+        """Parse and validate the YAML file, unless it is unchanged since it was last compiled by this process."""
+        try:
+            stat = os.stat(self.config_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Config file not found: {self.config_path}") from None
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        with _compiled_lock:
+            cached = _compiled.get(self.config_path)
+            if cached is None or cached[0] != version:
+                with open(self.config_path, "r", encoding="utf-8") as f:
+                    data = yaml.safe_load(f) or {}
+                cached = _compiled[self.config_path] = (version, _parse_newsletters(data, self.config_path))
+        self._newsletters = cached[1]
 
     @property
     def newsletters(self) -> list[NewsletterConfig]:
         """Get the list of registered newsletter configurations."""
-        return self._newsletters
+        return list(self._newsletters)
+
+def _parse_newsletters(data: Any, config_path: str) -> tuple[NewsletterConfig, ...]:
+    """
+    Validate the parsed YAML and build the newsletter configurations.
+    :raises ValueError: If a setting is missing or invalid (the message names the offending entry).
+    """
+    entries = data.get("newsletters", []) if isinstance(data, dict) else None
+    if not isinstance(entries, list):
+        raise ValueError(f"{config_path}: 'newsletters' must be a list")
+
+    newsletters = []
+    for index, entry in enumerate(entries):
+        try:
+            newsletters.append(_parse_newsletter(entry))
+        except ValueError as e:
+            raise ValueError(f"{config_path}: newsletters[{index}]: {e}") from None
+
+    names = [newsletter.name for newsletter in newsletters]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        # Run state is kept per newsletter name
+        raise ValueError(f"{config_path}: duplicate newsletter names: {', '.join(duplicates)}")
+    return tuple(newsletters)
+
+def _parse_newsletter(entry: Any) -> NewsletterConfig:
+    """Validate a single newsletter entry."""
+    if not isinstance(entry, dict):
+        raise ValueError("must be a mapping")
+    unknown = set(entry) - set(NewsletterConfig.__slots__)
+    if unknown:
+        raise ValueError(f"unknown settings: {', '.join(sorted(unknown))}")
+
+    # Expand environment variables in folder_id (e.g., ${hapa_folder_id})
+    folder_id = os.path.expandvars(_required_string(entry, 'folder_id'))
+    if UNRESOLVED_VARIABLE_PATTERN.search(folder_id):
+        raise ValueError(f"folder_id refers to an unset environment variable: {folder_id}")
+
+    schedule = entry.get('schedule') or DEFAULT_SCHEDULE
+    if schedule not in SCHEDULE_INTERVALS:
+        raise ValueError(f"unknown schedule: {schedule} (expected one of {', '.join(SCHEDULE_INTERVALS)})")
+
+    footer_pattern = entry.get('footer_pattern')
+    if footer_pattern is not None:
+        try:
+            re.compile(footer_pattern)
+        except (re.error, TypeError) as e:
+            raise ValueError(f"invalid footer_pattern: {e}")
+
+    return NewsletterConfig(
+        name=_required_string(entry, 'name'),
+        query=_required_string(entry, 'query'),
+        folder_id=folder_id,
+        schedule=schedule,
+        footer_starts_with=_strings(entry.get('footer_starts_with'), 'footer_starts_with'),
+        footer_pattern=footer_pattern,
+        parser=entry.get('parser'),
+        prune=_parse_prune(entry.get('prune'))
+    )
+
+def _parse_prune(rules: Any) -> Optional[PruneRules]:
+    """Validate the pruning rules of a newsletter."""
+    if rules is None:
+        return None
+    if not isinstance(rules, dict):
+        raise ValueError("prune must be a mapping")
+    unknown = set(rules) - set(PruneRules.__slots__)
+    if unknown:
+        raise ValueError(f"unknown prune settings: {', '.join(sorted(unknown))}")
+    return PruneRules(
+        selectors=_strings(rules.get('selectors'), 'prune.selectors'),
+        cut_at_text=_strings(rules.get('cut_at_text'), 'prune.cut_at_text'),
+        drop_hidden=bool(rules.get('drop_hidden')),
+        drop_tracking_pixels=bool(rules.get('drop_tracking_pixels'))
+    )
+
+def _required_string(entry: dict[str, Any], key: str) -> str:
+    """Get a mandatory non-empty string setting."""
+    value = entry.get(key)
+    if not isinstance(value, str) or not value:
+        raise ValueError(f"'{key}' is required")
+    return value
+
+def _strings(value: Any, key: str) -> tuple[str, ...]:
+    """Normalize a setting given as a string or a list of strings."""
+    if value is None:
+        return ()
+    values = [value] if isinstance(value, str) else value
+    if not isinstance(values, list) or not all(isinstance(item, str) for item in values):
+        raise ValueError(f"'{key}' must be a string or a list of strings")
+    return tuple(values)
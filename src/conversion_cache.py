@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from dataclasses import asdict
+from typing import TYPE_CHECKING, Any, Optional
+
+from src.converter import CONVERTER_VERSION
+from src.metrics import metrics
+
+# sqlite3 is imported when a cache is opened, so runs without caching never load it
+if TYPE_CHECKING:
+    import sqlite3
+
+# Default limit of the total size of cached Markdown (bytes); least recently used entries are evicted beyond it
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+class ConversionCache:
+    """
+    Persistent memo of html_to_markdown results in a local SQLite database.
+
+    Entries are keyed by a hash of every input of the conversion (HTML body, subject, date,
+    footer keyword, parser) and CONVERTER_VERSION, so a hit always returns exactly what a new
+    conversion would produce. Retries, backfill re-runs and reconcile passes then skip the parsing.
+    """
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        """
+        Open (or create) the cache database.
+        :param path: Local path of the SQLite database file.
+        :param max_bytes: Maximum total size of the cached Markdown.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        import sqlite3
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # A single connection shared by the worker threads, serialized by the lock
+        self._conn: "sqlite3.Connection" = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            # WAL lets another process (e.g., a concurrent backfill) read while this one writes
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversions ("
+                "key TEXT PRIMARY KEY, markdown TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS conversions_accessed ON conversions (accessed)")
+
+    @staticmethod
+    def key(job: dict[str, Any]) -> str:
+        """
+        Content hash of a conversion job (the html_to_markdown arguments, see pipeline.conversion_job).
+        """
+        digest = hashlib.sha256()
+        date = job.get('date')
+        prune = job.get('prune')
+        for part in (
+            CONVERTER_VERSION,
+            job.get('parser') or '',
+            json.dumps(job.get('footer_starts_with'), ensure_ascii=False),
+            job.get('footer_pattern') or '',
+            json.dumps(asdict(prune) if prune else None, ensure_ascii=False),
+            job.get('subject') or '',
+            date.isoformat() if date else '',
+        ):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        digest.update(job['html_content'].encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, job: dict[str, Any]) -> Optional[str]:
+        """
+        Look up the Markdown of a conversion job.
+        :return: Cached Markdown, or None on a miss.
+        """
+        key = self.key(job)
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT markdown FROM conversions WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE conversions SET accessed = ? WHERE key = ?", (time.time(), key))
+                self.hits += 1
+            else:
+                self.misses += 1
+        metrics.count('conversion_cache_hits' if row is not None else 'conversion_cache_misses')
+        return row[0] if row is not None else None
+
+    def put(self, job: dict[str, Any], markdown: str) -> None:
+        """Store the Markdown of a conversion job, evicting the least recently used entries if the cache is full."""
+        size = len(markdown.encode('utf-8'))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO conversions (key, markdown, size, accessed) VALUES (?, ?, ?, ?)",
+                (self.key(job), markdown, size, time.time())
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        """Delete the least recently used entries until the total size fits in max_bytes (lock held)."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM conversions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self._conn.execute("SELECT key, size FROM conversions ORDER BY accessed"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM conversions WHERE key = ?", evicted)
+        metrics.count('conversion_cache_evictions', len(evicted))
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+# Open caches shared at module scope, keyed by path
+_caches: dict[str, ConversionCache] = {}
+_caches_lock = threading.Lock()
+
+def get_cache() -> Optional[ConversionCache]:
+    """
+    Get the conversion cache configured by CONVERSION_CACHE_PATH (and CONVERSION_CACHE_MAX_BYTES).
+    :return: Shared cache instance, or None if caching is disabled.
+    """
+    path = os.environ.get("CONVERSION_CACHE_PATH")
+    if not path:
+        return None
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            max_bytes = int(os.environ.get("CONVERSION_CACHE_MAX_BYTES", str(DEFAULT_MAX_BYTES)))
+            cache = _caches[path] = ConversionCache(path, max_bytes)
+        return cache
@@ -1,8 +1,65 @@
 import re
-from markdownify import markdownify as md
-from bs4 import BeautifulSoup
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Optional
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+# bs4 and markdownify are imported on first conversion, so runs without new mail never load them
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup, Tag
+    from markdownify import MarkdownConverter
+    from src.config import PruneRules
+
+# Version of the conversion output. Bump it whenever a change alters the generated Markdown,
+# so that entries of the conversion cache made by older code are no longer used.
+CONVERTER_VERSION = "2"
+
+# Default number of jobs sent to a worker process at once
+DEFAULT_CHUNKSIZE = 4
+
+# Default BeautifulSoup parser (pure Python, always available)
+DEFAULT_PARSER = "html.parser"
+# Tags removed before conversion
+REMOVED_TAGS = frozenset(['style', 'script'])
+# Structural tags that get an explicit newline
+LINE_BREAK_TAGS = frozenset(['div', 'p', 'tr', 'li'])
+
+# Inline style that hides an element (e.g., preheader text), compared after removing whitespace
+HIDDEN_STYLE = "display:none"
+# Maximum width and height (in pixels) of an image considered a tracking pixel
+TRACKING_PIXEL_SIZE = 1
+
+# Whitespace normalization of cleanup_text (a single space needs no substitution)
+SPACE_RUN_PATTERN = re.compile(r' {2,}')
+BLANK_LINES_PATTERN = re.compile(r'\n{3,}')
+# Appended to the Markdown when the footer was cut off
+FOOTER_NOTE = "\n\n--- [Footer Truncated] ---"
+
+# One or more footer markers (plain text); the footer starts at the line containing the first one found
+FooterMarkers = Union[str, list[str], tuple[str, ...], None]
+
+@lru_cache(maxsize=128)
+def _footer_regex(markers: tuple[str, ...], pattern: Optional[str]) -> Optional[re.Pattern[str]]:
+    """
+    Compile the footer markers and custom pattern of a newsletter into a single regex (cached per settings),
+    so that any number of markers costs one search.
+    Spaces in markers match runs of spaces, since the search runs before whitespace normalization.
+    The pattern is compiled with re.MULTILINE, so ^ and $ match at line boundaries.
+    """
+    alternatives = [' +'.join(re.escape(part) for part in re.split(' +', marker)) for marker in markers]
+    if pattern:
+        alternatives.append(f"(?:{pattern})")
+    return re.compile("|".join(alternatives), re.MULTILINE) if alternatives else None
+
+@lru_cache(maxsize=None)
+def _markdown_converter() -> "MarkdownConverter":
+    """Options are fixed, so a single converter instance is reused for all conversions."""
+    from markdownify import MarkdownConverter
+    return MarkdownConverter(
+        heading_style="ATX",
+        strip=['table', 'thead', 'tbody', 'tr', 'td', 'center']
+    )
 
 class EmailConverter:
     """Handles the transformation of email HTML into sanitized Markdown."""
@@ -12,7 +69,10 @@ class EmailConverter:
         html_content: str, 
         subject: Optional[str] = None, 
         date: Optional[datetime] = None,
-        footer_starts_with: Optional[str] = None
+        footer_starts_with: FooterMarkers = None,
+        parser: str = DEFAULT_PARSER,
+        footer_pattern: Optional[str] = None,
+        prune: Optional["PruneRules"] = None
     ) -> str:
         """
         Convert HTML to Markdown, with layout adjustments and footer removal.
@@ -20,59 +80,218 @@ class EmailConverter:
         :param html_content: Source HTML string.
         :param subject: Email subject (used for Markdown header).
         :param date: Delivery date (used for Markdown header).
-        :param footer_starts_with: Keyword to identify the start of the footer to be removed.
+        :param footer_starts_with: Keyword (or list of keywords) to identify the start of the footer to be removed.
+        :param parser: BeautifulSoup parser backend ('html.parser' or the faster 'lxml').
+                       'lxml' produces the same output for well-formed HTML but repairs malformed markup differently.
+        :param footer_pattern: Regular expression that also marks the start of the footer.
+        :param prune: Rules removing markup from the parsed tree before conversion (see prepare_tree).
         :return: Converted Markdown string.
         """
-        # 1. Pre-process with BeautifulSoup
-        soup = BeautifulSoup(html_content, "html.parser")
-        
-        # Remove style and script tags which are irrelevant for Markdown
-        for style in soup(["style", "script"]):
-            style.decompose()
-
-        # 2. Adjust line breaks
-        # Explicitly append newlines to structural tags (div, p, br, etc.) 
-        # to prevent text from merging into a single line during conversion.
-        for tag in soup.find_all(['div', 'p', 'br', 'tr', 'li']):
-            tag.append('\n')
-
-        # 3. Convert HTML to Markdown
-        # Strip complex layout tags (tables, centers) to prioritize plain text structure.
-        markdown_text = md(
-            str(soup), 
-            heading_style="ATX",
-            strip=['table', 'thead', 'tbody', 'tr', 'td', 'center']
-        )
-
-        # 4. Text Cleanup
-        # Sanitize white spaces and limit consecutive newlines to a maximum of two.
-        markdown_text = re.sub(r' +', ' ', markdown_text)
-        markdown_text = re.sub(r'\n{3,}', '\n\n', markdown_text).strip()
-
-        # 5. Footer Removal based on specific keywords
-        if footer_starts_with:
-            lines = markdown_text.split('\n')
-            final_lines = []
-            footer_removed = False
-            for line in lines:
-                if footer_starts_with in line:
-                    footer_removed = True
-                    break
-                final_lines.append(line)
-            
-            markdown_text = '\n'.join(final_lines).strip()
+        soup = EmailConverter.parse_html(html_content, parser)
+        pruned_footer = EmailConverter.prepare_tree(soup, prune)
+        markdown_text = EmailConverter.tree_to_markdown(soup)
+        # Cut the footer first, so that the discarded part is never normalized
+        footer_start = EmailConverter.find_footer(markdown_text, footer_starts_with, footer_pattern)
+        if footer_start >= 0:
+            markdown_text = markdown_text[:footer_start]
+        markdown_text = EmailConverter.cleanup_text(markdown_text)
+        if footer_start >= 0 or pruned_footer:
             # Insert a clear message if content was truncated
-            if footer_removed:
-                markdown_text += "\n\n--- [Footer Truncated] ---"
+            markdown_text += FOOTER_NOTE
+        return EmailConverter.build_header(subject, date) + markdown_text
+
+    # The conversion phases below are called in order by html_to_markdown.
+    # They are exposed individually so that each phase can be measured (see bench/).
 
-        # 6. Add Header Information (Subject and Date)
+    @staticmethod
+    def parse_html(html_content: str, parser: str = DEFAULT_PARSER) -> "BeautifulSoup":
+        """1. Parse the HTML once."""
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(html_content, parser)
+
+    @staticmethod
+    def prepare_tree(soup: "BeautifulSoup", prune: Optional["PruneRules"] = None) -> bool:
+        """
+        2. Remove irrelevant tags and adjust line breaks in a single traversal (modifies the tree in place).
+        Markup excluded by the pruning rules is dropped here, so markdownify never converts it:
+          - cut_at_text: remove the line containing the first of these texts and everything after it
+          - selectors: CSS selectors of elements to remove
+          - drop_hidden: remove elements hidden with an inline display:none style (preheaders)
+          - drop_tracking_pixels: remove images of at most 1x1 pixel
+
+        :return: True if the tree was cut at a cut_at_text marker.
+        """
+        cut = _cut_at_text(soup, prune.cut_at_text, prune.drop_hidden) if prune else False
+        for selector in prune.selectors if prune else ():
+            for tag in soup.select(selector):
+                if not tag.decomposed:
+                    tag.decompose()
+
+        drop_hidden = bool(prune and prune.drop_hidden)
+        drop_tracking_pixels = bool(prune and prune.drop_tracking_pixels)
+        for tag in soup.find_all(True):
+            # Descendants of removed tags are still in the list
+            if tag.decomposed:
+                continue
+            # Remove style and script tags which are irrelevant for Markdown
+            if tag.name in REMOVED_TAGS:
+                tag.decompose()
+            elif drop_hidden and _is_hidden(tag):
+                tag.decompose()
+            elif drop_tracking_pixels and tag.name == 'img' and _is_tracking_pixel(tag):
+                tag.decompose()
+            # Explicitly append newlines to structural tags (div, p, br, etc.)
+            # to prevent text from merging into a single line during conversion.
+            # <br> is a void element, so its newline goes after the tag (as it did when serialized and re-parsed).
+            elif tag.name == 'br':
+                tag.insert_after('\n')
+            elif tag.name in LINE_BREAK_TAGS:
+                tag.append('\n')
+
+        # Merge adjacent text nodes, as re-parsing the serialized HTML would,
+        # so that whitespace is normalized exactly like the former str(soup) round trip
+        soup.smooth()
+        return cut
+
+    @staticmethod
+    def tree_to_markdown(soup: "BeautifulSoup") -> str:
+        """
+        3. Convert the parsed tree to Markdown.
+        The tree is passed directly to markdownify (no serialization and re-parsing).
+        Complex layout tags (tables, centers) are stripped to prioritize plain text structure.
+        """
+        return _markdown_converter().convert_soup(soup)
+
+    @staticmethod
+    def find_footer(markdown_text: str, footer_starts_with: FooterMarkers = None, footer_pattern: Optional[str] = None) -> int:
+        """
+        4. Locate the footer in the Markdown before whitespace normalization.
+        :return: Position of the start of the line containing the first footer marker (or pattern match), or -1.
+        """
+        markers = (footer_starts_with,) if isinstance(footer_starts_with, str) else tuple(footer_starts_with or ())
+        markers = tuple(marker for marker in markers if marker)
+        if len(markers) == 1 and ' ' not in markers[0] and not footer_pattern:
+            # A single plain marker is a substring search
+            position = markdown_text.find(markers[0])
+        else:
+            regex = _footer_regex(markers, footer_pattern)
+            match = regex.search(markdown_text) if regex else None
+            position = match.start() if match else -1
+
+        if position < 0:
+            return -1
+        return markdown_text.rfind('\n', 0, position) + 1
+
+    @staticmethod
+    def cleanup_text(markdown_text: str) -> str:
+        """5. Sanitize white spaces and limit consecutive newlines to a maximum of two."""
+        markdown_text = SPACE_RUN_PATTERN.sub(' ', markdown_text)
+        return BLANK_LINES_PATTERN.sub('\n\n', markdown_text).strip()
+
+    @staticmethod
+    def build_header(subject: Optional[str], date: Optional[datetime]) -> str:
+        """6. Build the header information (Subject and Date)."""
         header = ""
         if subject:
             header += f"# {subject}\n\n"
         if date:
             header += f"Date: {date.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-        
+
         if header:
             header += "---\n\n"
+        return header
+
+def _is_hidden(tag: "Tag") -> bool:
+    """Whether an element is hidden by its inline style."""
+    style = tag.get('style')
+    return isinstance(style, str) and HIDDEN_STYLE in "".join(style.split()).lower()
+
+def _is_tracking_pixel(image: "Tag") -> bool:
+    """Whether an image is declared at most 1x1 pixel (width and height attributes)."""
+    for attribute in ('width', 'height'):
+        value = str(image.get(attribute) or '').strip().lower().removesuffix('px')
+        if not value.isdigit() or int(value) > TRACKING_PIXEL_SIZE:
+            return False
+    return True
+
+def _cut_at_text(soup: "BeautifulSoup", markers: FooterMarkers, skip_hidden: bool = False) -> bool:
+    """
+    Remove the line containing the first footer marker and everything after it in document order.
+    Runs before the other removals, so that the footer is never traversed again.
+
+    :param skip_hidden: Ignore markers inside hidden elements (they are dropped anyway).
+    :return: True if a marker was found.
+    """
+    from bs4 import NavigableString
+
+    markers = (markers,) if isinstance(markers, str) else tuple(markers or ())
+    regex = _footer_regex(tuple(marker for marker in markers if marker), None)
+    if regex is None:
+        return False
+
+    def _is_visible(string: Any) -> bool:
+        for parent in string.parents:
+            if parent.name in REMOVED_TAGS or (skip_hidden and _is_hidden(parent)):
+                return False
+        return True
+
+    # Comments, scripts and stylesheets are NavigableString subclasses, so they are skipped
+    text = next((
+        node for node in soup.descendants
+        if type(node) is NavigableString and regex.search(node) and _is_visible(node)
+    ), None)
+    if text is None:
+        return False
+
+    # Keep the text before the line containing the marker (the marker may share an element with the body)
+    match = regex.search(text)
+    kept = text[:text.rfind('\n', 0, match.start()) + 1]
+    # Drop what follows the marker at every level of the tree; the ancestors keep their preceding content
+    node = text
+    while node is not soup:
+        for sibling in list(node.next_siblings):
+            sibling.extract()
+        node = node.parent
+    if kept.strip():
+        text.replace_with(NavigableString(kept))
+    else:
+        text.extract()
+    return True
+
+def _convert_job(job: dict[str, Any]) -> str:
+    """Convert a single job in a worker process (module-level so that it can be pickled)."""
+    return EmailConverter.html_to_markdown(**job)
+
+class ConversionPool:
+    """Runs EmailConverter.html_to_markdown in worker processes so conversions scale with CPU cores."""
+
+    def __init__(self, max_workers: Optional[int] = None, chunksize: int = DEFAULT_CHUNKSIZE) -> None:
+        """
+        Start the worker processes.
+        :param max_workers: Number of processes. Defaults to the number of CPUs.
+        :param chunksize: Number of jobs submitted to a worker at once, to amortize IPC overhead.
+        """
+        self.chunksize = chunksize
+        # Workers are spawned rather than forked because the parent runs API threads,
+        # and forking a multi-threaded process can deadlock the child
+        self._executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def convert_many(self, jobs: list[dict[str, Any]]) -> list[str]:
+        """
+        Convert multiple emails in parallel.
+        The output is identical to calling html_to_markdown for each job serially.
+
+        :param jobs: Keyword arguments for html_to_markdown (html_content, subject, date, footer_starts_with, ...).
+        :return: Converted Markdown strings in job order.
+        """
+        return list(self._executor.map(_convert_job, jobs, chunksize=self.chunksize))
+
+    def close(self) -> None:
+        """Shut down the worker processes."""
+        self._executor.shutdown()
+
+    def __enter__(self) -> "ConversionPool":
+        return self
 
-        return header + markdown_text
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
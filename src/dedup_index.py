@@ -0,0 +1,126 @@
+import os
+import json
+import threading
+from typing import Any, Iterable, Optional
+
+from src import storage
+from src.config import AppConfig
+from src.drive_client import DriveClient, MESSAGE_ID_PROPERTY
+
+class DedupIndex:
+    """
+    Local index of already uploaded messages, keyed by Gmail message ID and by target filename.
+    Stored as append-only JSONL (one record per uploaded file) on a local path or Cloud Storage.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        """
+        Load the index.
+        :param path: Local path or gs://bucket/object URL. Loaded from DEDUP_INDEX_PATH environment variable if not provided.
+        """
+        if path is None:
+            path = os.environ.get("DEDUP_INDEX_PATH")
+
+        if not path:
+            raise ValueError("Environment variable DEDUP_INDEX_PATH is not set.")
+
+        self.path = path
+        self._message_ids: set[str] = set()
+        self._files: set[tuple[str, str]] = set()
+        self._pending: list[dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        """Read all records from the index file. A missing file means an empty index."""
+        data = storage.read_bytes(self.path)
+        if not data:
+            return
+
+        for line in data.decode("utf-8").splitlines():
+            if line.strip():
+                self._index(json.loads(line))
+
+    def _index(self, record: dict[str, Any]) -> None:
+        """Register a record in the in-memory lookup sets."""
+        if record.get('message_id'):
+            self._message_ids.add(record['message_id'])
+        self._files.add((record['folder_id'], record['filename']))
+
+    def contains_message(self, message_id: str) -> bool:
+        """Check if the message has already been uploaded."""
+        return message_id in self._message_ids
+
+    def contains_file(self, filename: str, folder_id: str) -> bool:
+        """Check if a file with the same name already exists in the folder."""
+        return (folder_id, filename) in self._files
+
+    def add(self, filename: str, folder_id: str, message_id: Optional[str] = None, file_id: Optional[str] = None) -> None:
+        """
+        Record an uploaded file. Call save() to persist it.
+
+        :param filename: Name of the file in Drive.
+        :param folder_id: Destination folder ID.
+        :param message_id: Source Gmail message ID.
+        :param file_id: ID of the created Drive file.
+        """
+        record = {'message_id': message_id, 'folder_id': folder_id, 'filename': filename, 'file_id': file_id}
+        with self._lock:
+            self._index(record)
+            self._pending.append(record)
+
+    def save(self) -> None:
+        """Append records added since the last save to the index file."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+
+        if pending:
+            storage.append_bytes(self.path, self._serialize(pending))
+
+    def reconcile(self, drive_client: DriveClient, folder_ids: Iterable[str]) -> int:
+        """
+        Rebuild the index from Drive with one paginated listing per folder and rewrite the index file.
+        Message IDs are restored from the appProperties recorded at upload time.
+
+        :param drive_client: Client used to list the folders.
+        :param folder_ids: Folders to scan.
+        :return: Number of indexed files.
+        """
+        records = []
+        for folder_id in folder_ids:
+            for file in drive_client.list_files(folder_id):
+                records.append({
+                    'message_id': file.get('appProperties', {}).get(MESSAGE_ID_PROPERTY),
+                    'folder_id': folder_id,
+                    'filename': file['name'],
+                    'file_id': file['id']
+                })
+
+        self._message_ids = set()
+        self._files = set()
+        self._pending = []
+        for record in records:
+            self._index(record)
+
+        storage.write_bytes(self.path, self._serialize(records))
+        return len(records)
+
+    @staticmethod
+    def _serialize(records: list[dict[str, Any]]) -> bytes:
+        """Encode records as JSONL."""
+        return "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+
+def reconcile_index() -> None:
+    """Rebuild the index from the folders of all configured newsletters."""
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    config = AppConfig()
+    index = DedupIndex()
+    folder_ids = list(dict.fromkeys(newsletter.folder_id for newsletter in config.newsletters))
+    count = index.reconcile(DriveClient(), folder_ids)
+    print(f"Indexed {count} files from {len(folder_ids)} folders into {index.path}.")
+
+if __name__ == "__main__":
+    # Usage: python -m src.dedup_index
+    reconcile_index()
@@ -1,71 +1,152 @@
 import os
 import io
-from googleapiclient.discovery import build
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from googleapiclient.http import MediaIoBaseUpload
 from google.oauth2.credentials import Credentials
-from typing import Optional
+from src import rate_limit
+from src.google_services import get_credentials, get_service
+from typing import Any, Iterator, NotRequired, Optional, TypedDict, Union
+
+logger = logging.getLogger(__name__)
+
+# Custom file property that records the source Gmail message of an uploaded file
+MESSAGE_ID_PROPERTY = 'gmailMessageId'
+
+# Files up to this size (bytes) are sent in a single multipart request; larger ones use a resumable session.
+# A resumable upload costs an extra round trip to open the session, which dominates for small files.
+DEFAULT_RESUMABLE_THRESHOLD = 5 * 1024 * 1024
+# Bytes sent per request of a resumable upload (must be a multiple of 256 KiB)
+DEFAULT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Maximum number of calls grouped into a single HTTP batch request
+BATCH_SIZE = 100
+# Default number of concurrent uploads of upload_many
+DEFAULT_UPLOAD_WORKERS = 4
+
+class UploadItem(TypedDict):
+    """A Markdown file to upload with DriveClient.upload_many."""
+    filename: str
+    content: str
+    folder_id: str
+    message_id: NotRequired[Optional[str]]
+
+# Upload workers are shared at module scope, so warm instances keep their threads
+# (and the API service objects and connections bound to them) across invocations
+_upload_pool: Optional[ThreadPoolExecutor] = None
+_upload_pool_lock = threading.Lock()
+
+def _get_upload_pool() -> ThreadPoolExecutor:
+    """Get the upload worker pool (DRIVE_UPLOAD_WORKERS threads), creating it on first use."""
+    global _upload_pool
+    with _upload_pool_lock:
+        if _upload_pool is None:
+            max_workers = int(os.environ.get("DRIVE_UPLOAD_WORKERS", str(DEFAULT_UPLOAD_WORKERS)))
+            _upload_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="drive-upload")
+        return _upload_pool
 
 class DriveClient:
     """Handles interactions with the Google Drive API."""
 
-    def __init__(self, credentials: Optional[Credentials] = None) -> None:
+    def __init__(self, credentials: Optional[Credentials] = None, cache_listings: bool = False) -> None:
         """
         Initialize the Google Drive API client.
-        :param credentials: Credentials object. Generates from env vars if not provided.
+        :param credentials: Credentials object. Uses the shared credentials from env vars if not provided.
+        :param cache_listings: If True, each folder is listed once and file_exists() becomes a set lookup.
         """
         if credentials is None:
-            credentials = self._get_credentials_from_env()
+            credentials = get_credentials()
         
-        self.service = build('drive', 'v3', credentials=credentials)
-
-    def _get_credentials_from_env(self) -> Credentials:
-        """Generate OAuth 2.0 credentials from environment variables."""
-        client_id = os.environ.get("GCP_CLIENT_ID")
-        client_secret = os.environ.get("GCP_CLIENT_SECRET")
-        refresh_token = os.environ.get("GCP_REFRESH_TOKEN")
-
-        if not all([client_id, client_secret, refresh_token]):
-            raise ValueError("Required environment variables are not set.")
-
-        return Credentials(
-            token=None,
-            refresh_token=refresh_token,
-            client_id=client_id,
-            client_secret=client_secret,
-            token_uri="https://oauth2.googleapis.com/token"
-        )
+        # Service objects are cached per thread at module scope, so warm instances reuse them
+        self._credentials = credentials
+        get_service('drive', 'v3', credentials)
+        # Quota is per user, so all clients share one limiter
+        self._limiter = rate_limit.get_limiter('drive')
+        self.cache_listings = cache_listings
+        self.resumable_threshold = int(os.environ.get("DRIVE_RESUMABLE_THRESHOLD", str(DEFAULT_RESUMABLE_THRESHOLD)))
+        self.upload_chunk_size = int(os.environ.get("DRIVE_UPLOAD_CHUNK_SIZE", str(DEFAULT_UPLOAD_CHUNK_SIZE)))
+        # Folder ID -> names of files in the folder (populated on first lookup)
+        self._folder_files: dict[str, set[str]] = {}
+        self._folder_lock = threading.Lock()
+
+    @property
+    def service(self) -> Any:
+        """API service object bound to the current thread (built on first use in each thread)."""
+        return get_service('drive', 'v3', self._credentials)
 
-    def upload_markdown(self, filename: str, content: str, folder_id: str) -> str:
+    def _execute(self, request: Any) -> Any:
+        """Execute a request within the Drive quota, retrying quota and transient server errors."""
+        return rate_limit.execute(request, self._limiter)
+
+    def upload_markdown(self, filename: str, content: str, folder_id: str, message_id: Optional[str] = None) -> str:
         """
         Upload a Markdown string as a file to Google Drive.
         
         :param filename: Desired name of the file in Drive.
         :param content: Markdown text content.
         :param folder_id: ID of the destination folder.
+        :param message_id: Source Gmail message ID, stored in appProperties for later reconciliation.
         :return: ID of the created file.
         """
-        file_metadata = {
+        file_metadata: dict[str, Any] = {
             'name': filename,
             'parents': [folder_id],
             'mimeType': 'text/markdown'
         }
+        if message_id:
+            file_metadata['appProperties'] = {MESSAGE_ID_PROPERTY: message_id}
         
-        # Convert string to binary stream for upload
+        # Encode once; BytesIO shares the encoded buffer instead of copying it
+        data = content.encode('utf-8')
+        resumable = len(data) > self.resumable_threshold
         media = MediaIoBaseUpload(
-            io.BytesIO(content.encode('utf-8')),
+            io.BytesIO(data),
             mimetype='text/markdown',
-            resumable=True
+            chunksize=self.upload_chunk_size,
+            resumable=resumable
         )
 
-        file = self.service.files().create(
+        request = self.service.files().create(
             body=file_metadata,
             media_body=media,
             fields='id',
             supportsAllDrives=True
-        ).execute()
+        )
+        if resumable:
+            file = rate_limit.execute_resumable(request, self._limiter, description=filename)
+        else:
+            # Metadata and content in a single multipart request
+            file = self._execute(request)
+
+        # Keep files uploaded during this run visible to subsequent lookups
+        with self._folder_lock:
+            if folder_id in self._folder_files:
+                self._folder_files[folder_id].add(filename)
 
         return file.get('id', '')
 
+    def upload_many(self, items: list[UploadItem]) -> list[Union[str, Exception]]:
+        """
+        Upload several Markdown files concurrently on a bounded worker pool (DRIVE_UPLOAD_WORKERS).
+        Media uploads cannot be sent in batch requests, so each file is still its own request;
+        a failed upload does not stop the others.
+
+        :param items: Files to upload.
+        :return: ID of the created file, or the exception the upload failed with, for each item in input order.
+        """
+        pool = _get_upload_pool()
+        futures = [
+            pool.submit(self.upload_markdown, item['filename'], item['content'], item['folder_id'], message_id=item.get('message_id'))
+            for item in items
+        ]
+        results: list[Union[str, Exception]] = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
     def file_exists(self, filename: str, folder_id: str) -> bool:
         """
         Check if a file with the same name already exists in the folder.
@@ -74,16 +155,83 @@ class DriveClient:
         :param folder_id: Destination folder ID.
         :return: True if file exists, False otherwise.
         """
+        if self.cache_listings:
+            # Hold the lock while listing so concurrent callers do not list the same folder twice
+            with self._folder_lock:
+                if folder_id not in self._folder_files:
+                    self._folder_files[folder_id] = {
+                        file['name'] for file in self.list_files(folder_id, fields="nextPageToken, files(name, id, md5Checksum)")
+                    }
+                return filename in self._folder_files[folder_id]
+
+        results = self._execute(self._exists_request(filename, folder_id))
+        return len(results.get('files', [])) > 0
+
+    def files_exist(self, filenames: list[str], folder_id: str) -> list[bool]:
+        """
+        Check several filenames at once. Without cached listings, the queries are sent
+        in batch requests of BATCH_SIZE calls instead of one HTTP request per file.
+
+        :param filenames: Filenames to check.
+        :param folder_id: Destination folder ID.
+        :return: Whether each file exists, in input order.
+        """
+        if self.cache_listings:
+            return [self.file_exists(filename, folder_id) for filename in filenames]
+
+        exists = []
+        for start in range(0, len(filenames), BATCH_SIZE):
+            chunk = filenames[start:start + BATCH_SIZE]
+            responses = rate_limit.execute_batch(
+                self.service.new_batch_http_request,
+                [self._exists_request(filename, folder_id) for filename in chunk],
+                self._limiter
+            )
+            for response in responses:
+                if isinstance(response, Exception):
+                    raise response
+                exists.append(len(response.get('files', [])) > 0)
+        return exists
+
+    def _exists_request(self, filename: str, folder_id: str) -> Any:
+        """Build the (unexecuted) query for a file by name in a folder."""
         # Escape single quotes in filename for Google Drive API query
         escaped_filename = filename.replace("'", "\\'")
         
         # Query: matching name, matching parent, and not in trash
         # supportsAllDrives and includeItemsFromAllDrives are required for Shared Drives
         query = f"name = '{escaped_filename}' and '{folder_id}' in parents and trashed = false"
-        results = self.service.files().list(
+        return self.service.files().list(
             q=query,
             fields="files(id, name)",
             supportsAllDrives=True,
             includeItemsFromAllDrives=True
-        ).execute()
-        return len(results.get('files', [])) > 0
+        )
+
+    def list_files(
+        self,
+        folder_id: str,
+        fields: str = "nextPageToken, files(id, name, appProperties)"
+    ) -> Iterator[dict[str, Any]]:
+        """
+        List all files in a folder, following pagination (up to 1000 files per request).
+        
+        :param folder_id: Folder ID to list.
+        :param fields: Partial response mask. Must include nextPageToken.
+        :return: Iterator of file resources.
+        """
+        params: dict[str, Any] = {
+            'q': f"'{folder_id}' in parents and trashed = false",
+            'pageSize': 1000,
+            'fields': fields,
+            'supportsAllDrives': True,
+            'includeItemsFromAllDrives': True
+        }
+        while True:
+            results = self._execute(self.service.files().list(**params))
+            yield from results.get('files', [])
+
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return
+            params['pageToken'] = page_token
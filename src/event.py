@@ -0,0 +1,9 @@
+from typing import Any
+
+def event_payload(event: Any) -> dict[str, Any]:
+    """JSON payload of a Cloud Functions trigger (HTTP request or event dict), or {} if there is none."""
+    payload = event
+    if hasattr(event, 'get_json'):
+        # HTTP trigger (flask.Request)
+        payload = event.get_json(silent=True)
+    return payload if isinstance(payload, dict) else {}
@@ -1,49 +1,207 @@
+import io
 import os
+import re
 import base64
+import codecs
+import logging
 import email.utils
+import email.policy
+from email.parser import BytesFeedParser
 from datetime import datetime
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from typing import Any, Optional
+from src import rate_limit
+from src.google_services import get_credentials, get_service
+from googleapiclient.errors import HttpError
+from typing import Any, Callable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of calls grouped into a single HTTP batch request
+BATCH_SIZE = 100
+
+# Largest page size accepted by messages.list
+LIST_PAGE_SIZE = 500
+
+# Message formats supported by get_message_details ('full': parsed MIME tree, 'raw': RFC 822 source)
+MESSAGE_FORMATS = ('full', 'raw')
+# Number of base64 characters decoded at a time (a multiple of 4)
+BASE64_CHUNK_SIZE = 1 << 20
+# Headers requested by get_messages_metadata (enough to build the Drive filename)
+METADATA_HEADERS = ['Subject', 'Date']
+# Partial response mask of metadata requests (drops snippet, labelIds, sizeEstimate, etc.)
+METADATA_FIELDS = "id,payload/headers"
+# Partial response mask of metadata requests that also return the labels (used to route combined searches)
+METADATA_LABEL_FIELDS = "id,labelIds,payload/headers"
 
 class GmailClient:
     """Handles interactions with the Gmail API."""
 
-    def __init__(self, credentials: Optional[Credentials] = None) -> None:
+    def __init__(self, credentials: Optional[Credentials] = None, message_format: Optional[str] = None) -> None:
         """
         Initialize the Gmail API client.
-        :param credentials: Credentials object. Generates from env vars if not provided.
+        :param credentials: Credentials object. Uses the shared credentials from env vars if not provided.
+        :param message_format: 'full' or 'raw'. Loaded from GMAIL_MESSAGE_FORMAT (default: 'full') if not provided.
         """
         if credentials is None:
-            credentials = self._get_credentials_from_env()
+            credentials = get_credentials()
+
+        if message_format is None:
+            message_format = os.environ.get("GMAIL_MESSAGE_FORMAT", "full")
+        if message_format not in MESSAGE_FORMATS:
+            raise ValueError(f"Unsupported message format: {message_format} (expected one of {', '.join(MESSAGE_FORMATS)})")
+        self.message_format = message_format
         
-        self.service = build('gmail', 'v1', credentials=credentials)
-
-    def _get_credentials_from_env(self) -> Credentials:
-        """Generate OAuth 2.0 credentials from environment variables."""
-        client_id = os.environ.get("GCP_CLIENT_ID")
-        client_secret = os.environ.get("GCP_CLIENT_SECRET")
-        refresh_token = os.environ.get("GCP_REFRESH_TOKEN")
-
-        if not all([client_id, client_secret, refresh_token]):
-            raise ValueError("Required environment variables (GCP_CLIENT_ID, GCP_CLIENT_SECRET, GCP_REFRESH_TOKEN) are not set.")
-
-        return Credentials(
-            token=None,
-            refresh_token=refresh_token,
-            client_id=client_id,
-            client_secret=client_secret,
-            token_uri="https://oauth2.googleapis.com/token"
-        )
+        # Service objects are cached per thread at module scope, so warm instances reuse them
+        self._credentials = credentials
+        get_service('gmail', 'v1', credentials)
+        # Quota is per user, so all clients share one limiter
+        self._limiter = rate_limit.get_limiter('gmail')
+        self._label_ids: Optional[dict[str, str]] = None
 
-    def search_messages(self, query: str) -> list[dict[str, str]]:
+    @property
+    def service(self) -> Any:
+        """API service object bound to the current thread (built on first use in each thread)."""
+        return get_service('gmail', 'v1', self._credentials)
+
+    def _execute(self, request: Any) -> Any:
+        """Execute a request within the Gmail quota, retrying quota and transient server errors."""
+        return rate_limit.execute(request, self._limiter)
+
+    def search_messages(self, query: str) -> Iterator[dict[str, str]]:
         """
         Search for Gmail messages matching the specified query.
+        Result pages are requested lazily, following nextPageToken until exhausted.
+        :param query: Search query (e.g., label:news)
+        :return: Iterator of message metadata containing IDs (newest first).
+        """
+        params: dict[str, Any] = {'userId': 'me', 'q': query}
+        while True:
+            results = self._execute(self.service.users().messages().list(**params))
+            yield from results.get('messages', [])
+
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return
+            params['pageToken'] = page_token
+
+    def list_messages_page(
+        self,
+        query: str,
+        page_token: Optional[str] = None,
+        max_results: int = LIST_PAGE_SIZE
+    ) -> tuple[list[str], Optional[str]]:
+        """
+        Fetch a single page of message IDs matching the query.
+        Unlike search_messages(), the page token is exposed so that callers can checkpoint their position.
+        :param query: Search query (e.g., label:news)
+        :param page_token: Token of the page to fetch (first page if None).
+        :param max_results: Page size (at most 500).
+        :return: Tuple of (message IDs newest first, token of the next page or None on the last page).
+        """
+        params: dict[str, Any] = {'userId': 'me', 'q': query, 'maxResults': max_results, 'fields': 'messages/id,nextPageToken'}
+        if page_token:
+            params['pageToken'] = page_token
+        results = self._execute(self.service.users().messages().list(**params))
+        return [msg['id'] for msg in results.get('messages', [])], results.get('nextPageToken')
+
+    def search_message_ids(self, query: str) -> Iterator[str]:
+        """
+        Search for the IDs of all messages matching the query, in pages of LIST_PAGE_SIZE with a fields mask.
+        Suited to queries expected to match many messages (e.g., the combined query of src.query_planner).
+        :param query: Search query
+        :return: Iterator of message IDs (newest first).
+        """
+        page_token = None
+        while True:
+            message_ids, page_token = self.list_messages_page(query, page_token)
+            yield from message_ids
+            if not page_token:
+                return
+
+    def get_history_id(self) -> str:
+        """
+        Get the current historyId of the mailbox.
+        Store it after a run and pass it to search_new_messages() on the next run.
+        """
+        profile = self._execute(self.service.users().getProfile(userId='me'))
+        return str(profile['historyId'])
+
+    def search_new_messages(self, query: str, start_history_id: str) -> Iterator[dict[str, str]]:
+        """
+        Search for messages matching the query that were added since start_history_id.
+        Uses users.history.list so the cost is proportional to new mail, not to the label size.
+        Falls back to a full search_messages() when the query is not a single label
+        or the history record has expired.
         :param query: Search query (e.g., label:news)
-        :return: List of message metadata containing IDs.
+        :param start_history_id: historyId stored by a previous run.
+        :return: Iterator of message metadata containing IDs (newest first).
+        """
+        label_id = self.resolve_label_query(query)
+        if label_id is None:
+            yield from self.search_messages(query)
+            return
+
+        try:
+            messages = self._list_added_messages(start_history_id, label_id)
+        except HttpError as e:
+            # 404 means startHistoryId is too old; a full sync is required
+            if e.resp.status != 404:
+                raise
+            logger.warning(f"History {start_history_id} has expired. Falling back to full search.")
+            yield from self.search_messages(query)
+            return
+
+        # History is returned oldest first; match the ordering of search_messages()
+        yield from reversed(messages)
+
+    def _list_added_messages(self, start_history_id: str, label_id: str) -> list[dict[str, str]]:
+        """Collect messages that received the label after start_history_id, following all history pages."""
+        messages: list[dict[str, str]] = []
+        seen: set[str] = set()
+        params: dict[str, Any] = {
+            'userId': 'me',
+            'startHistoryId': start_history_id,
+            'labelId': label_id,
+            'historyTypes': ['messageAdded', 'labelAdded'],
+        }
+        while True:
+            results = self._execute(self.service.users().history().list(**params))
+            for record in results.get('history', []):
+                added = record.get('messagesAdded', []) + record.get('labelsAdded', [])
+                for item in added:
+                    msg = item['message']
+                    if label_id not in msg.get('labelIds', []) or msg['id'] in seen:
+                        continue
+                    seen.add(msg['id'])
+                    messages.append({'id': msg['id'], 'threadId': msg.get('threadId', '')})
+
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return messages
+            params['pageToken'] = page_token
+
+    def resolve_label_query(self, query: str) -> Optional[str]:
+        """
+        Resolve a query consisting of a single 'label:xxx' term to the label ID.
+        :return: Label ID, or None if the query is more complex or the label is unknown.
+        """
+        match = re.fullmatch(r'\s*label:(\S+)\s*', query)
+        if not match:
+            return None
+
+        if self._label_ids is None:
+            labels = self._execute(self.service.users().labels().list(userId='me')).get('labels', [])
+            self._label_ids = {self._normalize_label_name(label['name']): label['id'] for label in labels}
+
+        return self._label_ids.get(self._normalize_label_name(match.group(1)))
+
+    @staticmethod
+    def _normalize_label_name(name: str) -> str:
+        """
+        Normalize a label name the way Gmail search does
+        (e.g., '週刊Life is beautiful (まぐまぐ!)' -> '週刊life-is-beautiful-まぐまぐ-').
         """
-        results = self.service.users().messages().list(userId='me', q=query).execute()
-        return results.get('messages', [])
+        return re.sub(r'[^\w]+', '-', name.lower())
 
     def get_message_details(self, message_id: str) -> dict[str, Any]:
         """
@@ -51,10 +209,106 @@ class GmailClient:
         :param message_id: Gmail message ID.
         :return: Dictionary of extracted email data.
         """
-        msg = self.service.users().messages().get(userId='me', id=message_id, format='full').execute()
-        payload = msg['payload']
-        headers = payload.get('headers', [])
+        msg = self._execute(self.service.users().messages().get(userId='me', id=message_id, format=self.message_format))
+        return self._parse_message(message_id, msg)
+
+    def get_messages_metadata(self, message_ids: list[str], with_labels: bool = False) -> list[dict[str, Any]]:
+        """
+        Retrieve only Subject and Date for multiple message IDs via the Gmail batch endpoint.
+        Uses format='metadata' with a fields mask, so no message body is transferred.
+        :param message_ids: Gmail message IDs.
+        :param with_labels: Also return the label IDs of each message ('label_ids').
+        :return: List of dictionaries with 'id', 'subject' and 'date' in input order.
+                 Entries that failed to be fetched contain 'id' and 'error' (the raised exception) instead.
+        """
+        def _request(message_id: str) -> Any:
+            return self.service.users().messages().get(
+                userId='me', id=message_id, format='metadata',
+                metadataHeaders=METADATA_HEADERS, fields=METADATA_LABEL_FIELDS if with_labels else METADATA_FIELDS
+            )
+
+        def _parse(message_id: str, msg: dict[str, Any]) -> dict[str, Any]:
+            subject, date_str = self._parse_headers(msg.get('payload', {}).get('headers', []))
+            entry = {'id': message_id, 'subject': subject, 'date': self._parse_date(date_str)}
+            if with_labels:
+                entry['label_ids'] = msg.get('labelIds', [])
+            return entry
+
+        return self._batch_get(message_ids, _request, _parse)
+
+    def get_messages_details(self, message_ids: list[str]) -> list[dict[str, Any]]:
+        """
+        Retrieve details for multiple message IDs via the Gmail batch endpoint.
+        Up to BATCH_SIZE requests are grouped into a single HTTP round trip (fewer if they exceed the quota bucket).
+        :param message_ids: Gmail message IDs.
+        :return: List of extracted email data in input order.
+                 Entries that failed to be fetched contain 'id' and 'error' (the raised exception) instead.
+        """
+        return self._batch_get(
+            message_ids,
+            lambda message_id: self.service.users().messages().get(userId='me', id=message_id, format=self.message_format),
+            self._parse_message
+        )
+
+    def _batch_get(
+        self,
+        message_ids: list[str],
+        build_request: Callable[[str], Any],
+        parse: Callable[[str, dict[str, Any]], dict[str, Any]]
+    ) -> list[dict[str, Any]]:
+        """
+        Execute one request per message ID in batches of BATCH_SIZE and parse the responses.
+        :param message_ids: Gmail message IDs.
+        :param build_request: Builds the (unexecuted) request of a message ID.
+        :param parse: Converts a message ID and its response into the result entry.
+        :return: Parsed results in input order, with {'id', 'error'} entries for failures.
+        """
+        results: list[dict[str, Any]] = []
+        for start in range(0, len(message_ids), BATCH_SIZE):
+            chunk = message_ids[start:start + BATCH_SIZE]
+            responses = rate_limit.execute_batch(
+                self.service.new_batch_http_request, [build_request(message_id) for message_id in chunk], self._limiter
+            )
+
+            # Parse after the batch completes, since parsing may fetch attachment-backed bodies.
+            # Each resource is released once parsed to keep memory bounded by a single batch.
+            for index, message_id in enumerate(chunk):
+                response, responses[index] = responses[index], None
+                if isinstance(response, Exception):
+                    results.append({'id': message_id, 'error': response})
+                    continue
+                try:
+                    results.append(parse(message_id, response))
+                except Exception as e:
+                    results.append({'id': message_id, 'error': e})
+
+        return results
+
+    def _parse_message(self, message_id: str, msg: dict[str, Any]) -> dict[str, Any]:
+        """
+        Extract Subject, HTML body and Date from a 'full' or 'raw' format message resource.
+        :param message_id: Gmail message ID.
+        :param msg: Message resource returned by the Gmail API.
+        :return: Dictionary of extracted email data.
+        """
+        if 'raw' in msg:
+            subject, date_str, html_content = self._parse_raw_message(msg['raw'])
+        else:
+            subject, date_str, html_content = self._parse_full_message(message_id, msg['payload'])
 
+        return {
+            'id': message_id,
+            'subject': subject,
+            'html_content': html_content,
+            'date': self._parse_date(date_str)
+        }
+
+    @staticmethod
+    def _parse_headers(headers: list[dict[str, str]]) -> tuple[str, str]:
+        """
+        Extract Subject and Date from message headers.
+        :return: Tuple of (subject, date string).
+        """
         subject = ""
         date_str = ""
         for header in headers:
@@ -62,27 +316,109 @@ class GmailClient:
                 subject = header['value']
             if header['name'] == 'Date':
                 date_str = header['value']
+        return subject, date_str
+
+    @staticmethod
+    def _parse_date(date_str: str) -> datetime:
+        """Convert a Date header to a Python datetime object (the current time if missing)."""
+        return email.utils.parsedate_to_datetime(date_str) if date_str else datetime.now()
+
+    def _parse_full_message(self, message_id: str, payload: dict[str, Any]) -> tuple[str, str, str]:
+        """
+        Extract Subject, Date and the HTML body from the MIME tree of a 'full' format message.
+        :return: Tuple of (subject, date string, HTML content).
+        """
+        subject, date_str = self._parse_headers(payload.get('headers', []))
 
-        # Extract HTML content from message parts or directly from body
+        # Extract HTML content from (nested) message parts or directly from body
         html_content = ""
-        if 'parts' in payload:
-            for part in payload['parts']:
-                if part['mimeType'] == 'text/html':
-                    data = part['body'].get('data')
-                    if data:
-                        html_content = base64.urlsafe_b64decode(data).decode('utf-8')
-                        break
-        else:
-            data = payload.get('body', {}).get('data')
-            if data:
-                html_content = base64.urlsafe_b64decode(data).decode('utf-8')
+        part = self._find_html_part(payload)
+        if part is not None:
+            data = part['body'].get('data')
+            if not data:
+                # Large bodies are not inlined; download them only once the part is selected
+                data = self._execute(self.service.users().messages().attachments().get(
+                    userId='me', messageId=message_id, id=part['body']['attachmentId']
+                ))['data']
+            html_content = self._decode_body(data, self._part_charset(part))
+        return subject, date_str, html_content
 
-        # Convert date string to Python datetime object
-        dt = email.utils.parsedate_to_datetime(date_str) if date_str else datetime.now()
+    @staticmethod
+    def _find_html_part(payload: dict[str, Any]) -> Optional[dict[str, Any]]:
+        """
+        Find the first text/html part with a body, walking nested multiparts
+        (e.g., multipart/mixed > multipart/related > multipart/alternative) depth-first.
+        A single-part message returns its own body, whatever its type.
+        """
+        if 'parts' not in payload:
+            body = payload.get('body', {})
+            return payload if body.get('data') or body.get('attachmentId') else None
 
-        return {
-            'id': message_id,
-            'subject': subject,
-            'html_content': html_content,
-            'date': dt
-        }
+        stack = list(reversed(payload['parts']))
+        while stack:
+            part = stack.pop()
+            if 'parts' in part:
+                stack.extend(reversed(part['parts']))
+            elif part.get('mimeType') == 'text/html' and (part['body'].get('data') or part['body'].get('attachmentId')):
+                return part
+        return None
+
+    @staticmethod
+    def _part_charset(part: dict[str, Any]) -> str:
+        """Charset declared in the Content-Type header of a part (default: utf-8)."""
+        for header in part.get('headers', []):
+            if header['name'].lower() == 'content-type':
+                match = re.search(r'charset="?([^";\s]+)', header['value'], re.IGNORECASE)
+                if match:
+                    return match.group(1)
+        return 'utf-8'
+
+    @staticmethod
+    def _decode_body(data: str, charset: str, chunk_size: int = BASE64_CHUNK_SIZE) -> str:
+        """
+        Decode a base64url body into text of the given charset, one chunk at a time.
+        An incremental decoder carries multibyte characters split across chunks over to the next one,
+        so the decoded bytes are never held in full.
+        """
+        try:
+            decoder = codecs.getincrementaldecoder(charset)()
+        except LookupError:
+            decoder = codecs.getincrementaldecoder('utf-8')()
+        text = io.StringIO()
+        for chunk in GmailClient._iter_base64_chunks(data, chunk_size):
+            text.write(decoder.decode(chunk))
+        text.write(decoder.decode(b"", final=True))
+        return text.getvalue()
+
+    @staticmethod
+    def _iter_base64_chunks(data: str, chunk_size: int = BASE64_CHUNK_SIZE) -> Iterator[bytes]:
+        """Decode base64url data incrementally, BASE64_CHUNK_SIZE characters at a time."""
+        for start in range(0, len(data), chunk_size):
+            chunk = data[start:start + chunk_size]
+            if start + chunk_size >= len(data):
+                # Gmail may omit the padding of the last quantum
+                chunk += "=" * (-len(chunk) % 4)
+            yield base64.urlsafe_b64decode(chunk)
+
+    @staticmethod
+    def _parse_raw_message(raw: str) -> tuple[str, str, str]:
+        """
+        Extract Subject, Date and the HTML body from a 'raw' format message.
+        The RFC 822 source is decoded and fed to the parser chunk by chunk instead of materializing it first.
+        :return: Tuple of (subject, date string, HTML content).
+        """
+        parser = BytesFeedParser(policy=email.policy.default)
+        for chunk in GmailClient._iter_base64_chunks(raw):
+            parser.feed(chunk)
+        message = parser.close()
+
+        html_content = ""
+        if message.is_multipart():
+            for part in message.walk():
+                if part.get_content_type() == 'text/html' and not part.is_attachment():
+                    html_content = part.get_content()
+                    break
+        else:
+            html_content = message.get_content()
+
+        return str(message.get('Subject', "")), str(message.get('Date', "")), html_content
@@ -0,0 +1,125 @@
+import os
+import json
+import threading
+from functools import lru_cache
+from typing import Any, Optional
+import httplib2
+import google_auth_httplib2
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+DEFAULT_TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+# Module-level caches survive across invocations on a warm Cloud Functions instance.
+# Credentials are shared by all clients and threads (google-auth refreshes them in place).
+_credentials_cache: dict[tuple[Optional[str], ...], Credentials] = {}
+_credentials_lock = threading.Lock()
+# googleapiclient/httplib2 is not thread-safe, so service objects are cached per thread
+_local = threading.local()
+
+def get_credentials_from_env() -> Credentials:
+    """
+    Generate OAuth 2.0 credentials from environment variables.
+    GOOGLE_TOKEN_URI overrides the token endpoint (e.g., for a local fake server).
+    """
+    client_id = os.environ.get("GCP_CLIENT_ID")
+    client_secret = os.environ.get("GCP_CLIENT_SECRET")
+    refresh_token = os.environ.get("GCP_REFRESH_TOKEN")
+
+    if not all([client_id, client_secret, refresh_token]):
+        raise ValueError("Required environment variables (GCP_CLIENT_ID, GCP_CLIENT_SECRET, GCP_REFRESH_TOKEN) are not set.")
+
+    return Credentials(
+        token=None,
+        refresh_token=refresh_token,
+        client_id=client_id,
+        client_secret=client_secret,
+        token_uri=os.environ.get("GOOGLE_TOKEN_URI", DEFAULT_TOKEN_URI)
+    )
+
+def get_credentials() -> Credentials:
+    """
+    Get the shared, refreshed OAuth 2.0 credentials of the environment.
+    The access token is requested once and reused by Gmail and Drive until it expires.
+    """
+    key = tuple(os.environ.get(name) for name in ("GCP_CLIENT_ID", "GCP_CLIENT_SECRET", "GCP_REFRESH_TOKEN", "GOOGLE_TOKEN_URI"))
+    with _credentials_lock:
+        credentials = _credentials_cache.get(key)
+        if credentials is None:
+            credentials = get_credentials_from_env()
+            _credentials_cache[key] = credentials
+        if not credentials.valid:
+            # Refresh over httplib2, the transport googleapiclient uses anyway (avoids loading requests)
+            credentials.refresh(google_auth_httplib2.Request(httplib2.Http()))
+        return credentials
+
+@lru_cache(maxsize=None)
+def load_discovery_document(api: str, version: str) -> dict[str, Any]:
+    """
+    Load and parse the discovery document bundled with google-api-python-client (no network fetch).
+
+    :param api: API name (e.g., 'gmail').
+    :param version: API version (e.g., 'v1').
+    :return: Parsed discovery document. Shared by all callers, so do not modify it.
+    """
+    document = get_static_doc(api, version)
+    if document is None:
+        raise ValueError(f"No bundled discovery document for {api} {version}.")
+    return json.loads(document)
+
+def build_service(api: str, version: str, credentials: Optional[Credentials]) -> Any:
+    """
+    Build a Google API service object from the bundled discovery document.
+    If GOOGLE_API_ROOT_URL is set (e.g., http://127.0.0.1:8080/), every call of the service,
+    including batch requests and media uploads, is sent to that server instead of Google.
+
+    :param api: API name (e.g., 'gmail').
+    :param version: API version (e.g., 'v1').
+    :param credentials: Credentials used to authorize requests.
+    :return: Service object.
+    """
+    document = load_discovery_document(api, version)
+
+    root_url = os.environ.get("GOOGLE_API_ROOT_URL")
+    if root_url:
+        # Batch and upload URLs are derived from rootUrl of the discovery document
+        # (client_options.api_endpoint only overrides the base URL), so rewrite the document itself.
+        if not root_url.endswith("/"):
+            root_url += "/"
+        document = {
+            **document,
+            'rootUrl': root_url,
+            'mtlsRootUrl': root_url,
+            'baseUrl': root_url + document['servicePath'],
+        }
+    return build_from_document(document, credentials=credentials)
+
+def get_service(api: str, version: str, credentials: Optional[Credentials] = None) -> Any:
+    """
+    Get the cached service object of the current thread, building it on first use.
+
+    :param api: API name (e.g., 'gmail').
+    :param version: API version (e.g., 'v1').
+    :param credentials: Credentials used to authorize requests. Defaults to the shared credentials.
+    :return: Service object.
+    """
+    if credentials is None:
+        credentials = get_credentials()
+
+    services = getattr(_local, 'services', None)
+    if services is None:
+        services = _local.services = {}
+
+    key = (api, version, os.environ.get("GOOGLE_API_ROOT_URL"), credentials)
+    service = services.get(key)
+    if service is None:
+        service = build_service(api, version, credentials)
+        services[key] = service
+    return service
+
+def clear_cache() -> None:
+    """Discard the cached credentials and the service objects of the current thread."""
+    with _credentials_lock:
+        _credentials_cache.clear()
+    _local.services = {}
@@ -1,95 +1,138 @@
+import os
 import logging
 import traceback
-import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Any
+from typing import Any, Optional
 
-from src.config import AppConfig
+from src.config import AppConfig, NewsletterConfig
 from src.gmail_client import GmailClient
 from src.drive_client import DriveClient
-from src.converter import EmailConverter
+from src.converter import ConversionPool
 from src.notifier import DiscordNotifier
-from dotenv import load_dotenv
+from src.state import StateStore
+from src.dedup_index import DedupIndex
+from src.event import event_payload
+from src.scheduler import Scheduler, shard, shard_of, state_path
+from src import pipeline, profiling
+from src.metrics import metrics
 
 # Logger configuration
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Load environment variables (from .env if it exists)
-load_dotenv()
+# Default number of worker threads for newsletters and for messages within a newsletter
+DEFAULT_MAX_WORKERS = 4
 
 def main(event: Any = None, context: Any = None) -> str:
     """
     Main entry point for the application.
     Compatible with Cloud Functions and local execution.
-    
-    :param event: Cloud Functions trigger event (unused)
+
+    :param event: Cloud Functions trigger event.
+                  {"profile": "cprofile" | "sample"} profiles this invocation,
+                  {"shard_index": i, "shard_count": n} processes only one shard of the newsletters,
+                  {"force": true} processes newsletters that are not due yet.
     :param context: Cloud Functions execution context (unused)
     :return: Execution status string
     """
+    # Load environment variables (from .env if it exists) on invocation rather than on import
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    # Optional profiling of the whole run (PROFILE env var or the event payload)
+    with profiling.profile(profiling.profiling_mode(event)):
+        return _run(event)
+
+def _run(event: Any = None) -> str:
+    """Process the due newsletters (of the requested shard) and notify the results."""
+    metrics.reset()
+
     processed_files = []
+    failed_messages = []
     notifier = None
+    dedup_index = None
+    conversion_pool = None
 
     try:
-        # 1. Load configuration (configs/newsletters.yaml)
+        # 1. Load configuration (configs/newsletters.yaml), then select the newsletters of this shard that are due
         config = AppConfig()
-        
+        shard_index, shard_count = shard_of(event)
+        newsletters = shard(config.newsletters, shard_index, shard_count)
+        scheduler = Scheduler(StateStore(state_path(shard_index, shard_count)))
+        if not event_payload(event).get('force'):
+            newsletters = scheduler.due(newsletters)
+
+        # Local dedup index replaces per-file Drive existence queries when configured.
+        # Otherwise each target folder is listed once and existence checks become set lookups,
+        # unless DRIVE_LISTING_CACHE=false (large folders): then the files are queried by name in batch requests.
+        if os.environ.get("DEDUP_INDEX_PATH"):
+            dedup_index = DedupIndex()
+        cache_listings = dedup_index is None and os.environ.get("DRIVE_LISTING_CACHE", "true").lower() != "false"
+
         # 2. Initialize clients
         # Credentials are automatically loaded from Secret Manager (Prod) or .env (Local)
+        # The clients create a separate API service object for each worker thread.
         gmail_client = GmailClient()
-        drive_client = DriveClient()
+        drive_client = DriveClient(cache_listings=cache_listings)
         notifier = DiscordNotifier()
+        max_messages = int(os.environ.get("MAX_MESSAGES_PER_NEWSLETTER", "1"))
+        max_workers = int(os.environ.get("MAX_WORKERS", str(DEFAULT_MAX_WORKERS)))
+        # Number of worker processes for HTML -> Markdown conversion (0 disables the process pool)
+        convert_processes = int(os.environ.get("CONVERT_PROCESSES", "0"))
 
-        # 3. Process each newsletter target
-        for newsletter in config.newsletters:
-            logger.info(f"Processing newsletter: {newsletter['name']} (Query: {newsletter['query']})")
-            
-            # Search for matching emails in Gmail
-            messages = gmail_client.search_messages(newsletter['query'])
-            logger.info(f"Found {len(messages)} candidate messages.")
-
-            # Process only the latest 1 message to prevent duplicates and keep it lightweight
-            for msg_meta in messages[:1]:
-                msg_id = msg_meta['id']
-                
-                # Fetch email details (Subject, HTML body, Date)
-                details = gmail_client.get_message_details(msg_id)
-                
-                # Generate filename (e.g., 20260301_Subject.md)
-                date_str = details['date'].strftime('%Y%m%d')
-                
-                # Sanitize filename by removing invalid characters
-                clean_subject = re.sub(r'[\\/:*?"<>|]', '', details['subject']).strip()
-                filename = f"{date_str}_{clean_subject}.md"
-                
-                # Check for existing file in Google Drive to ensure idempotency
-                if drive_client.file_exists(filename, newsletter['folder_id']):
-                    logger.info(f"Skip: {filename} already exists in Drive.")
-                    continue
-                
-                # Convert HTML body to Markdown format
-                # Handles line break adjustments and footer truncation
-                markdown_content = EmailConverter.html_to_markdown(
-                    details['html_content'],
-                    subject=details['subject'],
-                    date=details['date'],
-                    footer_starts_with=newsletter.get('footer_starts_with')
-                )
-                
-                # Upload to designated folder in Google Drive
-                file_id = drive_client.upload_markdown(
-                    filename,
-                    markdown_content,
-                    newsletter['folder_id']
+        # Incremental sync: only look at messages added since the last successful run of each newsletter
+        incremental = os.environ.get("INCREMENTAL_SYNC", "").lower() == "true"
+        # Capture the mailbox position before searching so that mail arriving mid-run is not missed
+        current_history_id = gmail_client.get_history_id() if incremental and newsletters else None
+        # Combined search: one list query for the newsletters that ran before, narrowed to the time since then
+        # (incremental sync already searches the mailbox history instead)
+        candidates: dict[str, list[dict[str, Any]]] = {}
+        if os.environ.get("COMBINED_SEARCH", "").lower() == "true" and not incremental:
+            last_runs = {newsletter.name: scheduler.last_run(newsletter) for newsletter in newsletters}
+            # Messages that failed to be fetched are reported after the others are processed
+            candidates, failed_messages = pipeline.search_combined(newsletters, gmail_client, dedup_index, last_runs, max_messages)
+
+        # 3. Process newsletter targets concurrently
+        # Newsletters and the messages within each newsletter use separate pools so that
+        # newsletter tasks waiting on their messages can never starve the message workers.
+        conversion_pool = ConversionPool(max_workers=convert_processes) if convert_processes > 0 else None
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="newsletter") as newsletter_pool, \
+             ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="message") as message_pool:
+            futures = [
+                newsletter_pool.submit(
+                    _process_newsletter,
+                    newsletter,
+                    gmail_client,
+                    drive_client,
+                    dedup_index,
+                    message_pool,
+                    conversion_pool,
+                    scheduler.start_history_id(newsletter) if incremental else None,
+                    max_messages,
+                    candidates.get(newsletter.name)
                 )
-                
-                logger.info(f"Uploaded: {filename} (ID: {file_id})")
-                processed_files.append(filename)
+                for newsletter in newsletters
+            ]
+            # Aggregate in configuration order so that notifications are deterministic
+            for future in futures:
+                uploaded, failed = future.result()
+                processed_files.extend(uploaded)
+                failed_messages.extend(failed)
 
         # 4. Notify results via Discord (only if files were uploaded)
         if processed_files:
-            notifier.send_success(processed_files)
-        
+            with metrics.stage('notify'):
+                notifier.send_success(processed_files, summary=metrics.summary(len(processed_files)))
+
+        # Surface per-message fetch failures after the successful uploads are reported
+        if failed_messages:
+            raise RuntimeError(f"Failed to fetch {len(failed_messages)} messages: {', '.join(failed_messages)}")
+
+        # Record the runs (and advance the sync position) only after a fully successful run
+        if newsletters:
+            scheduler.record(newsletters, current_history_id)
+
         return "Success"
 
     except Exception as e:
@@ -97,16 +140,112 @@ def main(event: Any = None, context: Any = None) -> str:
         error_msg = str(e)
         detail = traceback.format_exc()
         logger.error(f"Error during execution: {error_msg}\n{detail}")
-        
+
         if notifier:
             try:
                 notifier.send_error(error_msg, detail)
             except Exception as notify_err:
                 logger.error(f"Failed to send error notification to Discord: {notify_err}")
-        
+
         # Rethrow exception for Cloud Functions retry/monitoring
         raise e
 
+    finally:
+        if conversion_pool:
+            conversion_pool.close()
+
+        # Persist index records of files uploaded so far, even if the run failed midway
+        if dedup_index:
+            dedup_index.save()
+
+        metrics.finish_run(len(processed_files))
+
+def _process_newsletter(
+    newsletter: NewsletterConfig,
+    gmail_client: GmailClient,
+    drive_client: DriveClient,
+    dedup_index: Optional[DedupIndex],
+    message_pool: ThreadPoolExecutor,
+    conversion_pool: Optional[ConversionPool],
+    start_history_id: Optional[str],
+    max_messages: int,
+    candidates: Optional[list[dict[str, Any]]] = None
+) -> tuple[list[str], list[str]]:
+    """
+    Search, fetch, convert and upload the latest messages of a single newsletter.
+
+    :param candidates: Metadata of the messages found by the combined search (the newsletter is searched if None).
+    :return: Tuple of (uploaded filenames, IDs of messages that failed to be fetched), in message order.
+    """
+    if candidates is not None:
+        message_ids = [meta['id'] for meta in candidates]
+    else:
+        message_ids = pipeline.search_candidates(newsletter, gmail_client, dedup_index, start_history_id, max_messages)
+    return process_messages(
+        newsletter, message_ids, gmail_client, drive_client, dedup_index, message_pool, conversion_pool, candidates
+    )
+
+def process_messages(
+    newsletter: NewsletterConfig,
+    message_ids: list[str],
+    gmail_client: GmailClient,
+    drive_client: DriveClient,
+    dedup_index: Optional[DedupIndex],
+    message_pool: ThreadPoolExecutor,
+    conversion_pool: Optional[ConversionPool],
+    metadata: Optional[list[dict[str, Any]]] = None
+) -> tuple[list[str], list[str]]:
+    """
+    Fetch, convert and upload the given messages of a newsletter (also used by src.backfill).
+
+    :param metadata: Subject and Date of the messages if already fetched (by the combined search).
+    :return: Tuple of (uploaded filenames, IDs of messages that failed to be fetched), in message order.
+    """
+    # Phase one: Subject and Date only, enough to build the filename
+    if metadata is None:
+        metadata, failed = pipeline.fetch_metadata(gmail_client, message_ids)
+    else:
+        failed = []
+
+    # Messages with the same date and subject map to the same file: keep the first one only,
+    # so that a single upload cannot create two files with the same name
+    filenames: dict[str, str] = {}
+    seen: set[str] = set()
+    for meta in metadata:
+        filename = pipeline.build_filename(meta)
+        if filename in seen:
+            logger.info(f"Skip: message {meta['id']} has the same filename as an earlier one ({filename}).")
+            continue
+        seen.add(filename)
+        filenames[meta['id']] = filename
+
+    # Check the existence of all files of the newsletter at once
+    exists = pipeline.already_uploaded(list(filenames.values()), newsletter, drive_client, dedup_index)
+    new_ids = [message_id for message_id, found in zip(filenames, exists) if not found]
+
+    # Phase two: download bodies of the messages that are not in Drive yet
+    fetched, failed_details = pipeline.fetch_details(gmail_client, new_ids)
+    failed = sorted(failed + failed_details, key=message_ids.index)
+    targets = [(details, filenames[details['id']]) for details in fetched]
+
+    # Convert in worker processes when enabled (CPU-bound), otherwise on the message threads
+    if conversion_pool:
+        # Worker processes cannot report per-message latencies, so the whole batch is measured
+        with metrics.stage('convert_pool'):
+            contents = pipeline.convert_with_pool(conversion_pool, [pipeline.conversion_job(details, newsletter) for details, _ in targets])
+    else:
+        contents = list(message_pool.map(lambda target: pipeline.convert_message(target[0], newsletter), targets))
+
+    # Upload all files of the newsletter at once, in parallel
+    if targets:
+        pipeline.upload_messages(
+            [(details, filename, content) for (details, filename), content in zip(targets, contents)],
+            newsletter,
+            drive_client,
+            dedup_index
+        )
+    return [filename for _, filename in targets], failed
+
 if __name__ == "__main__":
     # Local execution for testing
     main()
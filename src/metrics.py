@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import time
+import bisect
+import logging
+import threading
+import functools
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Prefix of the exported Prometheus metric names
+METRIC_PREFIX = "gmail_uploader"
+# Pseudo method name of HTTP batch requests (quota units of batched calls are charged to it)
+BATCH_METHOD = "batch"
+
+# Structured logs go to stdout as one JSON object per line, which Cloud Logging parses into jsonPayload
+_json_logger = logging.getLogger("src.metrics.json")
+_json_logger.propagate = False
+if not _json_logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    _json_logger.addHandler(_handler)
+    _json_logger.setLevel(logging.INFO)
+
+class Histogram:
+    """Latency observations of one stage or API method (kept in full; a run records at most a few thousand)."""
+
+    def __init__(self) -> None:
+        self._values: list[float] = []
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        bisect.insort(self._values, value)
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return len(self._values)
+
+    def quantile(self, q: float) -> float:
+        """Nearest-rank quantile (0 if nothing was observed)."""
+        if not self._values:
+            return 0.0
+        rank = max(0, min(len(self._values) - 1, int(q * len(self._values) + 0.5) - 1))
+        return self._values[rank]
+
+    def buckets(self) -> list[tuple[str, int]]:
+        """Cumulative counts per upper bound, including +Inf."""
+        counts = [(str(bound), bisect.bisect_right(self._values, bound)) for bound in LATENCY_BUCKETS]
+        return counts + [("+Inf", len(self._values))]
+
+class Metrics:
+    """
+    Thread-safe registry of the measurements of a run:
+    stage latencies, Google API calls (latency, status, quota units), bytes transferred and event counters.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Start a new run (module state survives across warm invocations)."""
+        with self._lock:
+            self.started = time.monotonic()
+            self._stages: dict[str, Histogram] = defaultdict(Histogram)
+            self._api_latency: dict[str, Histogram] = defaultdict(Histogram)
+            self._api_calls: dict[tuple[str, str], int] = defaultdict(int)
+            self._api_units: dict[str, int] = defaultdict(int)
+            self._api_bytes: dict[tuple[str, str], int] = defaultdict(int)
+            self._counters: dict[str, int] = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Measure the duration of a pipeline stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._stages[name].observe(elapsed)
+
+    def timed(self, name: str) -> Callable[[F], F]:
+        """Decorator that measures every call of a function as the given stage."""
+        def decorator(func: F) -> F:
+            @functools.wraps(func)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper  # type: ignore[return-value]
+        return decorator
+
+    def record_api_call(self, method: str, seconds: Optional[float], units: int, status: Optional[int] = None) -> None:
+        """
+        Record one Google API call.
+        :param method: API method ID (e.g., 'gmail.users.messages.get') or BATCH_METHOD.
+        :param seconds: Round-trip time, or None for calls sent inside a batch request.
+        :param units: Quota units charged.
+        :param status: HTTP status of a failed call (None on success).
+        """
+        with self._lock:
+            self._api_calls[(method, str(status or 200))] += 1
+            self._api_units[method] += units
+            if seconds is not None:
+                self._api_latency[method].observe(seconds)
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Increment a named event counter (e.g., 'conversion_cache_hits')."""
+        with self._lock:
+            self._counters[name] += value
+
+    def track_bytes(self, request: Any) -> None:
+        """Count the bytes sent by an API request and those received once its response is processed."""
+        method = getattr(request, 'methodId', None)
+        if not isinstance(method, str):
+            return
+        body = getattr(request, 'body', None)
+        sent = len(body) if isinstance(body, (str, bytes)) else 0
+        resumable = getattr(request, 'resumable', None)
+        if resumable is not None and isinstance(resumable.size(), int):
+            sent += resumable.size()
+        if sent:
+            with self._lock:
+                self._api_bytes[(method, 'sent')] += sent
+
+        # postproc receives the raw response body, also for calls sent inside a batch request
+        postproc = request.postproc
+
+        def counting_postproc(resp: Any, content: Any) -> Any:
+            if isinstance(content, (str, bytes)):
+                with self._lock:
+                    self._api_bytes[(method, 'received')] += len(content)
+            return postproc(resp, content)
+
+        request.postproc = counting_postproc
+
+    def summary(self, messages: int) -> dict[str, Any]:
+        """
+        Summary of the run so far.
+        :param messages: Number of messages processed (uploaded) by the run.
+        """
+        with self._lock:
+            seconds = time.monotonic() - self.started
+            return {
+                'messages': messages,
+                'seconds': round(seconds, 3),
+                'messages_per_second': round(messages / seconds, 3) if seconds > 0 else 0.0,
+                'stages': {
+                    name: {
+                        'count': histogram.count,
+                        'total': round(histogram.sum, 3),
+                        'p50': round(histogram.quantile(0.5), 3),
+                        'p95': round(histogram.quantile(0.95), 3),
+                    }
+                    for name, histogram in self._stages.items()
+                },
+                'api_calls': sum(self._api_calls.values()),
+                'api_errors': sum(n for (_, status), n in self._api_calls.items() if status != '200'),
+                'quota_units': sum(self._api_units.values()),
+                'bytes_sent': sum(n for (_, direction), n in self._api_bytes.items() if direction == 'sent'),
+                'bytes_received': sum(n for (_, direction), n in self._api_bytes.items() if direction == 'received'),
+                'counters': dict(self._counters),
+            }
+
+    def log(self, messages: int) -> None:
+        """Emit the run summary as a structured (JSON) log entry."""
+        entry = {
+            'severity': 'INFO',
+            'message': f"Run metrics: {messages} messages",
+            'metrics': self.summary(messages),
+        }
+        _json_logger.info(json.dumps(entry, ensure_ascii=False))
+
+    def to_prometheus(self) -> str:
+        """Render all measurements in the Prometheus text exposition format."""
+        lines: list[str] = []
+        with self._lock:
+            _histogram_lines(lines, f"{METRIC_PREFIX}_stage_seconds", "stage", self._stages)
+            _histogram_lines(lines, f"{METRIC_PREFIX}_api_request_seconds", "method", self._api_latency)
+
+            lines.append(f"# TYPE {METRIC_PREFIX}_api_calls_total counter")
+            for (method, status), count in sorted(self._api_calls.items()):
+                lines.append(f'{METRIC_PREFIX}_api_calls_total{{method="{method}",status="{status}"}} {count}')
+
+            lines.append(f"# TYPE {METRIC_PREFIX}_api_quota_units_total counter")
+            for method, units in sorted(self._api_units.items()):
+                lines.append(f'{METRIC_PREFIX}_api_quota_units_total{{method="{method}"}} {units}')
+
+            lines.append(f"# TYPE {METRIC_PREFIX}_api_bytes_total counter")
+            for (method, direction), size in sorted(self._api_bytes.items()):
+                lines.append(f'{METRIC_PREFIX}_api_bytes_total{{method="{method}",direction="{direction}"}} {size}')
+
+            for name, value in sorted(self._counters.items()):
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+                lines.append(f"{METRIC_PREFIX}_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def finish_run(self, messages: int) -> None:
+        """Log the run summary and write the Prometheus dump if METRICS_PROMETHEUS_PATH is set."""
+        self.log(messages)
+        path = os.environ.get("METRICS_PROMETHEUS_PATH")
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
+
+def _histogram_lines(lines: list[str], name: str, label: str, histograms: dict[str, Histogram]) -> None:
+    """Append a histogram family in the Prometheus text format."""
+    lines.append(f"# TYPE {name} histogram")
+    for key, histogram in sorted(histograms.items()):
+        for bound, count in histogram.buckets():
+            lines.append(f'{name}_bucket{{{label}="{key}",le="{bound}"}} {count}')
+        lines.append(f'{name}_sum{{{label}="{key}"}} {histogram.sum:.6f}')
+        lines.append(f'{name}_count{{{label}="{key}"}} {histogram.count}')
+
+# Registry shared by all modules of the process
+metrics = Metrics()
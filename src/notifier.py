@@ -1,7 +1,6 @@
 import os
-import requests
 import json
-from typing import Optional
+from typing import Any, Optional
 
 class DiscordNotifier:
     """Handles sending notifications via Discord Webhook."""
@@ -19,10 +18,11 @@ class DiscordNotifier:
         
         self.webhook_url = webhook_url
 
-    def send_success(self, processed_items: list[str]) -> None:
+    def send_success(self, processed_items: list[str], summary: Optional[dict[str, Any]] = None) -> None:
         """
         Send a notification for successful execution.
         :param processed_items: List of filenames successfully processed.
+        :param summary: Run summary from src.metrics (throughput, stage latencies, API usage), if available.
         """
         count = len(processed_items)
         if count == 0:
@@ -31,6 +31,42 @@ class DiscordNotifier:
             items_str = "\n".join([f"- {item}" for item in processed_items])
             content = f"✅ Gmail Uploader: Uploaded {count} emails.\n\n**Processed Files:**\n{items_str}"
 
+        if summary:
+            content += "\n\n" + self._format_summary(summary)
+
+        self._post_message(content)
+
+    def _format_summary(self, summary: dict[str, Any]) -> str:
+        """Render a run summary as a compact block (throughput, API usage and p95 latency per stage)."""
+        lines = [
+            f"**Run Summary:** {summary['seconds']:.1f}s ({summary['messages_per_second']:.2f} emails/s), "
+            f"{summary['api_calls']} API calls ({summary['quota_units']} quota units, {summary['api_errors']} errors)"
+        ]
+        counters = summary.get('counters', {})
+        if 'conversion_cache_hits' in counters or 'conversion_cache_misses' in counters:
+            lines.append(
+                f"**Conversion Cache:** {counters.get('conversion_cache_hits', 0)} hits, "
+                f"{counters.get('conversion_cache_misses', 0)} misses"
+            )
+        if summary['stages']:
+            stages = ", ".join(f"{name} {stage['p95']:.2f}s" for name, stage in summary['stages'].items())
+            lines.append(f"**p95 Latency:** {stages}")
+        return "\n".join(lines)
+
+    def send_backfill_status(self, uploaded_count: int, remaining: dict[str, Optional[int]], completed: bool) -> None:
+        """
+        Send a progress summary of a backfill invocation.
+        :param uploaded_count: Number of files uploaded by this invocation.
+        :param remaining: Newsletter name -> number of messages left (None while still enumerating).
+        :param completed: True if every newsletter is completely archived.
+        """
+        status = "completed" if completed else "in progress"
+        lines = [
+            f"- {name}: {'listing messages' if count is None else f'{count} remaining'}"
+            for name, count in remaining.items()
+        ]
+        content = f"📦 Gmail Uploader Backfill ({status}): Uploaded {uploaded_count} emails.\n\n" + "\n".join(lines)
+
         self._post_message(content)
 
     def send_error(self, error_msg: str, detail: Optional[str] = None) -> None:
@@ -48,6 +84,9 @@ class DiscordNotifier:
 
     def _post_message(self, content: str) -> None:
         """Internal method to send HTTP POST request to Discord."""
+        # Imported on first notification; most runs only notify on success or failure
+        import requests
+
         payload = {"content": content}
         response = requests.post(
             self.webhook_url,
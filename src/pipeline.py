@@ -0,0 +1,227 @@
+import re
+import logging
+import itertools
+from datetime import datetime
+from typing import Any, Optional
+
+from src.config import NewsletterConfig
+from src.gmail_client import GmailClient
+from src.drive_client import DriveClient
+from src.converter import EmailConverter, ConversionPool, DEFAULT_PARSER
+from src.conversion_cache import get_cache
+from src.dedup_index import DedupIndex
+from src.query_planner import QueryPlanner
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages of a run (src.main, whose process_messages is also used by src.backfill):
+# search -> fetch metadata -> exists-check -> fetch body -> convert -> upload
+# Bodies are only downloaded for messages that are not in Drive yet.
+# Each stage records its latency in src.metrics.
+
+@metrics.timed('search')
+def search_candidates(
+    newsletter: NewsletterConfig,
+    gmail_client: GmailClient,
+    dedup_index: Optional[DedupIndex],
+    start_history_id: Optional[str],
+    max_messages: int
+) -> list[str]:
+    """
+    Search for the latest message IDs of a newsletter.
+
+    :return: IDs of up to max_messages messages (newest first) that are not recorded in the dedup index.
+    """
+    logger.info(f"Processing newsletter: {newsletter.name} (Query: {newsletter.query})")
+
+    # Search for matching emails in Gmail (results are paged lazily)
+    if start_history_id:
+        messages = gmail_client.search_new_messages(newsletter.query, start_history_id)
+    else:
+        messages = gmail_client.search_messages(newsletter.query)
+
+    # Process only the latest messages (1 by default) to prevent duplicates and keep it lightweight
+    message_ids = [msg_meta['id'] for msg_meta in itertools.islice(messages, max_messages)]
+    logger.info(f"Found {len(message_ids)} candidate messages.")
+
+    # Messages already recorded in the index are skipped without being fetched
+    if dedup_index:
+        message_ids = [msg_id for msg_id in message_ids if not dedup_index.contains_message(msg_id)]
+    return message_ids
+
+@metrics.timed('search_combined')
+def search_combined(
+    newsletters: list[NewsletterConfig],
+    gmail_client: GmailClient,
+    dedup_index: Optional[DedupIndex],
+    last_runs: dict[str, Optional[datetime]],
+    max_messages: int
+) -> tuple[dict[str, list[dict[str, Any]]], list[str]]:
+    """
+    Search many newsletters with one combined query (see src.query_planner).
+
+    :return: Tuple of (metadata of the candidate messages by newsletter name, IDs of messages that failed to be fetched).
+             The candidates are the messages search_candidates would return, already fetched. Newsletters that could
+             not be combined are missing and must be searched with search_candidates.
+    """
+    candidates, failed = QueryPlanner(gmail_client).search(newsletters, last_runs, max_messages)
+    if dedup_index:
+        candidates = {
+            name: [meta for meta in metadata if not dedup_index.contains_message(meta['id'])]
+            for name, metadata in candidates.items()
+        }
+    return candidates, failed
+
+@metrics.timed('fetch_metadata')
+def fetch_metadata(gmail_client: GmailClient, message_ids: list[str]) -> tuple[list[dict[str, Any]], list[str]]:
+    """
+    Fetch only Subject and Date of messages in batch requests (enough to build their filenames).
+
+    :return: Tuple of (fetched metadata, IDs of messages that failed to be fetched), in input order.
+    """
+    return _split_failures(gmail_client.get_messages_metadata(message_ids))
+
+@metrics.timed('fetch')
+def fetch_details(gmail_client: GmailClient, message_ids: list[str]) -> tuple[list[dict[str, Any]], list[str]]:
+    """
+    Fetch email details (Subject, HTML body, Date) in batch requests.
+
+    :return: Tuple of (fetched message details, IDs of messages that failed to be fetched), in input order.
+    """
+    # Nothing to download when every candidate already exists in Drive
+    if not message_ids:
+        return [], []
+    return _split_failures(gmail_client.get_messages_details(message_ids))
+
+def _split_failures(results: list[dict[str, Any]]) -> tuple[list[dict[str, Any]], list[str]]:
+    """Separate successfully fetched entries from failed ones (logging each failure)."""
+    fetched = []
+    failed = []
+    for details in results:
+        if 'error' in details:
+            logger.error(f"Failed to fetch message {details['id']}: {details['error']}")
+            failed.append(details['id'])
+        else:
+            fetched.append(details)
+    return fetched, failed
+
+def build_filename(details: dict[str, Any]) -> str:
+    """Generate the Drive filename of a message from its metadata or details (e.g., 20260301_Subject.md)."""
+    date_str = details['date'].strftime('%Y%m%d')
+
+    # Sanitize filename by removing invalid characters
+    clean_subject = re.sub(r'[\\/:*?"<>|]', '', details['subject']).strip()
+    return f"{date_str}_{clean_subject}.md"
+
+@metrics.timed('exists')
+def already_uploaded(
+    filenames: list[str],
+    newsletter: NewsletterConfig,
+    drive_client: DriveClient,
+    dedup_index: Optional[DedupIndex]
+) -> list[bool]:
+    """
+    Check for existing files in Google Drive (or in the dedup index) to ensure idempotency.
+    Without the index, the filenames of a newsletter are checked at once in batch requests (DriveClient.files_exist).
+
+    :return: Whether each file exists, in input order.
+    """
+    if dedup_index:
+        exists = [dedup_index.contains_file(filename, newsletter.folder_id) for filename in filenames]
+    elif filenames:
+        exists = drive_client.files_exist(filenames, newsletter.folder_id)
+    else:
+        exists = []
+    for filename, found in zip(filenames, exists):
+        if found:
+            logger.info(f"Skip: {filename} already exists in Drive.")
+    return exists
+
+def conversion_job(details: dict[str, Any], newsletter: NewsletterConfig) -> dict[str, Any]:
+    """Build the html_to_markdown arguments of a message (picklable for ConversionPool)."""
+    return {
+        'html_content': details['html_content'],
+        'subject': details['subject'],
+        'date': details['date'],
+        'footer_starts_with': newsletter.footer_starts_with,
+        'footer_pattern': newsletter.footer_pattern,
+        'prune': newsletter.prune,
+        'parser': newsletter.parser or DEFAULT_PARSER
+    }
+
+@metrics.timed('convert')
+def convert_message(details: dict[str, Any], newsletter: NewsletterConfig) -> str:
+    """
+    Convert HTML body to Markdown format (or take it from the conversion cache, if enabled).
+    Handles line break adjustments and footer truncation.
+    """
+    job = conversion_job(details, newsletter)
+    cache = get_cache()
+    if cache:
+        markdown_text = cache.get(job)
+        if markdown_text is not None:
+            return markdown_text
+
+    markdown_text = EmailConverter.html_to_markdown(**job)
+    if cache:
+        cache.put(job, markdown_text)
+    return markdown_text
+
+def convert_with_pool(conversion_pool: ConversionPool, jobs: list[dict[str, Any]]) -> list[str]:
+    """
+    Convert jobs in worker processes, sending only those missing from the conversion cache.
+
+    :return: Markdown of each job, in job order.
+    """
+    cache = get_cache()
+    contents = [cache.get(job) if cache else None for job in jobs]
+    misses = [index for index, content in enumerate(contents) if content is None]
+    if misses:
+        converted = conversion_pool.convert_many([jobs[index] for index in misses])
+        for index, markdown_text in zip(misses, converted):
+            contents[index] = markdown_text
+            if cache:
+                cache.put(jobs[index], markdown_text)
+    return contents  # type: ignore[return-value]
+
+@metrics.timed('upload_many')
+def upload_messages(
+    uploads: list[tuple[dict[str, Any], str, str]],
+    newsletter: NewsletterConfig,
+    drive_client: DriveClient,
+    dedup_index: Optional[DedupIndex]
+) -> None:
+    """
+    Upload all converted messages of a newsletter at once (concurrently, see DriveClient.upload_many)
+    and record them in the dedup index. Every file that could be uploaded is recorded
+    before the first upload error is raised.
+
+    :param uploads: Tuples of (message details, filename, Markdown content).
+    """
+    results = drive_client.upload_many([
+        {'filename': filename, 'content': content, 'folder_id': newsletter.folder_id, 'message_id': details['id']}
+        for details, filename, content in uploads
+    ])
+
+    errors = []
+    for (details, filename, _), result in zip(uploads, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to upload {filename}: {result}")
+            errors.append(result)
+        else:
+            _record_upload(filename, result, details, newsletter, dedup_index)
+    if errors:
+        raise errors[0]
+
+def _record_upload(
+    filename: str,
+    file_id: str,
+    details: dict[str, Any],
+    newsletter: NewsletterConfig,
+    dedup_index: Optional[DedupIndex]
+) -> None:
+    """Log an uploaded file and record it in the dedup index."""
+    logger.info(f"Uploaded: {filename} (ID: {file_id})")
+    if dedup_index:
+        dedup_index.add(filename, newsletter.folder_id, message_id=details['id'], file_id=file_id)
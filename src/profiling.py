@@ -0,0 +1,180 @@
+import io
+import os
+import sys
+import marshal
+import logging
+import tempfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Iterator, Optional
+
+from src import storage
+from src.event import event_payload
+
+logger = logging.getLogger(__name__)
+
+# 'cprofile': deterministic (every call, pstats output)
+# 'sample': statistical, wall-clock stacks of all threads (collapsed-stack output for flame graphs)
+PROFILERS = ('cprofile', 'sample')
+# Profiler used when profiling is simply switched on (e.g., PROFILE=true)
+DEFAULT_PROFILER = 'cprofile'
+DEFAULT_PROFILE_OUTPUT = os.path.join(tempfile.gettempdir(), "auto-gmail-uploader", "profiles")
+# Number of hot functions written to the log
+DEFAULT_TOP_N = 20
+# Seconds between two samples of the sampling profiler
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+# Leaf frames of threads waiting for work; their samples are left out of the sampling profile
+IDLE_FRAMES = frozenset([
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),
+    ('selectors.py', 'select'),
+])
+
+def profiling_mode(event: Any = None) -> Optional[str]:
+    """
+    Profiler requested for this invocation.
+    The event payload ({"profile": "cprofile"}) takes precedence over the PROFILE environment variable.
+
+    :return: One of PROFILERS, or None if profiling is off.
+    """
+    value = event_payload(event).get('profile', os.environ.get("PROFILE", ""))
+    if value is True:
+        return DEFAULT_PROFILER
+    mode = str(value or "").strip().lower()
+    if mode in ("", "0", "false", "off"):
+        return None
+    if mode in ("1", "true", "on"):
+        return DEFAULT_PROFILER
+    if mode not in PROFILERS:
+        raise ValueError(f"Unknown profiler: {mode} (expected one of {', '.join(PROFILERS)})")
+    return mode
+
+@contextmanager
+def profile(mode: Optional[str], output: Optional[str] = None, top_n: Optional[int] = None) -> Iterator[None]:
+    """
+    Profile the enclosed block, then write the profile and log the hottest functions.
+    Does nothing if mode is None. Failing to write the profile never fails the run.
+
+    :param mode: One of PROFILERS, or None.
+    :param output: Directory (local or gs://bucket/prefix) of the profile files. Loaded from PROFILE_OUTPUT if not provided.
+    :param top_n: Number of hot functions to log. Loaded from PROFILE_TOP_N if not provided.
+    """
+    if mode is None:
+        yield
+        return
+
+    if output is None:
+        output = os.environ.get("PROFILE_OUTPUT", DEFAULT_PROFILE_OUTPUT)
+    if top_n is None:
+        top_n = int(os.environ.get("PROFILE_TOP_N", str(DEFAULT_TOP_N)))
+
+    profiler = CProfiler() if mode == 'cprofile' else SamplingProfiler()
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        try:
+            path = f"{output.rstrip('/')}/{datetime.now().strftime('%Y%m%d-%H%M%S')}-{mode}.{profiler.extension}"
+            storage.write_bytes(path, profiler.dump())
+            logger.info(f"Profile written to {path}\n{profiler.report(top_n)}")
+        except Exception as e:
+            logger.error(f"Failed to write the profile: {e}")
+
+class CProfiler:
+    """
+    Deterministic profiler based on cProfile.
+    Since Python 3.12 cProfile hooks into sys.monitoring and records calls of every thread,
+    so message workers are covered; times of concurrently running threads overlap, though.
+    """
+
+    extension = "pstats"
+
+    def __init__(self) -> None:
+        import cProfile
+        self._profiler = cProfile.Profile()
+
+    def start(self) -> None:
+        self._profiler.enable()
+
+    def stop(self) -> None:
+        self._profiler.disable()
+
+    def dump(self) -> bytes:
+        """Profile in the pstats file format (load with pstats.Stats or snakeviz)."""
+        import pstats
+        return marshal.dumps(pstats.Stats(self._profiler).stats)
+
+    def report(self, top_n: int) -> str:
+        """Functions with the highest own time."""
+        import pstats
+        stream = io.StringIO()
+        pstats.Stats(self._profiler, stream=stream).sort_stats('tottime').print_stats(top_n)
+        return stream.getvalue()
+
+class SamplingProfiler:
+    """
+    Statistical profiler that periodically captures the Python stacks of all threads (sys._current_frames).
+    Measures wall-clock time, so threads blocked on network I/O show up too; idle pool workers are skipped.
+    """
+
+    extension = "collapsed"
+
+    def __init__(self, interval: Optional[float] = None) -> None:
+        if interval is None:
+            interval = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", str(DEFAULT_SAMPLE_INTERVAL)))
+        self.interval = interval
+        self.samples: Counter[tuple[str, ...]] = Counter()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if not _is_idle(frame):
+                    self.samples[_stack(frame)] += 1
+
+    def dump(self) -> bytes:
+        """Profile in the collapsed-stack format ("root;...;leaf count"), as read by flamegraph.pl or speedscope."""
+        lines = [f"{';'.join(stack)} {count}" for stack, count in self.samples.most_common()]
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def report(self, top_n: int) -> str:
+        """Functions with the most samples at the top of the stack (own time)."""
+        total = sum(self.samples.values())
+        own: Counter[str] = Counter()
+        for stack, count in self.samples.items():
+            own[stack[-1]] += count
+        lines = [f"{total} samples every {self.interval * 1000:g} ms (idle threads excluded)"]
+        lines += [f"{count / total:6.1%}  {name}" for name, count in own.most_common(top_n)] if total else []
+        return "\n".join(lines)
+
+def _stack(frame: Any) -> tuple[str, ...]:
+    """Frames of a stack from the outermost to the innermost call."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return tuple(reversed(names))
+
+def _is_idle(frame: Any) -> bool:
+    """Whether the innermost frame of a thread is waiting for work."""
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES
@@ -0,0 +1,108 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from src.config import NewsletterConfig
+from src.gmail_client import GmailClient
+
+logger = logging.getLogger(__name__)
+
+# Newsletters merged into one query (keeps queries well below the length accepted by Gmail search)
+MAX_QUERIES_PER_SEARCH = 50
+# Margin subtracted from the oldest last run when narrowing the search window,
+# so that mail delivered late or labeled by a filter after the previous run is still found
+WINDOW_MARGIN = timedelta(days=1)
+
+def combined_query(queries: list[str], since: Optional[datetime] = None) -> str:
+    """
+    Merge label queries into a single OR query, optionally restricted to mail received after a time
+    (e.g., '{label:a label:b} after:1772323200').
+    """
+    query = "{" + " ".join(queries) + "}"
+    if since is not None:
+        query += f" after:{int(since.timestamp())}"
+    return query
+
+class QueryPlanner:
+    """
+    Replaces the per-newsletter searches with one messages.list query for many newsletters.
+    The results are routed back to their newsletters by label ID. The labels come with the Subject/Date
+    metadata the pipeline fetches anyway, so N list calls become one list call per MAX_QUERIES_PER_SEARCH
+    newsletters, and the metadata of the found messages is fetched in one batch instead of N.
+
+    Only newsletters that ran before and whose query is a single known label are combined; the search
+    window starts at their oldest last run (minus WINDOW_MARGIN). The others are searched individually.
+    """
+
+    def __init__(self, gmail_client: GmailClient) -> None:
+        self.gmail_client = gmail_client
+
+    def search(
+        self,
+        newsletters: list[NewsletterConfig],
+        last_runs: dict[str, Optional[datetime]],
+        max_messages: int
+    ) -> tuple[dict[str, list[dict[str, Any]]], list[str]]:
+        """
+        Search the combinable newsletters.
+
+        :param newsletters: Newsletters of the run.
+        :param last_runs: Time of the last successful run by newsletter name.
+        :param max_messages: Number of messages kept per newsletter (newest first).
+        :return: Tuple of (metadata of the candidate messages (newest first, see GmailClient.get_messages_metadata)
+                 by name of each combined newsletter, IDs of messages that failed to be fetched).
+                 Newsletters missing from the result must be searched individually.
+        """
+        labels: dict[str, str] = {}
+        for newsletter in newsletters:
+            label_id = self.gmail_client.resolve_label_query(newsletter.query)
+            if label_id is not None and last_runs.get(newsletter.name) is not None:
+                labels[newsletter.name] = label_id
+        combined = [newsletter for newsletter in newsletters if newsletter.name in labels]
+        # A single newsletter gains nothing from combining
+        if len(combined) < 2:
+            return {}, []
+
+        results: dict[str, list[dict[str, Any]]] = {}
+        failed: list[str] = []
+        for start in range(0, len(combined), MAX_QUERIES_PER_SEARCH):
+            group = combined[start:start + MAX_QUERIES_PER_SEARCH]
+            since = min(last_runs[newsletter.name] for newsletter in group) - WINDOW_MARGIN
+            routed, group_failed = self._search_group(group, labels, since, max_messages)
+            results.update(routed)
+            failed.extend(group_failed)
+        return results, failed
+
+    def _search_group(
+        self,
+        group: list[NewsletterConfig],
+        labels: dict[str, str],
+        since: datetime,
+        max_messages: int
+    ) -> tuple[dict[str, list[dict[str, Any]]], list[str]]:
+        """
+        Run the combined query of a group and route the messages to their newsletters by label.
+        :return: Tuple of (metadata by newsletter name, IDs of messages that failed to be fetched).
+        """
+        query = combined_query([newsletter.query for newsletter in group], since)
+        message_ids = list(self.gmail_client.search_message_ids(query))
+        logger.info(f"Combined search of {len(group)} newsletters found {len(message_ids)} messages.")
+
+        newsletters_by_label: dict[str, list[str]] = {}
+        for newsletter in group:
+            newsletters_by_label.setdefault(labels[newsletter.name], []).append(newsletter.name)
+
+        routed: dict[str, list[dict[str, Any]]] = {newsletter.name: [] for newsletter in group}
+        failed: list[str] = []
+        for entry in self.gmail_client.get_messages_metadata(message_ids, with_labels=True):
+            if 'error' in entry:
+                # Without its labels the message cannot be routed; it is reported like any failed fetch
+                # (e.g., a message deleted since the search) and the other messages are still processed
+                logger.error(f"Failed to fetch message {entry['id']}: {entry['error']}")
+                failed.append(entry['id'])
+                continue
+            for label_id in entry['label_ids']:
+                for name in newsletters_by_label.get(label_id, []):
+                    if len(routed[name]) < max_messages:
+                        routed[name].append(entry)
+        return routed, failed
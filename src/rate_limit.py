@@ -0,0 +1,305 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+import email.utils
+from typing import Any, Callable, Optional
+from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest
+from src.metrics import metrics, BATCH_METHOD
+
+logger = logging.getLogger(__name__)
+
+# Per-user quota units of each method (https://developers.google.com/gmail/api/reference/quota).
+# Drive quotas count requests, so Drive methods cost DEFAULT_QUOTA_UNITS.
+QUOTA_UNITS = {
+    'gmail.users.messages.list': 5,
+    'gmail.users.messages.get': 5,
+    'gmail.users.messages.attachments.get': 5,
+    'gmail.users.history.list': 2,
+    'gmail.users.getProfile': 1,
+    'gmail.users.labels.list': 1,
+}
+DEFAULT_QUOTA_UNITS = 1
+
+# Sustainable rates per API in quota units per second (Gmail allows 250 units/s per user).
+# Overridden by GMAIL_QUOTA_UNITS_PER_SECOND / DRIVE_QUOTA_UNITS_PER_SECOND.
+DEFAULT_RATES = {
+    'gmail': 250.0,
+    'drive': 10.0,
+}
+DEFAULT_MAX_RETRIES = 5
+
+# Statuses worth retrying: quota errors and transient server errors
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+# Rate limit reasons reported with status 403 by Gmail and Drive
+RATE_LIMIT_REASONS = frozenset(['rateLimitExceeded', 'userRateLimitExceeded'])
+# Backoff delays in seconds: BACKOFF_BASE * 2^attempt (with jitter), capped at BACKOFF_MAX
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 32.0
+
+class RateLimiter:
+    """
+    Thread-safe token bucket measured in quota units.
+
+    The refill rate adapts to the API: it is halved whenever a request is throttled
+    and grows back gradually with each successful request (AIMD), so parallel runs settle
+    at the highest rate the quota sustains instead of alternating between errors and idling.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        """
+        :param rate: Maximum refill rate in quota units per second.
+        :param capacity: Bucket size (burst) in quota units. Defaults to one second worth of units.
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = rate / 32
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, units: float = DEFAULT_QUOTA_UNITS) -> None:
+        """
+        Block until the given number of quota units is available, then consume them.
+        A request larger than the bucket waits for a full bucket and is still charged in full:
+        the balance goes negative, and later requests wait until the excess has been refilled.
+        """
+        required = min(units, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._tokens >= required:
+                    self._tokens -= units
+                    return
+                else:
+                    wait = (required - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self) -> None:
+        """Additive increase of the rate after a successful request."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def on_throttled(self, delay: float) -> None:
+        """Multiplicative decrease of the rate, and pause all callers for the given delay."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            # Keep the debt of requests charged beyond the bucket
+            self._tokens = min(self._tokens, 0.0)
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(api: str) -> RateLimiter:
+    """Get the rate limiter shared by all clients and threads of an API ('gmail' or 'drive')."""
+    with _limiters_lock:
+        limiter = _limiters.get(api)
+        if limiter is None:
+            rate = float(os.environ.get(f"{api.upper()}_QUOTA_UNITS_PER_SECOND", DEFAULT_RATES.get(api, 10.0)))
+            limiter = _limiters[api] = RateLimiter(rate)
+        return limiter
+
+def method_id(request: Any) -> str:
+    """API method ID of a request (e.g., 'gmail.users.messages.get'), or BATCH_METHOD for batch requests."""
+    if isinstance(request, BatchHttpRequest):
+        return BATCH_METHOD
+    method = getattr(request, 'methodId', None)
+    return method if isinstance(method, str) else 'unknown'
+
+def quota_units(request: Any) -> int:
+    """Quota units charged for an API request."""
+    return QUOTA_UNITS.get(method_id(request), DEFAULT_QUOTA_UNITS)
+
+def is_retryable(error: Exception) -> bool:
+    """Whether an API error is a quota error or a transient server error."""
+    if not isinstance(error, HttpError):
+        return False
+    status = error.resp.status
+    if status in RETRY_STATUSES:
+        return True
+    return status == 403 and bool(_error_reasons(error) & RATE_LIMIT_REASONS)
+
+def is_throttled(error: Exception) -> bool:
+    """Whether an API error reports that the quota is exceeded."""
+    return isinstance(error, HttpError) and (error.resp.status == 429 or error.resp.status == 403)
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """
+    Seconds to wait before the next attempt.
+    Honors the Retry-After header; otherwise exponential backoff with jitter.
+    """
+    retry_after = error.resp.get('retry-after') if isinstance(error, HttpError) else None
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            retry_at = email.utils.parsedate_to_datetime(retry_after)
+            return max(0.0, retry_at.timestamp() - time.time())
+
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+    # Equal jitter: keeps a minimum wait while spreading concurrent retries apart
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def max_retries() -> int:
+    """Maximum number of retries per request (API_MAX_RETRIES)."""
+    return int(os.environ.get("API_MAX_RETRIES", str(DEFAULT_MAX_RETRIES)))
+
+def execute(request: Any, limiter: RateLimiter, units: Optional[int] = None) -> Any:
+    """
+    Execute an API request within the rate limit, retrying quota and transient server errors.
+
+    :param request: Unexecuted googleapiclient request (or batch request).
+    :param limiter: Rate limiter of the API.
+    :param units: Quota units charged per attempt. Defaults to the cost of the request's method.
+    :return: Response of the request.
+    """
+    if units is None:
+        units = quota_units(request)
+    method = method_id(request)
+    metrics.track_bytes(request)
+    retries = max_retries()
+    attempt = 0
+    while True:
+        limiter.acquire(units)
+        started = time.perf_counter()
+        try:
+            result = request.execute()
+        except HttpError as e:
+            metrics.record_api_call(method, time.perf_counter() - started, units, e.resp.status)
+            if not is_retryable(e) or attempt >= retries:
+                raise
+            delay = retry_delay(e, attempt)
+            if is_throttled(e):
+                limiter.on_throttled(delay)
+            logger.warning(f"Retrying {method} in {delay:.1f}s "
+                           f"after HTTP {e.resp.status} (attempt {attempt + 1}/{retries})")
+            time.sleep(delay)
+            attempt += 1
+            continue
+        metrics.record_api_call(method, time.perf_counter() - started, units)
+        limiter.on_success()
+        return result
+
+def execute_batch(new_batch: Callable[..., Any], requests: list[Any], limiter: RateLimiter) -> list[Any]:
+    """
+    Execute requests in HTTP batch requests (at most 100 calls each).
+    A batch is charged the quota units of all its calls, so the requests are split into batches
+    of at most one bucket (limiter.capacity) of units, which the limiter can pace without bursting.
+    Calls rejected with a quota or transient server error are retried in a later batch after a backoff.
+
+    :param new_batch: Factory of batch requests (the service's new_batch_http_request).
+    :param requests: Unexecuted requests of the same API.
+    :param limiter: Rate limiter of the API.
+    :return: Response of each request, or the exception it failed with, in input order.
+    """
+    results: list[Any] = [None] * len(requests)
+    retryable: dict[int, Exception] = {}
+    retries = max_retries()
+    attempt = 0
+
+    def _callback(request_id: str, response: Any, exception: Optional[Exception]) -> None:
+        index = int(request_id)
+        # Quota units of batched calls are charged to the batch request itself
+        status = exception.resp.status if isinstance(exception, HttpError) else None
+        metrics.record_api_call(method_id(requests[index]), None, 0, status)
+        if exception is None:
+            results[index] = response
+        elif is_retryable(exception) and attempt < retries:
+            retryable[index] = exception
+        else:
+            results[index] = exception
+
+    for request in requests:
+        metrics.track_bytes(request)
+
+    pending = list(range(len(requests)))
+    while pending:
+        for chunk in _quota_chunks(pending, requests, limiter.capacity):
+            batch = new_batch(callback=_callback)
+            for index in chunk:
+                batch.add(requests[index], request_id=str(index))
+            execute(batch, limiter, units=sum(quota_units(requests[index]) for index in chunk))
+
+        pending = sorted(retryable)
+        if pending:
+            errors = list(retryable.values())
+            delay = max(retry_delay(e, attempt) for e in errors)
+            if any(is_throttled(e) for e in errors):
+                limiter.on_throttled(delay)
+            logger.warning(f"Retrying {len(pending)} calls of a batch in {delay:.1f}s (attempt {attempt + 1}/{retries})")
+            time.sleep(delay)
+            retryable.clear()
+            attempt += 1
+
+    return results
+
+def _quota_chunks(indexes: list[int], requests: list[Any], capacity: float) -> list[list[int]]:
+    """Split requests (by index) into consecutive groups of at most `capacity` quota units (at least one request each)."""
+    chunks: list[list[int]] = []
+    units = 0.0
+    for index in indexes:
+        cost = quota_units(requests[index])
+        if not chunks or units + cost > capacity:
+            chunks.append([])
+            units = 0.0
+        chunks[-1].append(index)
+        units += cost
+    return chunks
+
+def execute_resumable(request: Any, limiter: RateLimiter, description: str = "upload") -> Any:
+    """
+    Run a resumable media upload chunk by chunk.
+    A chunk that fails with a quota or transient server error is retried after a backoff; the upload
+    resumes from the last byte acknowledged by the server instead of starting over.
+
+    :param request: Unexecuted googleapiclient request with a resumable media body.
+    :param limiter: Rate limiter of the API.
+    :param description: Name of the upload used in log messages.
+    :return: Response of the request once the upload is complete.
+    """
+    units = quota_units(request)
+    method = method_id(request)
+    metrics.track_bytes(request)
+    retries = max_retries()
+    attempt = 0
+    response = None
+    limiter.acquire(units)
+    started = time.perf_counter()
+    while response is None:
+        try:
+            status, response = request.next_chunk()
+        except HttpError as e:
+            if not is_retryable(e) or attempt >= retries:
+                metrics.record_api_call(method, time.perf_counter() - started, units, e.resp.status)
+                raise
+            delay = retry_delay(e, attempt)
+            if is_throttled(e):
+                limiter.on_throttled(delay)
+            logger.warning(f"Resuming {description} in {delay:.1f}s after HTTP {e.resp.status} "
+                           f"(attempt {attempt + 1}/{retries})")
+            time.sleep(delay)
+            attempt += 1
+            continue
+        if status is not None:
+            logger.info(f"Uploading {description}: {status.progress():.0%}")
+    metrics.record_api_call(method, time.perf_counter() - started, units)
+    limiter.on_success()
+    return response
+
+def _error_reasons(error: HttpError) -> set[str]:
+    """Reasons listed in the JSON body of an API error."""
+    try:
+        data = json.loads(error.content.decode('utf-8'))
+    except (ValueError, AttributeError):
+        return set()
+    return {item.get('reason', '') for item in data.get('error', {}).get('errors', [])}
@@ -0,0 +1,102 @@
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from src.config import NewsletterConfig, SCHEDULE_INTERVALS
+from src.event import event_payload
+from src.state import StateStore, DEFAULT_STATE_PATH
+
+logger = logging.getLogger(__name__)
+
+# A run triggered slightly earlier than the interval after the last one (scheduler jitter,
+# run duration) is still due, so that a daily trigger never skips a daily newsletter
+SCHEDULE_TOLERANCE = timedelta(hours=1)
+
+class Scheduler:
+    """
+    Selects the newsletters that are due and records their successful runs.
+
+    The state keeps one entry per newsletter name:
+      state['newsletters'][name] = {'last_run': ISO time, 'history_id': mailbox position of that run}
+    so a weekly newsletter resumes incremental sync from its own last run rather than yesterday's.
+    """
+
+    def __init__(self, state: StateStore, now: Optional[datetime] = None) -> None:
+        """
+        :param state: Run state store (see state_path for sharded runs).
+        :param now: Time of this run. Defaults to the current time.
+        """
+        self.state = state
+        self.now = now or datetime.now(timezone.utc)
+
+    def _entry(self, newsletter: NewsletterConfig) -> dict[str, Any]:
+        return self.state.get('newsletters', {}).get(newsletter.name, {})
+
+    def last_run(self, newsletter: NewsletterConfig) -> Optional[datetime]:
+        """Time of the last successful run of a newsletter (None if it never ran)."""
+        last_run = self._entry(newsletter).get('last_run')
+        return datetime.fromisoformat(last_run) if last_run else None
+
+    def is_due(self, newsletter: NewsletterConfig) -> bool:
+        """Whether the schedule interval of a newsletter has elapsed since its last successful run."""
+        last_run = self.last_run(newsletter)
+        if last_run is None:
+            return True
+        return self.now - last_run >= SCHEDULE_INTERVALS[newsletter.schedule] - SCHEDULE_TOLERANCE
+
+    def due(self, newsletters: list[NewsletterConfig]) -> list[NewsletterConfig]:
+        """Newsletters to process in this run, in configuration order."""
+        due = [newsletter for newsletter in newsletters if self.is_due(newsletter)]
+        skipped = [newsletter.name for newsletter in newsletters if newsletter not in due]
+        if skipped:
+            logger.info(f"Skip (not due): {', '.join(skipped)}")
+        return due
+
+    def start_history_id(self, newsletter: NewsletterConfig) -> Optional[str]:
+        """historyId to sync a newsletter from (the run-wide position stored by older versions as a fallback)."""
+        return self._entry(newsletter).get('history_id') or self.state.get('history_id')
+
+    def record(self, newsletters: list[NewsletterConfig], history_id: Optional[str]) -> None:
+        """
+        Mark newsletters as successfully processed by this run and persist the state.
+        :param history_id: Mailbox position captured before the search (None without incremental sync).
+        """
+        entries = dict(self.state.get('newsletters', {}))
+        for newsletter in newsletters:
+            entry = {'last_run': self.now.isoformat()}
+            if history_id:
+                entry['history_id'] = history_id
+            entries[newsletter.name] = entry
+        self.state.set('newsletters', entries)
+        self.state.save()
+
+def shard_of(event: Any = None) -> tuple[int, int]:
+    """
+    Shard processed by this invocation.
+    The event payload ({"shard_index": 0, "shard_count": 4}) takes precedence over SHARD_INDEX / SHARD_COUNT.
+
+    :return: Tuple of (shard index, shard count); (0, 1) processes every newsletter.
+    """
+    payload = event_payload(event)
+    index = int(payload.get('shard_index', os.environ.get("SHARD_INDEX", "0")))
+    count = int(payload.get('shard_count', os.environ.get("SHARD_COUNT", "1")))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard {index} of {count}")
+    return index, count
+
+def shard(newsletters: list[NewsletterConfig], index: int, count: int) -> list[NewsletterConfig]:
+    """Newsletters of a shard, assigned round-robin in configuration order so that shards stay balanced."""
+    return newsletters[index::count]
+
+def state_path(index: int, count: int) -> Optional[str]:
+    """
+    Run state path of a shard (None for the default STATE_PATH when not sharded).
+    Parallel invocations must not overwrite each other's state file, so each shard keeps its own
+    (changing the shard count starts from a fresh state).
+    """
+    if count == 1:
+        return None
+    path = os.environ.get("STATE_PATH", DEFAULT_STATE_PATH)
+    root, extension = os.path.splitext(path)
+    return f"{root}.shard-{index}-of-{count}{extension}"
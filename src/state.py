@@ -0,0 +1,41 @@
+import os
+import json
+import tempfile
+from typing import Any, Optional
+
+from src import storage
+
+DEFAULT_STATE_PATH = os.path.join(tempfile.gettempdir(), "auto-gmail-uploader", "state.json")
+
+class StateStore:
+    """Persists small pieces of run state (e.g., the last synced Gmail historyId) as a JSON file."""
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        """
+        Load the state file.
+        :param path: Local path or gs://bucket/object URL. Loaded from STATE_PATH environment variable if not provided.
+        """
+        if path is None:
+            path = os.environ.get("STATE_PATH", DEFAULT_STATE_PATH)
+
+        self.path = path
+        self._data: dict[str, Any] = {}
+        self._load()
+
+    def _load(self) -> None:
+        """Read the state file if it exists. A missing file means an empty state."""
+        data = storage.read_bytes(self.path)
+        if data:
+            self._data = json.loads(data)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a stored value."""
+        return self._data.get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        """Set a value. Call save() to persist it."""
+        self._data[key] = value
+
+    def save(self) -> None:
+        """Persist the state."""
+        storage.write_bytes(self.path, json.dumps(self._data, ensure_ascii=False).encode("utf-8"))
@@ -0,0 +1,99 @@
+import os
+import time
+import random
+from typing import Any, Optional
+
+GCS_PREFIX = "gs://"
+# Attempts of a Cloud Storage append that lost the race against a concurrent writer (e.g., parallel shards)
+APPEND_MAX_ATTEMPTS = 10
+# Upper bound (seconds) of the first random wait before a lost append is retried, doubled on each attempt
+APPEND_BACKOFF = 0.1
+
+def is_remote(path: str) -> bool:
+    """Return True if the path points to a Cloud Storage object (gs://bucket/object)."""
+    return path.startswith(GCS_PREFIX)
+
+def read_bytes(path: str) -> Optional[bytes]:
+    """
+    Read the whole content of a local file or Cloud Storage object.
+    :param path: Local path or gs://bucket/object URL.
+    :return: File content, or None if it does not exist.
+    """
+    if is_remote(path):
+        blob = _get_blob(path)
+        return blob.download_as_bytes() if blob.exists() else None
+
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+def write_bytes(path: str, data: bytes) -> None:
+    """
+    Replace the content of a local file or Cloud Storage object.
+    Local files are written atomically so an interrupted run never leaves a corrupt file.
+    """
+    if is_remote(path):
+        _get_blob(path).upload_from_string(data)
+        return
+
+    _ensure_parent_dir(path)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def append_bytes(path: str, data: bytes) -> None:
+    """
+    Append data to a local file or Cloud Storage object.
+    Objects cannot be appended in place, so remote paths are rewritten entirely, on the condition that
+    the object is still the generation that was read. Concurrent appends (e.g., parallel shards saving
+    the dedup index) are therefore retried on top of each other instead of overwriting each other.
+    """
+    if is_remote(path):
+        _append_remote(path, data)
+        return
+
+    _ensure_parent_dir(path)
+    with open(path, "ab") as f:
+        f.write(data)
+
+def _append_remote(path: str, data: bytes) -> None:
+    """Read-modify-write a Cloud Storage object with a generation precondition, retrying lost races."""
+    from google.api_core.exceptions import NotFound, PreconditionFailed
+
+    blob = _get_blob(path)
+    for attempt in range(APPEND_MAX_ATTEMPTS):
+        try:
+            try:
+                blob.reload()
+                generation = blob.generation
+                content = blob.download_as_bytes(if_generation_match=generation)
+            except NotFound:
+                # Generation 0: create the object only if it still does not exist
+                generation, content = 0, b""
+            blob.upload_from_string(content + data, if_generation_match=generation)
+            return
+        except PreconditionFailed:
+            # Another writer changed the object since it was read
+            time.sleep(random.uniform(0, APPEND_BACKOFF * 2 ** attempt))
+    raise RuntimeError(f"Failed to append to {path}: it kept changing during {APPEND_MAX_ATTEMPTS} attempts.")
+
+def _ensure_parent_dir(path: str) -> None:
+    """Create the parent directory of a local path if needed."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+def _get_blob(path: str) -> Any:
+    """Resolve a gs://bucket/object URL to a Cloud Storage blob."""
+    try:
+        from google.cloud import storage
+    except ImportError as e:
+        raise ImportError("google-cloud-storage is required to use gs:// paths.") from e
+
+    bucket_name, _, object_name = path[len(GCS_PREFIX):].partition("/")
+    if not bucket_name or not object_name:
+        raise ValueError(f"Invalid Cloud Storage path: {path}")
+
+    return storage.Client().bucket(bucket_name).blob(object_name)
@@ -0,0 +1,104 @@
+import pytest
+from unittest.mock import MagicMock
+from datetime import datetime
+from src.backfill import Backfill, MAX_FETCH_ATTEMPTS
+from src.config import NewsletterConfig
+from src.state import StateStore
+from src.drive_client import DriveClient
+
+NEWSLETTER = NewsletterConfig(name='News', query='label:news', folder_id='folder')
+
+@pytest.fixture
+def gmail_client():
+    """Gmail mock with 5 messages (m5 newest) listed in pages of 2."""
+    client = MagicMock()
+    pages = {None: (['m5', 'm4'], 't1'), 't1': (['m3', 'm2'], 't2'), 't2': (['m1'], None)}
+    client.list_messages_page.side_effect = lambda query, page_token: pages[page_token]
+    client.get_messages_metadata.side_effect = lambda ids: [
+        {'id': i, 'subject': i, 'date': datetime(2026, 2, int(i[1:]))} for i in ids
+    ]
+    client.get_messages_details.side_effect = lambda ids: [
+        {'id': i, 'subject': i, 'html_content': '<p>x</p>', 'date': datetime(2026, 2, int(i[1:]))} for i in ids
+    ]
+    return client
+
+@pytest.fixture
+def drive_client():
+    client = MagicMock()
+    client.file_exists.return_value = False
+    client.upload_many.side_effect = lambda items: DriveClient.upload_many(client, items)
+    client.files_exist.side_effect = lambda filenames, folder_id: [client.file_exists(f, folder_id) for f in filenames]
+    return client
+
+def test_backfill_oldest_to_newest(gmail_client, drive_client, tmp_path):
+    """Test that a whole label is archived from the oldest message, in chunks."""
+    state_path = str(tmp_path / "backfill.json")
+    backfill = Backfill(gmail_client, drive_client, StateStore(state_path), chunk_size=2)
+
+    uploaded, failed, completed = backfill.run([NEWSLETTER])
+
+    assert completed is True
+    assert failed == []
+    assert uploaded == [f'2026020{i}_m{i}.md' for i in range(1, 6)]
+    assert [call.args[0] for call in gmail_client.get_messages_details.call_args_list] == [['m1', 'm2'], ['m3', 'm4'], ['m5']]
+    assert backfill.remaining(NEWSLETTER) == 0
+
+def test_backfill_resumes_after_interruption(gmail_client, drive_client, tmp_path):
+    """Test that a new invocation resumes after the last checkpoint."""
+    state_path = str(tmp_path / "backfill.json")
+    drive_client.upload_markdown.side_effect = [None, None, TimeoutError("Function timed out")]
+
+    with pytest.raises(TimeoutError):
+        Backfill(gmail_client, drive_client, StateStore(state_path), chunk_size=2).run([NEWSLETTER])
+
+    # Enumeration and the first chunk were checkpointed
+    gmail_client.list_messages_page.reset_mock()
+    gmail_client.get_messages_details.reset_mock()
+    drive_client.upload_markdown.side_effect = None
+    backfill = Backfill(gmail_client, drive_client, StateStore(state_path), chunk_size=2)
+    uploaded, failed, completed = backfill.run([NEWSLETTER])
+
+    assert completed is True
+    gmail_client.list_messages_page.assert_not_called()
+    assert [call.args[0] for call in gmail_client.get_messages_details.call_args_list] == [['m3', 'm4'], ['m5']]
+    assert uploaded == ['20260203_m3.md', '20260204_m4.md', '20260205_m5.md']
+
+def test_backfill_time_budget_and_failed_retry(gmail_client, drive_client, tmp_path):
+    """Test that no work starts after the time budget and that failed messages are retried later."""
+    state_path = str(tmp_path / "backfill.json")
+    uploaded, failed, completed = Backfill(
+        gmail_client, drive_client, StateStore(state_path), time_budget=0
+    ).run([NEWSLETTER])
+    assert (uploaded, failed, completed) == ([], [], False)
+    gmail_client.list_messages_page.assert_not_called()
+
+    gmail_client.get_messages_metadata.side_effect = lambda ids: [
+        {'id': i, 'error': Exception("Backend Error")} if i == 'm2' else
+        {'id': i, 'subject': i, 'date': datetime(2026, 2, int(i[1:]))} for i in ids
+    ]
+    uploaded, failed, completed = Backfill(gmail_client, drive_client, StateStore(state_path), chunk_size=10).run([NEWSLETTER])
+    assert failed == ['m2']
+    assert completed is False
+
+    gmail_client.get_messages_metadata.side_effect = lambda ids: [
+        {'id': i, 'subject': i, 'date': datetime(2026, 2, int(i[1:]))} for i in ids
+    ]
+    uploaded, failed, completed = Backfill(gmail_client, drive_client, StateStore(state_path), chunk_size=10).run([NEWSLETTER])
+    assert (uploaded, failed, completed) == (['20260202_m2.md'], [], True)
+
+def test_backfill_gives_up_on_messages_that_keep_failing(gmail_client, drive_client, tmp_path):
+    """Test that a message that can never be fetched (deleted after enumeration) stops blocking completion."""
+    state_path = str(tmp_path / "backfill.json")
+    gmail_client.get_messages_metadata.side_effect = lambda ids: [
+        {'id': i, 'error': Exception("Not Found")} if i == 'm2' else
+        {'id': i, 'subject': i, 'date': datetime(2026, 2, int(i[1:]))} for i in ids
+    ]
+
+    results = [
+        Backfill(gmail_client, drive_client, StateStore(state_path), chunk_size=10).run([NEWSLETTER])
+        for _ in range(MAX_FETCH_ATTEMPTS)
+    ]
+
+    assert [(failed, completed) for _, failed, completed in results[:-1]] == [(['m2'], False)] * (MAX_FETCH_ATTEMPTS - 1)
+    assert results[-1][1:] == ([], True)
+    assert StateStore(state_path).get(NEWSLETTER.name)['attempts'] == {}
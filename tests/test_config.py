@@ -0,0 +1,53 @@
+import os
+import pytest
+from src.config import AppConfig, NewsletterConfig, PruneRules
+
+def _write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+def test_config_is_validated_and_normalized(tmp_path, monkeypatch):
+    """Test that entries become typed configurations with defaults and expanded folder IDs."""
+    monkeypatch.setenv("news_folder_id", "folder123")
+    path = _write(tmp_path / "newsletters.yaml", """
+newsletters:
+  - name: "News"
+    query: "label:news"
+    folder_id: "${news_folder_id}"
+    footer_starts_with: "Unsubscribe"
+    prune:
+      cut_at_text: ["PR", "Ad"]
+      drop_hidden: true
+""")
+
+    assert AppConfig(path).newsletters == [NewsletterConfig(
+        name="News",
+        query="label:news",
+        folder_id="folder123",
+        schedule="daily",
+        footer_starts_with=("Unsubscribe",),
+        prune=PruneRules(cut_at_text=("PR", "Ad"), drop_hidden=True)
+    )]
+
+@pytest.mark.parametrize("entry, message", [
+    ('{name: "News", query: "label:news"}', "'folder_id' is required"),
+    ('{name: "News", query: "label:news", folder_id: "f", schedule: "monthly"}', "unknown schedule"),
+    ('{name: "News", query: "label:news", folder_id: "f", footer: "x"}', "unknown settings: footer"),
+    ('{name: "News", query: "label:news", folder_id: "${unset_folder_id}"}', "unset environment variable"),
+])
+def test_invalid_config_is_rejected(tmp_path, entry, message):
+    """Test that invalid entries fail with the position of the entry."""
+    path = _write(tmp_path / "newsletters.yaml", f"newsletters:\n  - {entry}\n")
+
+    with pytest.raises(ValueError, match=rf"newsletters\[0\]: .*{message}"):
+        AppConfig(path)
+
+def test_config_is_reloaded_only_when_modified(tmp_path):
+    """Test that the compiled configuration is reused until the file changes."""
+    path = _write(tmp_path / "newsletters.yaml", 'newsletters:\n  - {name: "A", query: "label:a", folder_id: "f"}\n')
+    first = AppConfig(path).newsletters[0]
+    assert AppConfig(path).newsletters[0] is first
+
+    _write(tmp_path / "newsletters.yaml", 'newsletters:\n  - {name: "B", query: "label:b", folder_id: "f"}\n')
+    os.utime(path, ns=(0, 0))
+    assert AppConfig(path).newsletters[0].name == "B"
@@ -0,0 +1,52 @@
+from datetime import datetime
+from src import converter
+from src.config import PruneRules
+from src.conversion_cache import ConversionCache
+
+def _job(html="<p>Hello</p>", footer=None):
+    return {
+        'html_content': html,
+        'subject': 'Subject',
+        'date': datetime(2026, 2, 28, 10, 0),
+        'footer_starts_with': footer,
+        'parser': 'html.parser'
+    }
+
+def test_cache_hit_and_miss(tmp_path):
+    """Test that stored conversions are returned across instances and counted."""
+    path = str(tmp_path / "cache.sqlite")
+    cache = ConversionCache(path)
+    assert cache.get(_job()) is None
+    cache.put(_job(), "# Subject\n\nHello")
+    cache.close()
+
+    cache = ConversionCache(path)
+    assert cache.get(_job()) == "# Subject\n\nHello"
+    assert cache.get(_job(footer="Unsubscribe")) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_cache_key_includes_converter_version(monkeypatch):
+    """Test that bumping CONVERTER_VERSION invalidates existing entries."""
+    key = ConversionCache.key(_job())
+    monkeypatch.setattr('src.conversion_cache.CONVERTER_VERSION', converter.CONVERTER_VERSION + "-next")
+    assert ConversionCache.key(_job()) != key
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """Test that the least recently used entries are evicted once the size limit is exceeded."""
+    cache = ConversionCache(str(tmp_path / "cache.sqlite"), max_bytes=10)
+    cache.put(_job("<p>a</p>"), "aaaa")
+    cache.put(_job("<p>b</p>"), "bbbb")
+    # Touch "a" so that "b" becomes the least recently used entry
+    assert cache.get(_job("<p>a</p>")) == "aaaa"
+    cache.put(_job("<p>c</p>"), "cccc")
+
+    assert cache.get(_job("<p>a</p>")) == "aaaa"
+    assert cache.get(_job("<p>b</p>")) is None
+    assert cache.get(_job("<p>c</p>")) == "cccc"
+
+def test_cache_key_includes_prune_rules():
+    """Test that changing the pruning rules of a newsletter changes the cache key."""
+    job = _job()
+    pruned = dict(job, prune=PruneRules(drop_hidden=True))
+    assert ConversionCache.key(job) != ConversionCache.key(pruned)
+    assert ConversionCache.key(pruned) == ConversionCache.key(dict(job, prune=PruneRules(drop_hidden=True)))
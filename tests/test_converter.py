@@ -1,4 +1,7 @@
-from src.converter import EmailConverter
+import pytest
+from pathlib import Path
+from src.converter import EmailConverter, ConversionPool
+from src.config import PruneRules
 from datetime import datetime
 
 def test_html_to_markdown_basic():
@@ -26,3 +29,110 @@ def test_html_to_markdown_script_removal():
     result = EmailConverter.html_to_markdown(html)
     assert "Visible" in result
     assert "alert" not in result
+
+def test_conversion_pool_matches_serial():
+    """Test that the process pool produces exactly the serial output, in job order."""
+    jobs = [
+        {
+            'html_content': f"<div><p>Body {i}</p><p>Footer {i}</p></div>",
+            'subject': f"Subject {i}",
+            'date': datetime(2026, 2, 28, 10, 0, i),
+            'footer_starts_with': f"Footer {i}" if i % 2 else None
+        }
+        for i in range(6)
+    ]
+
+    with ConversionPool(max_workers=2, chunksize=2) as pool:
+        results = pool.convert_many(jobs)
+
+    assert results == [EmailConverter.html_to_markdown(**job) for job in jobs]
+
+DATA_DIR = Path(__file__).parent / "data"
+
+@pytest.mark.parametrize("expected_file, footer", [
+    ("newsletter.md", None),
+    ("newsletter_footer.md", "◇　◇　◇"),
+])
+def test_html_to_markdown_golden(expected_file, footer):
+    """Test that a full newsletter is converted exactly like the recorded golden output."""
+    html = (DATA_DIR / "newsletter.html").read_text(encoding="utf-8")
+    expected = (DATA_DIR / expected_file).read_text(encoding="utf-8")
+
+    result = EmailConverter.html_to_markdown(
+        html,
+        subject="週刊メルマガ 第123号",
+        date=datetime(2026, 2, 28, 10, 0, 0),
+        footer_starts_with=footer
+    )
+
+    assert result == expected
+
+def test_html_to_markdown_lxml_golden():
+    """Test that the lxml backend produces the golden output for well-formed HTML."""
+    pytest.importorskip("lxml")
+    html = (DATA_DIR / "newsletter.html").read_text(encoding="utf-8")
+    expected = (DATA_DIR / "newsletter.md").read_text(encoding="utf-8")
+
+    result = EmailConverter.html_to_markdown(
+        html,
+        subject="週刊メルマガ 第123号",
+        date=datetime(2026, 2, 28, 10, 0, 0),
+        parser="lxml"
+    )
+
+    assert result == expected
+
+def test_html_to_markdown_line_breaks():
+    """Test that <br> and structural tags keep text on separate lines."""
+    html = "<div>first<br>second</div><p>third</p>"
+    result = EmailConverter.html_to_markdown(html)
+    assert result.split('\n') == ["first ", "second", "", "third"]
+
+def test_footer_with_multiple_markers_and_pattern():
+    """Test that the earliest of several footer markers or a regex cuts the footer."""
+    html = "<p>Body</p><p>PR: sponsor</p><p>Unsubscribe here</p>"
+
+    result = EmailConverter.html_to_markdown(html, footer_starts_with=["Unsubscribe", "PR:"])
+    assert result == "Body\n\n--- [Footer Truncated] ---"
+
+    result = EmailConverter.html_to_markdown(html, footer_pattern=r"^Unsub")
+    assert result == "Body\n\nPR: sponsor\n\n--- [Footer Truncated] ---"
+
+def test_footer_marker_matches_before_space_normalization():
+    """Test that a marker with spaces still matches text that contains runs of spaces before cleanup."""
+    markdown_text = "Body\n\n\n\nSee  you   next week\nfooter text"
+
+    assert EmailConverter.find_footer(markdown_text, "See you next") == len("Body\n\n\n\n")
+    html = "<p>Body</p><p>See  you   next week</p><p>footer text</p>"
+    assert EmailConverter.html_to_markdown(html, footer_starts_with="See you next") == "Body\n\n--- [Footer Truncated] ---"
+
+def test_prune_rules_drop_markup_before_conversion():
+    """Test that selectors, hidden elements and tracking pixels are removed from the tree."""
+    html = (
+        '<span style="display: none;">Preheader</span><div class="ad">Sponsored</div><p>Body</p>'
+        '<img src="https://example.com/open.gif" width="1" height="1px"><img src="https://example.com/photo.png" width="600" height="1">'
+    )
+    prune = PruneRules(selectors=('div.ad',), drop_hidden=True, drop_tracking_pixels=True)
+
+    result = EmailConverter.html_to_markdown(html, prune=prune)
+    assert result == "Body\n\n![](https://example.com/photo.png)"
+
+def test_prune_cut_at_text_removes_rest_of_document():
+    """Test that the element containing the marker and everything after it are cut, ignoring hidden text."""
+    html = (
+        '<span style="display:none">Unsubscribe preview</span>'
+        '<table><tr><td><p>Body</p><p>Unsubscribe here</p><p>Settings</p></td></tr></table><p>Tracking</p>'
+    )
+
+    result = EmailConverter.html_to_markdown(html, prune=PruneRules(cut_at_text=("Unsubscribe",), drop_hidden=True))
+    assert result == "Body\n\n--- [Footer Truncated] ---"
+
+def test_prune_cut_at_text_keeps_body_sharing_the_marker_element():
+    """Test that the body before the marker is kept when the marker shares an element (or a text node) with it."""
+    prune = PruneRules(cut_at_text=("◇　◇　◇",))
+
+    html = "<div>本文1<br>本文2<br>◇　◇　◇<br>フッター</div>"
+    assert EmailConverter.html_to_markdown(html, prune=prune) == "本文1 \n本文2\n\n--- [Footer Truncated] ---"
+
+    html = "<p>本文1\n本文2\n◇　◇　◇\nフッター</p><p>配信停止</p>"
+    assert EmailConverter.html_to_markdown(html, prune=prune) == "本文1\n本文2\n\n--- [Footer Truncated] ---"
@@ -0,0 +1,111 @@
+import pytest
+from unittest.mock import MagicMock
+from src.dedup_index import DedupIndex
+
+@pytest.fixture
+def index_path(tmp_path):
+    return str(tmp_path / "index.jsonl")
+
+def test_add_and_reload(index_path):
+    """Test that saved records are visible to a new index instance."""
+    index = DedupIndex(index_path)
+    index.add("20260228_Hello.md", "folder1", message_id="msg1", file_id="file1")
+    index.save()
+
+    reloaded = DedupIndex(index_path)
+    assert reloaded.contains_message("msg1")
+    assert reloaded.contains_file("20260228_Hello.md", "folder1")
+    assert not reloaded.contains_file("20260228_Hello.md", "folder2")
+    assert not reloaded.contains_message("msg2")
+
+def test_save_appends(index_path):
+    """Test that each save appends only the new records."""
+    index = DedupIndex(index_path)
+    index.add("a.md", "folder1", message_id="msg1")
+    index.save()
+    index.add("b.md", "folder1", message_id="msg2")
+    index.save()
+    index.save()
+
+    with open(index_path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+
+def test_reconcile(index_path):
+    """Test rebuilding the index from Drive folder listings."""
+    index = DedupIndex(index_path)
+    index.add("stale.md", "folder1", message_id="stale")
+    index.save()
+
+    drive_client = MagicMock()
+    drive_client.list_files.side_effect = lambda folder_id: iter([
+        {'id': f'{folder_id}-1', 'name': 'a.md', 'appProperties': {'gmailMessageId': 'msg1'}},
+        {'id': f'{folder_id}-2', 'name': 'b.md'},
+    ])
+
+    count = index.reconcile(drive_client, ["folder1", "folder2"])
+
+    assert count == 4
+    reloaded = DedupIndex(index_path)
+    assert reloaded.contains_message("msg1")
+    assert reloaded.contains_file("b.md", "folder2")
+    assert not reloaded.contains_message("stale")
+
+def test_missing_path(monkeypatch):
+    """Test that an unset DEDUP_INDEX_PATH is reported."""
+    monkeypatch.delenv("DEDUP_INDEX_PATH", raising=False)
+    with pytest.raises(ValueError):
+        DedupIndex()
+
+class FakeBlob:
+    """Cloud Storage blob backed by a shared dict of {name: (generation, content)}, with generation preconditions."""
+
+    def __init__(self, objects, name, before_upload=None):
+        self.objects = objects
+        self.name = name
+        self.before_upload = before_upload
+        self.generation = None
+
+    def exists(self):
+        return self.name in self.objects
+
+    def reload(self):
+        from google.api_core.exceptions import NotFound
+        if self.name not in self.objects:
+            raise NotFound(self.name)
+        self.generation = self.objects[self.name][0]
+
+    def download_as_bytes(self, if_generation_match=None):
+        from google.api_core.exceptions import PreconditionFailed
+        generation, content = self.objects[self.name]
+        if if_generation_match is not None and if_generation_match != generation:
+            raise PreconditionFailed(self.name)
+        return content
+
+    def upload_from_string(self, data, if_generation_match=None):
+        from google.api_core.exceptions import PreconditionFailed
+        if self.before_upload:
+            hook, self.before_upload = self.before_upload, None
+            hook()
+        generation = self.objects.get(self.name, (0, b""))[0]
+        if if_generation_match is not None and if_generation_match != generation:
+            raise PreconditionFailed(self.name)
+        self.objects[self.name] = (generation + 1, data)
+
+def test_parallel_shards_save_one_remote_index(monkeypatch):
+    """Test that two shards saving the same gs:// index at the same time both keep their records."""
+    objects = {}
+    hooks = []
+    monkeypatch.setattr('src.storage.time.sleep', lambda seconds: None)
+    monkeypatch.setattr('src.storage._get_blob', lambda path: FakeBlob(objects, path, hooks.pop() if hooks else None))
+    path = "gs://bucket/index.jsonl"
+    shard0, shard1 = DedupIndex(path), DedupIndex(path)
+    shard0.add("a.md", "folder0", message_id="msg0")
+    shard1.add("b.md", "folder1", message_id="msg1")
+
+    # Shard 1 saves between the read and the write of shard 0
+    hooks.append(shard1.save)
+    shard0.save()
+
+    reloaded = DedupIndex(path)
+    assert reloaded.contains_message("msg0")
+    assert reloaded.contains_message("msg1")
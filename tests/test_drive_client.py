@@ -2,6 +2,7 @@ import pytest
 from unittest.mock import MagicMock, patch
 from src.drive_client import DriveClient
 from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
 
 @pytest.fixture
 def mock_credentials():
@@ -9,9 +10,9 @@ def mock_credentials():
 
 @pytest.fixture
 def drive_client(mock_credentials):
-    with patch('src.drive_client.build') as mock_build:
+    with patch('src.drive_client.get_service') as mock_build:
         client = DriveClient(credentials=mock_credentials)
-        return client, mock_build.return_value
+        yield client, mock_build.return_value
 
 def test_file_exists_true(drive_client):
     """Test when a file exists in the folder."""
@@ -73,3 +74,127 @@ def test_upload_markdown(drive_client):
     assert kwargs['body']['name'] == 'test.md'
     assert kwargs['body']['parents'] == ['folder_id']
     assert kwargs['supportsAllDrives'] is True
+
+def test_upload_markdown_small_file_is_multipart(drive_client):
+    """Test that files below the threshold are uploaded in a single multipart request."""
+    client, mock_service = drive_client
+    mock_create = mock_service.files().create
+    mock_create.return_value.execute.return_value = {'id': 'small'}
+
+    assert client.upload_markdown("small.md", "# Content", "folder_id") == 'small'
+
+    media = mock_create.call_args.kwargs['media_body']
+    assert media.resumable() is False
+    assert media.size() == len("# Content")
+    mock_create.return_value.next_chunk.assert_not_called()
+
+def test_upload_markdown_large_file_resumes_after_error(drive_client):
+    """Test that large files are uploaded in chunks and a failed chunk is resumed after a backoff."""
+    client, mock_service = drive_client
+    client.resumable_threshold = 10
+    client.upload_chunk_size = 256 * 1024
+    mock_create = mock_service.files().create
+    mock_create.return_value.next_chunk.side_effect = [
+        (MagicMock(progress=lambda: 0.5), None),
+        HttpError(MagicMock(status=503, get=lambda key, default=None: None), b'Backend Error'),
+        (None, {'id': 'large'}),
+    ]
+
+    with patch('src.rate_limit.time.sleep') as mock_sleep:
+        file_id = client.upload_markdown("large.md", "x" * (300 * 1024), "folder_id")
+
+    assert file_id == 'large'
+    media = mock_create.call_args.kwargs['media_body']
+    assert media.resumable() is True
+    assert media.chunksize() == 256 * 1024
+    assert mock_create.return_value.next_chunk.call_count == 3
+    mock_sleep.assert_called_once()
+    mock_create.return_value.execute.assert_not_called()
+
+def test_list_files_pagination(drive_client):
+    """Test that folder listings follow nextPageToken."""
+    client, mock_service = drive_client
+    mock_list = mock_service.files().list
+    mock_list.return_value.execute.side_effect = [
+        {'files': [{'id': '1', 'name': 'a.md'}], 'nextPageToken': 'page2'},
+        {'files': [{'id': '2', 'name': 'b.md'}]},
+    ]
+
+    files = list(client.list_files("folder_id"))
+
+    assert [f['name'] for f in files] == ['a.md', 'b.md']
+    args, kwargs = mock_list.call_args
+    assert kwargs['q'] == "'folder_id' in parents and trashed = false"
+    assert kwargs['pageSize'] == 1000
+    assert kwargs['pageToken'] == 'page2'
+
+def test_file_exists_with_listing_cache(mock_credentials):
+    """Test that a cached folder listing answers existence checks without further queries."""
+    with patch('src.drive_client.get_service') as mock_build:
+        client = DriveClient(credentials=mock_credentials, cache_listings=True)
+        mock_service = mock_build.return_value
+        mock_list = mock_service.files().list
+        mock_list.return_value.execute.side_effect = [
+            {'files': [{'id': '1', 'name': 'a.md'}], 'nextPageToken': 'page2'},
+            {'files': [{'id': '2', 'name': 'b.md'}]},
+        ]
+        mock_service.files().create.return_value.execute.return_value = {'id': 'new_file_id'}
+
+        assert client.file_exists("a.md", "folder_id") is True
+        assert client.file_exists("b.md", "folder_id") is True
+        assert client.file_exists("c.md", "folder_id") is False
+        assert mock_list.call_count == 2
+        args, kwargs = mock_list.call_args
+        assert kwargs['fields'] == "nextPageToken, files(name, id, md5Checksum)"
+
+        # Files uploaded during the run are added to the cached listing
+        client.upload_markdown("c.md", "# Content", "folder_id")
+        assert client.file_exists("c.md", "folder_id") is True
+        assert mock_list.call_count == 2
+
+def test_files_exist_uses_batch_requests(drive_client):
+    """Test that existence queries of several files are sent in one batch request."""
+    client, mock_service = drive_client
+    found = {'a.md': {'files': [{'id': '1', 'name': 'a.md'}]}, 'b.md': {'files': []}}
+    batches = []
+
+    class FakeBatch:
+        def __init__(self, callback):
+            self.callback = callback
+            self.requests = []
+            batches.append(self)
+
+        def add(self, request, request_id):
+            self.requests.append((request_id, request))
+
+        def execute(self):
+            for request_id, request in self.requests:
+                self.callback(request_id, found[request.filename], None)
+
+    mock_service.new_batch_http_request.side_effect = lambda callback: FakeBatch(callback)
+    mock_service.files().list.side_effect = lambda q, **kwargs: MagicMock(filename=q.split("'")[1])
+
+    assert client.files_exist(['a.md', 'b.md'], "folder_id") == [True, False]
+    assert len(batches) == 1
+    mock_service.files().list.return_value.execute.assert_not_called()
+
+def test_upload_many_reports_each_item(drive_client):
+    """Test that concurrent uploads return a result per item and one failure does not stop the others."""
+    client, mock_service = drive_client
+
+    def upload(filename, content, folder_id, message_id=None):
+        if filename == 'bad.md':
+            raise RuntimeError("quota")
+        return f"id-{filename}"
+
+    with patch.object(client, 'upload_markdown', side_effect=upload) as mock_upload:
+        results = client.upload_many([
+            {'filename': 'a.md', 'content': '# A', 'folder_id': 'f', 'message_id': 'm1'},
+            {'filename': 'bad.md', 'content': '# B', 'folder_id': 'f'},
+            {'filename': 'c.md', 'content': '# C', 'folder_id': 'f'},
+        ])
+
+    assert results[0] == 'id-a.md'
+    assert str(results[1]) == "quota"
+    assert results[2] == 'id-c.md'
+    mock_upload.assert_any_call('a.md', '# A', 'f', message_id='m1')
@@ -1,7 +1,9 @@
+import base64
 import pytest
 from unittest.mock import MagicMock, patch
-from src.gmail_client import GmailClient
+from src.gmail_client import GmailClient, BATCH_SIZE
 from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
 
 @pytest.fixture
 def mock_credentials():
@@ -9,9 +11,9 @@ def mock_credentials():
 
 @pytest.fixture
 def gmail_client(mock_credentials):
-    with patch('src.gmail_client.build') as mock_build:
+    with patch('src.gmail_client.get_service') as mock_build:
         client = GmailClient(credentials=mock_credentials)
-        return client, mock_build.return_value
+        yield client, mock_build.return_value
 
 def test_search_messages(gmail_client):
     """Test the message search functionality."""
@@ -21,12 +23,74 @@ def test_search_messages(gmail_client):
         'messages': [{'id': '123'}, {'id': '456'}]
     }
 
-    results = client.search_messages("query")
+    results = list(client.search_messages("query"))
     
     assert len(results) == 2
     assert results[0]['id'] == '123'
     mock_list.assert_called_with(userId='me', q="query")
 
+def test_search_messages_pagination(gmail_client):
+    """Test that search results follow nextPageToken lazily."""
+    client, mock_service = gmail_client
+    mock_list = mock_service.users().messages().list
+    mock_list.return_value.execute.side_effect = [
+        {'messages': [{'id': '1'}], 'nextPageToken': 'page2'},
+        {'messages': [{'id': '2'}]},
+    ]
+
+    results = client.search_messages("query")
+    assert next(results)['id'] == '1'
+    # The second page is not requested until the first one is consumed
+    assert mock_list.call_count == 1
+
+    assert [m['id'] for m in results] == ['2']
+    mock_list.assert_called_with(userId='me', q="query", pageToken='page2')
+
+def test_search_new_messages_uses_history(gmail_client):
+    """Test incremental search via users.history.list filtered by the resolved label."""
+    client, mock_service = gmail_client
+    mock_service.users().labels().list.return_value.execute.return_value = {
+        'labels': [{'id': 'Label_1', 'name': '週刊Life is beautiful (まぐまぐ!)'}]
+    }
+    mock_history = mock_service.users().history().list
+    mock_history.return_value.execute.side_effect = [
+        {'history': [{'messagesAdded': [{'message': {'id': 'old', 'labelIds': ['Label_1']}}]}], 'nextPageToken': 'p2'},
+        {'history': [
+            {'messagesAdded': [{'message': {'id': 'other', 'labelIds': ['INBOX']}}]},
+            {'labelsAdded': [{'message': {'id': 'new', 'labelIds': ['INBOX', 'Label_1']}}]},
+        ]},
+    ]
+
+    results = list(client.search_new_messages("label:週刊life-is-beautiful-まぐまぐ-", "100"))
+
+    assert [m['id'] for m in results] == ['new', 'old']
+    args, kwargs = mock_history.call_args
+    assert kwargs['startHistoryId'] == '100'
+    assert kwargs['labelId'] == 'Label_1'
+    mock_service.users().messages().list.assert_not_called()
+
+def test_search_new_messages_expired_history(gmail_client):
+    """Test fallback to a full search when the stored historyId is too old."""
+    client, mock_service = gmail_client
+    mock_service.users().labels().list.return_value.execute.return_value = {
+        'labels': [{'id': 'Label_1', 'name': 'news'}]
+    }
+    mock_service.users().history().list.return_value.execute.side_effect = HttpError(
+        MagicMock(status=404), b'Not Found'
+    )
+    mock_service.users().messages().list.return_value.execute.return_value = {'messages': [{'id': '1'}]}
+
+    results = list(client.search_new_messages("label:news", "1"))
+
+    assert [m['id'] for m in results] == ['1']
+
+def test_get_history_id(gmail_client):
+    """Test reading the current mailbox historyId."""
+    client, mock_service = gmail_client
+    mock_service.users().getProfile.return_value.execute.return_value = {'historyId': 12345}
+
+    assert client.get_history_id() == '12345'
+
 def test_get_message_details(gmail_client):
     """Test the retrieval of message details."""
     client, mock_service = gmail_client
@@ -50,3 +114,223 @@ def test_get_message_details(gmail_client):
     assert details['subject'] == 'Test Subject'
     assert "<h1>Hello</h1>" in details['html_content']
     assert details['date'].year == 2026
+
+def _b64(text, charset='utf-8'):
+    return base64.urlsafe_b64encode(text.encode(charset)).decode('ascii')
+
+def test_get_message_details_nested_parts(gmail_client):
+    """Test that text/html nested in multipart/alternative is found and attachment-backed bodies are fetched."""
+    client, mock_service = gmail_client
+    mock_service.users().messages().get.return_value.execute.return_value = {
+        'id': '123',
+        'payload': {
+            'mimeType': 'multipart/related',
+            'headers': [{'name': 'Subject', 'value': 'Nested'}],
+            'parts': [
+                {'mimeType': 'multipart/alternative', 'body': {'size': 0}, 'parts': [
+                    {'mimeType': 'text/plain', 'body': {'data': _b64("plain")}},
+                    {'mimeType': 'text/html', 'body': {'size': 2000000, 'attachmentId': 'att1'},
+                     'headers': [{'name': 'Content-Type', 'value': 'text/html; charset="ISO-2022-JP"'}]},
+                ]},
+                {'mimeType': 'image/png', 'filename': 'logo.png', 'body': {'attachmentId': 'img1'}},
+            ]
+        }
+    }
+    mock_attachment = mock_service.users().messages().attachments().get
+    mock_attachment.return_value.execute.return_value = {'data': _b64("<p>こんにちは</p>", 'iso-2022-jp')}
+
+    details = client.get_message_details("123")
+
+    assert details['html_content'] == "<p>こんにちは</p>"
+    # Only the selected part is downloaded (not the inline image)
+    mock_attachment.assert_called_once_with(userId='me', messageId='123', id='att1')
+
+def test_get_message_details_raw_format(mock_credentials):
+    """Test the 'raw' format path parsed with the email package."""
+    raw = (
+        "Subject: =?UTF-8?B?44OG44K544OI?=\r\n"
+        "Date: Mon, 28 Feb 2026 10:00:00 +0900\r\n"
+        "MIME-Version: 1.0\r\n"
+        "Content-Type: multipart/alternative; boundary=b1\r\n\r\n"
+        "--b1\r\nContent-Type: text/plain; charset=utf-8\r\n\r\nplain\r\n"
+        "--b1\r\nContent-Type: text/html; charset=utf-8\r\nContent-Transfer-Encoding: base64\r\n\r\n"
+        + base64.b64encode("<h1>テスト</h1>".encode('utf-8')).decode('ascii') + "\r\n"
+        "--b1--\r\n"
+    )
+    with patch('src.gmail_client.get_service') as mock_get_service:
+        client = GmailClient(credentials=mock_credentials, message_format='raw')
+        mock_get = mock_get_service.return_value.users().messages().get
+        # Unpadded base64url, as Gmail may return it
+        mock_get.return_value.execute.return_value = {'id': '123', 'raw': _b64(raw).rstrip('=')}
+        details = client.get_message_details("123")
+
+    assert mock_get.call_args.kwargs['format'] == 'raw'
+    assert details['subject'] == "テスト"
+    assert details['html_content'].strip() == "<h1>テスト</h1>"
+    assert details['date'].year == 2026
+
+def test_base64_chunks_match_single_decode():
+    """Test that incremental decoding matches decoding at once."""
+    data = _b64("x" * 1000 + "あ")
+    assert b"".join(GmailClient._iter_base64_chunks(data, chunk_size=12)) == ("x" * 1000 + "あ").encode('utf-8')
+
+def test_decode_body_keeps_characters_split_across_chunks():
+    """Test that multibyte characters cut at a chunk boundary are decoded once their remaining bytes arrive."""
+    # Chunks of 4 base64 characters are 3 bytes; the leading "x" makes every character straddle two chunks
+    text = "x" + "あいうえお" * 50
+    assert GmailClient._decode_body(_b64(text), 'utf-8', chunk_size=4) == text
+    assert GmailClient._decode_body(_b64(text, 'shift_jis'), 'shift_jis', chunk_size=4) == text
+    assert GmailClient._decode_body(_b64(text), 'unknown-charset', chunk_size=4) == text
+
+class FakeBatch:
+    """Minimal stand-in for BatchHttpRequest that replays canned responses."""
+
+    def __init__(self, responses, callback):
+        self.responses = responses
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        # Respond in reverse order to verify that results are reordered by request ID
+        for request_id, request in reversed(self.requests):
+            response, exception = self.responses[request.message_id]
+            self.callback(request_id, response, exception)
+
+def _message_resource(message_id, subject):
+    return {
+        'id': message_id,
+        'payload': {
+            'headers': [
+                {'name': 'Subject', 'value': subject},
+                {'name': 'Date', 'value': 'Mon, 28 Feb 2026 10:00:00 +0900'}
+            ],
+            'body': {'data': 'PGgxPkhlbGxvPC9oMT4='}
+        }
+    }
+
+def test_get_messages_details_batch(gmail_client):
+    """Test batched retrieval keeps input order and reports per-message errors."""
+    client, mock_service = gmail_client
+    responses = {
+        'a': (_message_resource('a', 'First'), None),
+        'b': (None, Exception("Not Found")),
+        'c': (_message_resource('c', 'Third'), None),
+    }
+    batches = []
+
+    def new_batch(callback):
+        batch = FakeBatch(responses, callback)
+        batches.append(batch)
+        return batch
+
+    def get(userId, id, format):
+        return MagicMock(message_id=id)
+
+    mock_service.new_batch_http_request.side_effect = new_batch
+    mock_service.users().messages().get.side_effect = get
+
+    results = client.get_messages_details(['a', 'b', 'c'])
+
+    assert len(batches) == 1
+    assert [r['id'] for r in results] == ['a', 'b', 'c']
+    assert results[0]['subject'] == 'First'
+    assert "<h1>Hello</h1>" in results[0]['html_content']
+    assert str(results[1]['error']) == "Not Found"
+    assert results[2]['subject'] == 'Third'
+
+def test_get_messages_details_splits_batches(gmail_client):
+    """Test that more than BATCH_SIZE messages are split into multiple batches."""
+    client, mock_service = gmail_client
+    ids = [str(i) for i in range(BATCH_SIZE + 1)]
+    responses = {i: (_message_resource(i, f"Subject {i}"), None) for i in ids}
+    batches = []
+
+    def new_batch(callback):
+        batch = FakeBatch(responses, callback)
+        batches.append(batch)
+        return batch
+
+    mock_service.new_batch_http_request.side_effect = new_batch
+    mock_service.users().messages().get.side_effect = lambda userId, id, format: MagicMock(message_id=id)
+
+    results = client.get_messages_details(ids)
+
+    assert [len(b.requests) for b in batches] == [BATCH_SIZE, 1]
+    assert [r['subject'] for r in results] == [f"Subject {i}" for i in ids]
+
+def test_get_messages_metadata(gmail_client):
+    """Test that metadata requests ask for Subject/Date only, with a fields mask."""
+    client, mock_service = gmail_client
+    responses = {
+        'a': ({'id': 'a', 'payload': {'headers': [
+            {'name': 'Subject', 'value': 'First'},
+            {'name': 'Date', 'value': 'Mon, 28 Feb 2026 10:00:00 +0900'}
+        ]}}, None),
+        'b': (None, Exception("Not Found")),
+    }
+    requests = []
+
+    def get(**kwargs):
+        requests.append(kwargs)
+        return MagicMock(message_id=kwargs['id'])
+
+    mock_service.new_batch_http_request.side_effect = lambda callback: FakeBatch(responses, callback)
+    mock_service.users().messages().get.side_effect = get
+
+    results = client.get_messages_metadata(['a', 'b'])
+
+    assert requests[0] == {
+        'userId': 'me', 'id': 'a', 'format': 'metadata',
+        'metadataHeaders': ['Subject', 'Date'], 'fields': 'id,payload/headers'
+    }
+    assert results[0]['subject'] == 'First'
+    assert results[0]['date'].day == 28
+    assert 'html_content' not in results[0]
+    assert str(results[1]['error']) == "Not Found"
+
+def test_get_messages_details_retries_throttled_calls(gmail_client):
+    """Test that calls rejected with 429 inside a batch are retried in a later batch after Retry-After."""
+    client, mock_service = gmail_client
+    throttled = HttpError(MagicMock(status=429, get=lambda key, default=None: '3'), b'Too Many Requests')
+    outcomes = {
+        'a': [(_message_resource('a', 'First'), None)],
+        'b': [(None, throttled), (_message_resource('b', 'Second'), None)],
+    }
+
+    class Replay(dict):
+        def __getitem__(self, message_id):
+            return outcomes[message_id].pop(0)
+
+    batches = []
+
+    def new_batch(callback):
+        batch = FakeBatch(Replay(), callback)
+        batches.append(batch)
+        return batch
+
+    mock_service.new_batch_http_request.side_effect = new_batch
+    mock_service.users().messages().get.side_effect = lambda userId, id, format: MagicMock(message_id=id)
+
+    with patch('src.rate_limit.time.sleep') as mock_sleep, patch.object(client._limiter, 'on_throttled'):
+        results = client.get_messages_details(['a', 'b'])
+
+    assert [len(b.requests) for b in batches] == [2, 1]
+    assert [r['subject'] for r in results] == ['First', 'Second']
+    mock_sleep.assert_called_once_with(3.0)
+
+def test_search_message_ids_follows_pages_with_fields_mask(gmail_client):
+    """Test that all pages of a (combined) query are listed with the largest page size and a fields mask."""
+    client, mock_service = gmail_client
+    mock_list = mock_service.users().messages().list
+    mock_list.return_value.execute.side_effect = [
+        {'messages': [{'id': '1'}], 'nextPageToken': 'page2'},
+        {'messages': [{'id': '2'}]},
+    ]
+
+    assert list(client.search_message_ids("{label:a label:b}")) == ['1', '2']
+    mock_list.assert_called_with(
+        userId='me', q="{label:a label:b}", maxResults=500, fields='messages/id,nextPageToken', pageToken='page2'
+    )
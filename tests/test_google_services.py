@@ -0,0 +1,63 @@
+import threading
+import pytest
+from unittest.mock import MagicMock, patch
+from google.oauth2.credentials import Credentials
+from src import google_services
+
+@pytest.fixture(autouse=True)
+def clear_cache(monkeypatch):
+    monkeypatch.setenv("GCP_CLIENT_ID", "id")
+    monkeypatch.setenv("GCP_CLIENT_SECRET", "secret")
+    monkeypatch.setenv("GCP_REFRESH_TOKEN", "token")
+    monkeypatch.delenv("GOOGLE_API_ROOT_URL", raising=False)
+    google_services.clear_cache()
+    yield
+    google_services.clear_cache()
+
+def test_get_credentials_is_shared_and_refreshed_once():
+    """Test that one refreshed Credentials object is shared across calls."""
+    def refresh(self, request):
+        self.token = "access-token"
+
+    with patch.object(Credentials, 'refresh', autospec=True, side_effect=refresh) as mock_refresh:
+        first = google_services.get_credentials()
+        second = google_services.get_credentials()
+
+    assert first is second
+    assert first.token == "access-token"
+    assert mock_refresh.call_count == 1
+
+def test_get_credentials_missing_env(monkeypatch):
+    """Test that missing environment variables are reported."""
+    monkeypatch.delenv("GCP_REFRESH_TOKEN")
+    with pytest.raises(ValueError):
+        google_services.get_credentials()
+
+def test_get_service_is_cached_per_thread():
+    """Test that services are built once per thread and reused across clients."""
+    credentials = MagicMock(spec=Credentials)
+    with patch('src.google_services.build_service') as mock_build:
+        mock_build.side_effect = lambda *args, **kwargs: MagicMock()
+        service = google_services.get_service('gmail', 'v1', credentials)
+        services = []
+        thread = threading.Thread(target=lambda: services.append(google_services.get_service('gmail', 'v1', credentials)))
+        thread.start()
+        thread.join()
+
+        assert google_services.get_service('gmail', 'v1', credentials) is service
+        assert google_services.get_service('drive', 'v3', credentials) is not service
+
+    assert services[0] is not service
+    assert mock_build.call_count == 3
+
+def test_build_service_uses_bundled_document(monkeypatch):
+    """Test that services are built without a discovery request, optionally for another root URL."""
+    credentials = MagicMock(spec=Credentials)
+    service = google_services.build_service('gmail', 'v1', credentials)
+    assert service._baseUrl == "https://gmail.googleapis.com/"
+
+    monkeypatch.setenv("GOOGLE_API_ROOT_URL", "http://127.0.0.1:8080")
+    service = google_services.build_service('drive', 'v3', credentials)
+    assert service._baseUrl == "http://127.0.0.1:8080/drive/v3/"
+    # The cached document itself is left untouched
+    assert google_services.load_discovery_document('drive', 'v3')['rootUrl'] == "https://www.googleapis.com/"
@@ -1,6 +1,8 @@
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import ANY, MagicMock, patch
 from src.main import main
+from src.config import NewsletterConfig
+from src.drive_client import DriveClient
 from datetime import datetime
 
 @pytest.fixture
@@ -8,16 +10,24 @@ def mock_config():
     """Mock application configuration."""
     with patch('src.main.AppConfig') as mock:
         mock.return_value.newsletters = [
-            {'name': 'TestNewsletter', 'query': 'label:test', 'folder_id': 'folder123'}
+            NewsletterConfig(name='TestNewsletter', query='label:test', folder_id='folder123')
         ]
         yield mock
 
 @pytest.fixture
-def mock_clients():
+def mock_clients(tmp_path, monkeypatch):
     """Mock external service clients."""
+    # Runs record their state, which would otherwise skip the newsletters in later tests
+    monkeypatch.setenv("STATE_PATH", str(tmp_path / "state.json"))
     with patch('src.main.GmailClient') as mock_gmail, \
          patch('src.main.DriveClient') as mock_drive, \
          patch('src.main.DiscordNotifier') as mock_notifier:
+        # Concurrent uploads go through the mocked upload_markdown
+        mock_drive.return_value.upload_many.side_effect = lambda items: DriveClient.upload_many(mock_drive.return_value, items)
+        # Batched existence checks answer from the mocked file_exists
+        mock_drive.return_value.files_exist.side_effect = lambda filenames, folder_id: [
+            mock_drive.return_value.file_exists(filename, folder_id) for filename in filenames
+        ]
         yield mock_gmail.return_value, mock_drive.return_value, mock_notifier.return_value
 
 def test_main_flow_success(mock_config, mock_clients):
@@ -26,12 +36,13 @@ def test_main_flow_success(mock_config, mock_clients):
     
     # Configure Gmail mock
     mock_gmail.search_messages.return_value = [{'id': 'msg1'}]
-    mock_gmail.get_message_details.return_value = {
+    mock_gmail.get_messages_metadata.return_value = [{'id': 'msg1', 'subject': 'Hello', 'date': datetime(2026, 2, 28)}]
+    mock_gmail.get_messages_details.return_value = [{
         'id': 'msg1',
         'subject': 'Hello',
         'html_content': '<h1>World</h1>',
         'date': datetime(2026, 2, 28)
-    }
+    }]
     
     # Configure Drive mock (file does not exist)
     mock_drive.file_exists.return_value = False
@@ -45,19 +56,20 @@ def test_main_flow_success(mock_config, mock_clients):
     mock_gmail.search_messages.assert_called_once_with('label:test')
     mock_drive.upload_markdown.assert_called_once()
     # Expect filename following the rule: yyyymmdd_Subject.md
-    mock_notifier.send_success.assert_called_once_with(['20260228_Hello.md'])
+    mock_notifier.send_success.assert_called_once_with(['20260228_Hello.md'], summary=ANY)
 
 def test_main_flow_duplicate_skip(mock_config, mock_clients):
     """Test that existing files are skipped during processing."""
     mock_gmail, mock_drive, mock_notifier = mock_clients
     
     mock_gmail.search_messages.return_value = [{'id': 'msg1'}]
-    mock_gmail.get_message_details.return_value = {
+    mock_gmail.get_messages_metadata.return_value = [{'id': 'msg1', 'subject': 'Hello', 'date': datetime(2026, 2, 28)}]
+    mock_gmail.get_messages_details.return_value = [{
         'id': 'msg1',
         'subject': 'Hello',
         'html_content': '<h1>World</h1>',
         'date': datetime(2026, 2, 28)
-    }
+    }]
     
     # Simulate existing file in Drive
     mock_drive.file_exists.return_value = True
@@ -68,3 +80,243 @@ def test_main_flow_duplicate_skip(mock_config, mock_clients):
     # Verify that upload is skipped and notification is sent with an empty list
     mock_drive.upload_markdown.assert_not_called()
     mock_notifier.send_success.assert_called_with([])
+
+def test_main_flow_fetch_error(mock_config, mock_clients):
+    """Test that a failed message fetch is reported after the run."""
+    mock_gmail, mock_drive, mock_notifier = mock_clients
+    
+    mock_gmail.search_messages.return_value = [{'id': 'msg1'}]
+    mock_gmail.get_messages_metadata.return_value = [{'id': 'msg1', 'error': Exception("Not Found")}]
+    
+    with pytest.raises(RuntimeError, match="msg1"):
+        main()
+    
+    mock_drive.upload_markdown.assert_not_called()
+    mock_notifier.send_error.assert_called_once()
+
+def test_main_queries_drive_in_batches_without_listing_cache(mock_config, mock_clients, monkeypatch):
+    """Test that DRIVE_LISTING_CACHE=false checks existence with batched name queries instead of folder listings."""
+    mock_gmail, mock_drive, mock_notifier = mock_clients
+    monkeypatch.setenv("DRIVE_LISTING_CACHE", "false")
+    mock_gmail.search_messages.return_value = []
+    mock_gmail.get_messages_metadata.return_value = []
+
+    main()
+
+    import src.main
+    src.main.DriveClient.assert_called_once_with(cache_listings=False)
+
+def test_main_fetches_bodies_of_new_messages_only(mock_config, mock_clients, monkeypatch):
+    """Test that message bodies are only downloaded for files that do not exist in Drive yet."""
+    mock_gmail, mock_drive, mock_notifier = mock_clients
+    monkeypatch.setenv("MAX_MESSAGES_PER_NEWSLETTER", "2")
+
+    mock_gmail.search_messages.return_value = [{'id': 'new'}, {'id': 'old'}]
+    mock_gmail.get_messages_metadata.return_value = [
+        {'id': 'new', 'subject': 'New', 'date': datetime(2026, 2, 28)},
+        {'id': 'old', 'subject': 'Old', 'date': datetime(2026, 2, 27)},
+    ]
+    mock_gmail.get_messages_details.return_value = [
+        {'id': 'new', 'subject': 'New', 'html_content': '<p>x</p>', 'date': datetime(2026, 2, 28)}
+    ]
+    mock_drive.file_exists.side_effect = lambda filename, folder_id: filename == '20260227_Old.md'
+
+    main()
+
+    mock_gmail.get_messages_metadata.assert_called_once_with(['new', 'old'])
+    # Both files are checked in one batched call
+    mock_drive.files_exist.assert_called_once_with(['20260228_New.md', '20260227_Old.md'], 'folder123')
+    mock_gmail.get_messages_details.assert_called_once_with(['new'])
+    mock_notifier.send_success.assert_called_once_with(['20260228_New.md'], summary=ANY)
+
+def test_main_uploads_one_file_per_filename(mock_config, mock_clients, monkeypatch):
+    """Test that messages with the same date and subject are uploaded once (the first one)."""
+    mock_gmail, mock_drive, mock_notifier = mock_clients
+    monkeypatch.setenv("MAX_MESSAGES_PER_NEWSLETTER", "2")
+
+    mock_gmail.search_messages.return_value = [{'id': 'first'}, {'id': 'resent'}]
+    mock_gmail.get_messages_metadata.return_value = [
+        {'id': 'first', 'subject': 'Hello', 'date': datetime(2026, 2, 28)},
+        {'id': 'resent', 'subject': 'Hello', 'date': datetime(2026, 2, 28)},
+    ]
+    mock_gmail.get_messages_details.side_effect = lambda ids: [
+        {'id': msg_id, 'subject': 'Hello', 'html_content': '<p>x</p>', 'date': datetime(2026, 2, 28)} for msg_id in ids
+    ]
+    mock_drive.file_exists.return_value = False
+
+    main()
+
+    mock_drive.files_exist.assert_called_once_with(['20260228_Hello.md'], 'folder123')
+    mock_gmail.get_messages_details.assert_called_once_with(['first'])
+    mock_drive.upload_markdown.assert_called_once()
+    mock_notifier.send_success.assert_called_once_with(['20260228_Hello.md'], summary=ANY)
+
+def test_main_incremental_sync(mock_config, mock_clients, tmp_path, monkeypatch):
+    """Test that the stored historyId is used for searching and advanced after the run."""
+    mock_gmail, mock_drive, mock_notifier = mock_clients
+    state_path = tmp_path / "state.json"
+    state_path.write_text('{"history_id": "100"}')
+    monkeypatch.setenv("INCREMENTAL_SYNC", "true")
+    monkeypatch.setenv("STATE_PATH", str(state_path))
+
+    mock_gmail.get_history_id.return_value = '200'
+    mock_gmail.search_new_messages.return_value = iter([])
+    mock_gmail.get_messages_metadata.return_value = []
+    mock_gmail.get_messages_details.return_value = []
+
+    main()
+
+    mock_gmail.search_new_messages.assert_called_once_with('label:test', '100')
+    mock_gmail.search_messages.assert_not_called()
+    assert '"200"' in state_path.read_text()
+
+def test_main_dedup_index(mock_config, mock_clients, tmp_path, monkeypatch):
+    """Test that the dedup index replaces Drive existence queries and records uploads."""
+    mock_gmail, mock_drive, mock_notifier = mock_clients
+    index_path = tmp_path / "index.jsonl"
+    index_path.write_text('{"message_id": "old", "folder_id": "folder123", "filename": "x.md", "file_id": "f0"}\n')
+    monkeypatch.setenv("DEDUP_INDEX_PATH", str(index_path))
+    monkeypatch.setenv("MAX_MESSAGES_PER_NEWSLETTER", "2")
+
+    mock_gmail.search_messages.return_value = [{'id': 'msg1'}, {'id': 'old'}]
+    mock_gmail.get_messages_metadata.return_value = [{'id': 'msg1', 'subject': 'Hello', 'date': datetime(2026, 2, 28)}]
+    mock_gmail.get_messages_details.return_value = [{
+        'id': 'msg1',
+        'subject': 'Hello',
+        'html_content': '<h1>World</h1>',
+        'date': datetime(2026, 2, 28)
+    }]
+    mock_drive.upload_markdown.return_value = 'file_abc'
+
+    main()
+
+    # The already indexed message is not fetched, and Drive is not queried
+    mock_gmail.get_messages_details.assert_called_once_with(['msg1'])
+    mock_drive.file_exists.assert_not_called()
+    assert '"msg1"' in index_path.read_text()
+
+def test_main_concurrent_newsletters_keep_order(mock_clients, monkeypatch):
+    """Test that results from concurrently processed newsletters are reported in configuration order."""
+    mock_gmail, mock_drive, mock_notifier = mock_clients
+    monkeypatch.setenv("MAX_WORKERS", "3")
+    monkeypatch.setenv("MAX_MESSAGES_PER_NEWSLETTER", "2")
+    newsletters = [
+        NewsletterConfig(name=f'News{i}', query=f'label:n{i}', folder_id=f'folder{i}') for i in range(3)
+    ]
+
+    mock_gmail.search_messages.side_effect = lambda query: [{'id': f'{query}-a'}, {'id': f'{query}-b'}]
+    mock_gmail.get_messages_metadata.side_effect = lambda ids: [
+        {'id': msg_id, 'subject': msg_id.replace(':', '_'), 'date': datetime(2026, 2, 28)}
+        for msg_id in ids
+    ]
+    mock_gmail.get_messages_details.side_effect = lambda ids: [
+        {'id': msg_id, 'subject': msg_id.replace(':', '_'), 'html_content': '<p>x</p>', 'date': datetime(2026, 2, 28)}
+        for msg_id in ids
+    ]
+    mock_drive.file_exists.return_value = False
+
+    with patch('src.main.AppConfig') as mock_config:
+        mock_config.return_value.newsletters = newsletters
+        main()
+
+    mock_notifier.send_success.assert_called_once_with([
+        f'20260228_label_n{i}-{suffix}.md' for i in range(3) for suffix in 'ab'
+    ], summary=ANY)
+
+def test_main_with_conversion_pool(mock_config, mock_clients, monkeypatch):
+    """Test that conversion through worker processes uploads the same Markdown."""
+    mock_gmail, mock_drive, mock_notifier = mock_clients
+    monkeypatch.setenv("CONVERT_PROCESSES", "1")
+
+    mock_gmail.search_messages.return_value = [{'id': 'msg1'}]
+    mock_gmail.get_messages_metadata.return_value = [{'id': 'msg1', 'subject': 'Hello', 'date': datetime(2026, 2, 28)}]
+    mock_gmail.get_messages_details.return_value = [{
+        'id': 'msg1',
+        'subject': 'Hello',
+        'html_content': '<h1>World</h1>',
+        'date': datetime(2026, 2, 28)
+    }]
+    mock_drive.file_exists.return_value = False
+
+    main()
+
+    args, kwargs = mock_drive.upload_markdown.call_args
+    assert args[0] == '20260228_Hello.md'
+    assert "# World" in args[1]
+    mock_notifier.send_success.assert_called_once_with(['20260228_Hello.md'], summary=ANY)
+
+def test_main_conversion_cache(mock_config, mock_clients, tmp_path, monkeypatch):
+    """Test that a re-run converts nothing when the Markdown of the message is cached."""
+    mock_gmail, mock_drive, mock_notifier = mock_clients
+    monkeypatch.setenv("CONVERSION_CACHE_PATH", str(tmp_path / "cache.sqlite"))
+    mock_gmail.search_messages.return_value = [{'id': 'msg1'}]
+    mock_gmail.get_messages_metadata.return_value = [{'id': 'msg1', 'subject': 'Hello', 'date': datetime(2026, 2, 28)}]
+    mock_gmail.get_messages_details.return_value = [{
+        'id': 'msg1',
+        'subject': 'Hello',
+        'html_content': '<h1>World</h1>',
+        'date': datetime(2026, 2, 28)
+    }]
+    mock_drive.file_exists.return_value = False
+
+    main()
+    with patch('src.pipeline.EmailConverter.html_to_markdown') as mock_convert:
+        # The newsletter ran already today, so the re-run is forced
+        main({'force': True})
+
+    mock_convert.assert_not_called()
+    first, second = (c.args[1] for c in mock_drive.upload_markdown.call_args_list)
+    assert first == second
+    assert mock_notifier.send_success.call_args.kwargs['summary']['counters'] == {'conversion_cache_hits': 1}
+
+def test_main_profiling_from_event(mock_config, mock_clients, tmp_path, monkeypatch):
+    """Test that a profile of the run is written when requested in the event payload."""
+    mock_gmail, mock_drive, mock_notifier = mock_clients
+    monkeypatch.setenv("PROFILE_OUTPUT", str(tmp_path))
+    mock_gmail.search_messages.return_value = []
+    mock_gmail.get_messages_metadata.return_value = []
+
+    assert main({'profile': 'cprofile'}) == "Success"
+
+    assert len(list(tmp_path.glob("*-cprofile.pstats"))) == 1
+
+def test_entry_point_imports_are_lazy():
+    """Test that importing the entry point does not load the converter libraries or the HTTP client for Discord."""
+    import sys
+    import subprocess
+    script = (
+        "import sys, main, src.main; "
+        "print(','.join(m for m in ('bs4', 'markdownify', 'requests', 'dotenv') if m in sys.modules))"
+    )
+    completed = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    assert completed.stdout.strip() == ""
+
+def test_main_combined_search(mock_clients, tmp_path, monkeypatch):
+    """Test that newsletters that ran before are searched with one query and routed by label."""
+    mock_gmail, mock_drive, mock_notifier = mock_clients
+    state_path = tmp_path / "combined_state.json"
+    state_path.write_text('{"newsletters": {"News0": {"last_run": "2026-03-01T00:00:00+00:00"}, '
+                          '"News1": {"last_run": "2026-03-01T00:00:00+00:00"}}}')
+    monkeypatch.setenv("STATE_PATH", str(state_path))
+    monkeypatch.setenv("COMBINED_SEARCH", "true")
+    newsletters = [NewsletterConfig(name=f'News{i}', query=f'label:n{i}', folder_id=f'folder{i}') for i in range(2)]
+
+    mock_gmail.resolve_label_query.side_effect = lambda query: query.replace('label:', 'L_')
+    mock_gmail.search_message_ids.return_value = iter(['b', 'a'])
+    mock_gmail.get_messages_metadata.return_value = [
+        {'id': 'b', 'subject': 'B', 'date': datetime(2026, 3, 2), 'label_ids': ['L_n1']},
+        {'id': 'a', 'subject': 'A', 'date': datetime(2026, 3, 1), 'label_ids': ['L_n0']},
+    ]
+    mock_gmail.get_messages_details.side_effect = lambda ids: [
+        {'id': msg_id, 'subject': msg_id.upper(), 'html_content': '<p>x</p>', 'date': datetime(2026, 3, 1)} for msg_id in ids
+    ]
+    mock_drive.file_exists.return_value = False
+
+    with patch('src.main.AppConfig') as mock_config:
+        mock_config.return_value.newsletters = newsletters
+        main({'force': True})
+
+    mock_gmail.search_messages.assert_not_called()
+    # Metadata of the found messages is fetched once, along with the labels used for routing
+    mock_gmail.get_messages_metadata.assert_called_once_with(['b', 'a'], with_labels=True)
+    mock_notifier.send_success.assert_called_once_with(['20260301_A.md', '20260302_B.md'], summary=ANY)
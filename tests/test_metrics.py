@@ -0,0 +1,74 @@
+import json
+from unittest.mock import MagicMock, patch
+from src.metrics import Metrics, Histogram
+
+def test_histogram_quantiles_and_buckets():
+    """Test nearest-rank quantiles and cumulative bucket counts."""
+    histogram = Histogram()
+    for value in [0.2, 0.003, 3.0, 0.04]:
+        histogram.observe(value)
+
+    assert histogram.count == 4
+    assert histogram.quantile(0.5) == 0.04
+    assert histogram.quantile(0.95) == 3.0
+    buckets = dict(histogram.buckets())
+    assert buckets['0.005'] == 1
+    assert buckets['0.25'] == 3
+    assert buckets['+Inf'] == 4
+
+def test_stage_timing_and_summary():
+    """Test that decorated functions are timed as stages and summarized with API usage."""
+    metrics = Metrics()
+
+    @metrics.timed('convert')
+    def convert(x):
+        return x * 2
+
+    assert convert(2) == 4
+    with metrics.stage('upload'):
+        pass
+    metrics.record_api_call('gmail.users.messages.get', 0.1, 5)
+    metrics.record_api_call('gmail.users.messages.get', None, 0, 429)
+
+    summary = metrics.summary(messages=2)
+
+    assert summary['stages']['convert']['count'] == 1
+    assert set(summary['stages']) == {'convert', 'upload'}
+    assert summary['api_calls'] == 2
+    assert summary['api_errors'] == 1
+    assert summary['quota_units'] == 5
+    assert summary['messages'] == 2
+
+def test_track_bytes_counts_request_and_response_bodies():
+    """Test that bytes sent and received by a request are counted through its postproc hook."""
+    metrics = Metrics()
+    request = MagicMock(methodId='drive.files.create', body='{"name": "a.md"}', resumable=None)
+    request.postproc.return_value = {'id': 'f1'}
+
+    metrics.track_bytes(request)
+    assert request.postproc(MagicMock(), b'{"id": "f1"}') == {'id': 'f1'}
+
+    summary = metrics.summary(messages=1)
+    assert summary['bytes_sent'] == len('{"name": "a.md"}')
+    assert summary['bytes_received'] == len(b'{"id": "f1"}')
+
+def test_prometheus_dump_and_json_log(tmp_path, monkeypatch):
+    """Test the Prometheus text dump and the structured log line emitted at the end of a run."""
+    path = tmp_path / "metrics.prom"
+    monkeypatch.setenv("METRICS_PROMETHEUS_PATH", str(path))
+    metrics = Metrics()
+    with metrics.stage('fetch'):
+        pass
+    metrics.record_api_call('gmail.users.messages.list', 0.05, 5)
+
+    with patch('src.metrics._json_logger') as mock_logger:
+        metrics.finish_run(messages=0)
+
+    text = path.read_text()
+    assert 'gmail_uploader_stage_seconds_bucket{stage="fetch",le="+Inf"} 1' in text
+    assert 'gmail_uploader_api_calls_total{method="gmail.users.messages.list",status="200"} 1' in text
+    assert 'gmail_uploader_api_quota_units_total{method="gmail.users.messages.list"} 5' in text
+
+    entry = json.loads(mock_logger.info.call_args.args[0])
+    assert entry['severity'] == 'INFO'
+    assert entry['metrics']['api_calls'] == 1
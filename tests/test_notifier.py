@@ -34,3 +34,18 @@ def test_send_error(notifier):
         assert "❌ **Gmail Uploader" in payload['content']
         assert "Auth failed" in payload['content']
         assert "Invalid token" in payload['content']
+
+def test_send_success_with_summary(notifier):
+    """Test that the run summary is appended to the success notification."""
+    summary = {
+        'messages': 2, 'seconds': 4.0, 'messages_per_second': 0.5,
+        'stages': {'fetch': {'count': 1, 'total': 0.8, 'p50': 0.8, 'p95': 0.8}},
+        'api_calls': 7, 'api_errors': 0, 'quota_units': 21,
+    }
+    with patch('requests.post') as mock_post:
+        notifier.send_success(["test1.md", "test2.md"], summary=summary)
+
+        payload = json.loads(mock_post.call_args.kwargs['data'])
+        assert "0.50 emails/s" in payload['content']
+        assert "7 API calls (21 quota units" in payload['content']
+        assert "fetch 0.80s" in payload['content']
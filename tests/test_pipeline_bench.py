@@ -0,0 +1,19 @@
+import pytest
+from bench.pipeline_bench import run_benchmark
+
+def test_pipeline_against_fake_server():
+    """The whole pipeline runs against the fake Google API server, including batch fetches and uploads."""
+    results = run_benchmark(newsletters=2, messages=3, html_size=2_000, latency=0.0)
+
+    assert results["status"] == "Success"
+    assert results["workload"]["uploaded_files"] == 6
+
+    calls = results["api_calls"]["by_method"]
+    assert calls["gmail.messages.list"] == 2
+    # Metadata, then bodies of new messages, are fetched in one batch request per newsletter each
+    assert calls["gmail.messages.get"] == 12
+    assert calls["batch"] == 4
+    # Each target folder is listed once instead of one existence query per file
+    assert calls["drive.files.list"] == 2
+    assert calls["drive.files.create"] == 6
+    assert calls["discord.webhook"] == 1
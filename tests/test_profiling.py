@@ -0,0 +1,55 @@
+import pstats
+import threading
+import pytest
+from unittest.mock import MagicMock
+from src import profiling
+from src.profiling import SamplingProfiler
+
+def test_profiling_mode(monkeypatch):
+    """Test that the event payload takes precedence over the PROFILE environment variable."""
+    assert profiling.profiling_mode(None) is None
+
+    monkeypatch.setenv("PROFILE", "true")
+    assert profiling.profiling_mode(None) == 'cprofile'
+    assert profiling.profiling_mode({'profile': 'sample'}) == 'sample'
+    assert profiling.profiling_mode({'profile': False}) is None
+
+    request = MagicMock()
+    request.get_json.return_value = {'profile': 'sample'}
+    assert profiling.profiling_mode(request) == 'sample'
+
+    with pytest.raises(ValueError):
+        profiling.profiling_mode({'profile': 'perf'})
+
+def test_profile_writes_pstats(tmp_path):
+    """Test that the deterministic profile is written in the pstats format."""
+    with profiling.profile('cprofile', output=str(tmp_path), top_n=5):
+        sorted(range(10000), key=lambda x: -x)
+
+    [path] = tmp_path.glob("*-cprofile.pstats")
+    stats = pstats.Stats(str(path))
+    assert any(name == 'sorted' or 'sorted' in name for _, _, name in stats.stats)
+
+def test_sampling_profiler_covers_worker_threads():
+    """Test that stacks of busy worker threads are sampled and dumped as collapsed stacks."""
+    stop = threading.Event()
+
+    def busy_worker():
+        while not stop.is_set():
+            sum(range(1000))
+
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    worker = threading.Thread(target=busy_worker)
+    worker.start()
+    try:
+        while sum(profiler.samples.values()) < 5:
+            stop.wait(0.01)
+    finally:
+        stop.set()
+        worker.join()
+        profiler.stop()
+
+    collapsed = profiler.dump().decode('utf-8')
+    assert "busy_worker (test_profiling.py:" in collapsed
+    assert "samples every 1 ms" in profiler.report(5)
@@ -0,0 +1,53 @@
+from unittest.mock import MagicMock
+from datetime import datetime, timezone
+from src.config import NewsletterConfig
+from src.query_planner import QueryPlanner, combined_query
+
+LAST_RUN = datetime(2026, 3, 2, 9, 0, tzinfo=timezone.utc)
+NEWSLETTERS = [
+    NewsletterConfig(name='A', query='label:a', folder_id='f1'),
+    NewsletterConfig(name='B', query='label:b', folder_id='f2'),
+    NewsletterConfig(name='C', query='from:c@example.com', folder_id='f3'),
+    NewsletterConfig(name='New', query='label:new', folder_id='f4'),
+]
+
+def test_combined_query():
+    """Test that label queries are OR-ed and narrowed to mail received since a time."""
+    assert combined_query(['label:a', 'label:b']) == "{label:a label:b}"
+    assert combined_query(['label:a', 'label:b'], LAST_RUN) == "{label:a label:b} after:1772442000"
+
+def test_planner_routes_messages_by_label():
+    """Test that one search covers the combinable newsletters and each gets its newest messages."""
+    gmail_client = MagicMock()
+    gmail_client.resolve_label_query.side_effect = lambda query: {'label:a': 'L_A', 'label:b': 'L_B', 'label:new': 'L_NEW'}.get(query)
+    gmail_client.search_message_ids.return_value = iter(['m3', 'm2', 'm1'])
+    gmail_client.get_messages_metadata.side_effect = lambda ids, with_labels: [
+        {'id': 'm3', 'subject': 'A3', 'label_ids': ['INBOX', 'L_A']},
+        {'id': 'm2', 'subject': 'B2', 'label_ids': ['L_B']},
+        {'id': 'm1', 'subject': 'A1', 'label_ids': ['L_A']},
+    ]
+    last_runs = {'A': LAST_RUN, 'B': LAST_RUN, 'C': LAST_RUN, 'New': None}
+
+    candidates, failed = QueryPlanner(gmail_client).search(NEWSLETTERS, last_runs, max_messages=1)
+
+    # 'C' is not a label query and 'New' never ran, so both are left to the individual search
+    assert {name: [meta['id'] for meta in metadata] for name, metadata in candidates.items()} == {'A': ['m3'], 'B': ['m2']}
+    gmail_client.search_message_ids.assert_called_once_with("{label:a label:b} after:1772355600")
+    gmail_client.get_messages_metadata.assert_called_once_with(['m3', 'm2', 'm1'], with_labels=True)
+    assert failed == []
+
+def test_planner_reports_messages_that_failed_to_be_fetched():
+    """Test that a message that cannot be fetched (e.g., deleted since the search) does not abort the others."""
+    gmail_client = MagicMock()
+    gmail_client.resolve_label_query.side_effect = lambda query: {'label:a': 'L_A', 'label:b': 'L_B'}.get(query)
+    gmail_client.search_message_ids.return_value = iter(['m2', 'm1'])
+    gmail_client.get_messages_metadata.side_effect = lambda ids, with_labels: [
+        {'id': 'm2', 'error': Exception("Not Found")},
+        {'id': 'm1', 'subject': 'A1', 'label_ids': ['L_A']},
+    ]
+    last_runs = {'A': LAST_RUN, 'B': LAST_RUN}
+
+    candidates, failed = QueryPlanner(gmail_client).search(NEWSLETTERS[:2], last_runs, max_messages=1)
+
+    assert {name: [meta['id'] for meta in metadata] for name, metadata in candidates.items()} == {'A': ['m1'], 'B': []}
+    assert failed == ['m2']
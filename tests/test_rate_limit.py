@@ -0,0 +1,120 @@
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+from googleapiclient.errors import HttpError
+from src import rate_limit
+from src.rate_limit import RateLimiter
+
+def _http_error(status, retry_after=None, reason=None):
+    headers = {'retry-after': retry_after} if retry_after else {}
+    resp = MagicMock(status=status)
+    resp.get.side_effect = headers.get
+    content = json.dumps({'error': {'errors': [{'reason': reason}]}}).encode('utf-8') if reason else b''
+    return HttpError(resp, content)
+
+@pytest.fixture
+def no_sleep():
+    with patch('src.rate_limit.time.sleep') as mock_sleep:
+        yield mock_sleep
+
+def test_quota_units():
+    """Test that requests are charged the quota units of their method."""
+    assert rate_limit.quota_units(MagicMock(methodId='gmail.users.messages.get')) == 5
+    assert rate_limit.quota_units(MagicMock(methodId='gmail.users.getProfile')) == 1
+    assert rate_limit.quota_units(MagicMock(methodId='drive.files.create')) == rate_limit.DEFAULT_QUOTA_UNITS
+
+def test_limiter_waits_for_tokens(no_sleep):
+    """Test that the bucket blocks once the burst is used up."""
+    limiter = RateLimiter(rate=10)
+    limiter.acquire(10)
+    no_sleep.assert_not_called()
+
+    no_sleep.side_effect = lambda seconds: setattr(limiter, '_tokens', limiter.capacity)
+    limiter.acquire(5)
+    wait = no_sleep.call_args[0][0]
+    assert 0 < wait <= 0.5
+
+def test_limiter_adapts_rate():
+    """Test that throttling halves the rate and successes grow it back up to the maximum."""
+    limiter = RateLimiter(rate=100)
+    limiter.on_throttled(0)
+    assert limiter.rate == 50
+    for _ in range(20):
+        limiter.on_success()
+    assert limiter.rate == 100
+
+def test_execute_honors_retry_after(no_sleep):
+    """Test that a 429 is retried after the delay given by Retry-After."""
+    request = MagicMock(methodId='gmail.users.messages.list')
+    request.execute.side_effect = [_http_error(429, retry_after='2'), {'messages': []}]
+    limiter = RateLimiter(rate=1000)
+
+    assert rate_limit.execute(request, limiter) == {'messages': []}
+    assert request.execute.call_count == 2
+    no_sleep.assert_any_call(2.0)
+    assert limiter.rate == 1000 / 2 + 1000 / 20
+
+def test_execute_backs_off_server_errors(no_sleep, monkeypatch):
+    """Test exponential backoff on 503 and that the error is raised once retries are exhausted."""
+    monkeypatch.setenv("API_MAX_RETRIES", "2")
+    request = MagicMock()
+    request.execute.side_effect = _http_error(503)
+
+    with pytest.raises(HttpError):
+        rate_limit.execute(request, RateLimiter(rate=1000))
+
+    assert request.execute.call_count == 3
+    delays = [c.args[0] for c in no_sleep.call_args_list]
+    assert 0.5 <= delays[0] <= 1.0
+    assert 1.0 <= delays[1] <= 2.0
+
+def test_execute_does_not_retry_client_errors(no_sleep):
+    """Test that errors other than quota and server errors are raised immediately."""
+    request = MagicMock()
+    request.execute.side_effect = _http_error(404)
+
+    with pytest.raises(HttpError):
+        rate_limit.execute(request, RateLimiter(rate=1000))
+
+    assert request.execute.call_count == 1
+    no_sleep.assert_not_called()
+
+def test_rate_limit_reasons_of_403():
+    """Test that only 403 errors with a rate limit reason are retried."""
+    assert rate_limit.is_retryable(_http_error(403, reason='userRateLimitExceeded'))
+    assert not rate_limit.is_retryable(_http_error(403, reason='insufficientPermissions'))
+
+def test_limiter_charges_requests_larger_than_the_bucket():
+    """Test that 500-unit batches are charged in full, so they run at the configured rate (fake clock)."""
+    clock = [0.0]
+
+    def sleep(seconds):
+        clock[0] += seconds
+
+    with patch('src.rate_limit.time.monotonic', side_effect=lambda: clock[0]), \
+         patch('src.rate_limit.time.sleep', side_effect=sleep):
+        limiter = RateLimiter(rate=250)
+        for _ in range(10):
+            limiter.acquire(500)
+
+    # 5000 units at 250 units/s, less the initial burst of one bucket and the debt left for the next caller
+    assert clock[0] == pytest.approx((5000 - 250 - 250) / 250)
+    assert limiter._tokens == pytest.approx(-250)
+
+def test_execute_batch_splits_by_quota(no_sleep):
+    """Test that a batch never charges more than one bucket of quota units."""
+    requests = [MagicMock(methodId='gmail.users.messages.get') for _ in range(100)]
+    batches = []
+
+    def new_batch(callback):
+        batch = MagicMock()
+        batch.requests = []
+        batch.add.side_effect = lambda request, request_id: batch.requests.append(request_id)
+        batch.execute.side_effect = lambda: [callback(request_id, {}, None) for request_id in batch.requests]
+        batches.append(batch)
+        return batch
+
+    results = rate_limit.execute_batch(new_batch, requests, RateLimiter(rate=250))
+
+    assert [len(batch.requests) for batch in batches] == [50, 50]
+    assert results == [{}] * 100
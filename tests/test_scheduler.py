@@ -0,0 +1,34 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from src.config import NewsletterConfig
+from src.scheduler import Scheduler, shard, shard_of, state_path
+from src.state import StateStore
+
+NOW = datetime(2026, 3, 2, 9, 0, tzinfo=timezone.utc)
+DAILY = NewsletterConfig(name='Daily', query='label:daily', folder_id='f1')
+WEEKLY = NewsletterConfig(name='Weekly', query='label:weekly', folder_id='f2', schedule='weekly')
+
+def test_scheduler_skips_newsletters_that_are_not_due(tmp_path):
+    """Test that a newsletter is due once its interval has elapsed (with tolerance for trigger jitter)."""
+    state = StateStore(str(tmp_path / "state.json"))
+    yesterday = NOW - timedelta(days=1, minutes=-5)
+    Scheduler(state, now=yesterday).record([DAILY, WEEKLY], history_id='100')
+
+    scheduler = Scheduler(StateStore(str(tmp_path / "state.json")), now=NOW)
+    assert scheduler.due([DAILY, WEEKLY]) == [DAILY]
+    assert scheduler.start_history_id(WEEKLY) == '100'
+
+    assert Scheduler(state, now=yesterday + timedelta(weeks=1)).due([DAILY, WEEKLY]) == [DAILY, WEEKLY]
+
+def test_sharding_splits_newsletters_round_robin(monkeypatch):
+    """Test that shards partition the newsletters and keep their own state files."""
+    newsletters = [NewsletterConfig(name=f'N{i}', query=f'label:n{i}', folder_id='f') for i in range(5)]
+    monkeypatch.setenv("STATE_PATH", "gs://bucket/state.json")
+
+    assert shard_of({'shard_index': 1, 'shard_count': 2}) == (1, 2)
+    assert [n.name for n in shard(newsletters, 1, 2)] == ['N1', 'N3']
+    assert sorted(n.name for i in range(2) for n in shard(newsletters, i, 2)) == [n.name for n in newsletters]
+    assert state_path(1, 2) == "gs://bucket/state.shard-1-of-2.json"
+    assert state_path(0, 1) is None
+    with pytest.raises(ValueError):
+        shard_of({'shard_index': 2, 'shard_count': 2})
@@ -0,0 +1,12 @@
+from src.state import StateStore
+
+def test_state_roundtrip(tmp_path):
+    """Test that saved values are loaded by a new store."""
+    path = str(tmp_path / "nested" / "state.json")
+    state = StateStore(path)
+    assert state.get('history_id') is None
+
+    state.set('history_id', '123')
+    state.save()
+
+    assert StateStore(path).get('history_id') == '123'